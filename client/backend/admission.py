@@ -0,0 +1,158 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+# 所有会话同时进行的模型调用数上限
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# 所有会话同时进行的MCP工具调用数上限
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "64"))
+# 预计排队时间超过该值时直接返回429
+ADMISSION_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_SECONDS", "10"))
+# 用户权重，格式 "user_a:2,user_b:0.5"，未列出的用户权重为1
+ADMISSION_USER_WEIGHTS = os.getenv("ADMISSION_USER_WEIGHTS", "")
+
+# 还没有完成过任何调用时，用于估算排队时间的平均占用时长
+_INITIAL_HOLD_SECONDS = 1.0
+_HOLD_EWMA_ALPHA = 0.2
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for item in spec.split(","):
+        if ":" not in item:
+            continue
+        key, value = item.rsplit(":", 1)
+        try:
+            weights[key.strip()] = max(float(value), 0.01)
+        except ValueError:
+            continue
+    return weights
+
+
+class Overloaded(Exception):
+    """预计排队时间超过上限，请求被拒绝"""
+
+    def __init__(self, resource: str, retry_after: float):
+        super().__init__(f"{resource} queue is full, retry after {retry_after:.0f}s")
+        self.resource = resource
+        self.retry_after = retry_after
+
+
+class FairLimiter:
+    """全局并发上限 + 按用户加权公平排队
+
+    有空闲名额时直接放行；否则按加权公平排队（WFQ）的虚拟完成时间出队：
+    每个用户的请求依次占用 1/weight 的虚拟时间，请求多的用户不会挤占其他用户。
+    """
+
+    def __init__(
+        self,
+        resource: str,
+        max_concurrency: int,
+        max_queue_wait_seconds: float = ADMISSION_MAX_QUEUE_WAIT_SECONDS,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        self.resource = resource
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+        self.weights = weights if weights is not None else parse_weights(ADMISSION_USER_WEIGHTS)
+
+        self.active = 0
+        # (虚拟完成时间, 序号, 虚拟开始时间, future)
+        self._waiters: List[Tuple[float, int, float, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._avg_hold_seconds = _INITIAL_HOLD_SECONDS
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    def estimated_wait(self) -> float:
+        """新请求预计的排队时间"""
+        if self.active < self.max_concurrency and not self._waiters:
+            return 0.0
+        return (self.queue_depth + 1) / self.max_concurrency * self._avg_hold_seconds
+
+    def check(self):
+        """准入检查：预计排队过久时抛出Overloaded"""
+        wait = self.estimated_wait()
+        if wait > self.max_queue_wait_seconds:
+            metrics.ADMISSION_REJECTED.inc(resource=self.resource)
+            raise Overloaded(self.resource, max(1.0, math.ceil(wait)))
+
+    async def acquire(self, key: str):
+        started = time.perf_counter()
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            metrics.ADMISSION_QUEUE_WAIT_SECONDS.observe(0, resource=self.resource)
+            return
+
+        weight = self.weights.get(key, 1.0)
+        start_tag = max(self._virtual_time, self._last_finish.get(key, 0.0))
+        finish_tag = start_tag + 1 / weight
+        self._last_finish[key] = finish_tag
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (finish_tag, next(self._counter), start_tag, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已分配但调用方被取消，转交给下一个
+                self.release()
+            raise
+        metrics.ADMISSION_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, resource=self.resource)
+
+    def release(self, held_seconds: Optional[float] = None):
+        if held_seconds is not None:
+            self._avg_hold_seconds += _HOLD_EWMA_ALPHA * (held_seconds - self._avg_hold_seconds)
+        self.active -= 1
+
+        while self._waiters and self.active < self.max_concurrency:
+            _, _, start_tag, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._virtual_time = max(self._virtual_time, start_tag)
+            self.active += 1
+            future.set_result(None)
+
+        if not self._waiters and len(self._last_finish) > 1024:
+            # 只保留虚拟时间尚未追上的用户
+            self._last_finish = {k: v for k, v in self._last_finish.items() if v > self._virtual_time}
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        await self.acquire(key)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth,
+            "estimated_wait_seconds": round(self.estimated_wait(), 3),
+        }
+
+
+llm_limiter = FairLimiter("llm", LLM_MAX_CONCURRENCY)
+tool_limiter = FairLimiter("tool", TOOL_MAX_CONCURRENCY)
+
+metrics.ADMISSION_QUEUE_DEPTH.set_function(lambda: {
+    (limiter.resource,): limiter.queue_depth for limiter in (llm_limiter, tool_limiter)
+})
+metrics.ADMISSION_IN_FLIGHT.set_function(lambda: {
+    (limiter.resource,): limiter.active for limiter in (llm_limiter, tool_limiter)
+})
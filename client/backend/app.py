@@ -2,26 +2,42 @@ import asyncio
 import json
 import logging
 import os
+import time
 import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List
-from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+# Start of module import, reported as startup_state["import_seconds"]
+_import_started = time.perf_counter()
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from openai import AsyncOpenAI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
 # Load environment variables from root .env file
 root_dir = Path(__file__).parent.parent.parent
 env_path = root_dir / ".env"
 load_dotenv(dotenv_path=str(env_path))
 
-# MCP imports (保持原有的MCP相关导入)
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+# MCP imports: mcp/openai are imported during warm-up, not at module import
+if TYPE_CHECKING:
+    from mcp import ClientSession
+
+from mcp_pool import MCPConnectionPool, MCPLease
+from tool_catalog import tool_catalog
+from history_compaction import HistoryCompactor, compaction_totals
+from sse import EventLog, coalesce_tokens, format_sse
+import metrics
+from session_store import SessionRecord, create_session_store
+from session_expiry import SessionExpiryScheduler
+from admission import Overloaded, llm_limiter, tool_limiter
+from llm_client import close_openai_client, get_openai_client, warm_up_openai_client
+from assessment import ASSESSMENT_HISTORY_SIZE, AssessmentError, AssessmentPipeline
+from batch_jobs import BatchJobQueue, JobStore
+from completion_cache import completion_cache
+from trace_replay import tracer
 
 # METIS_SYSTEM_PROMPT = """
 # You are a Metis Agent—an autonomous AI running on the Metis platform with full
@@ -110,7 +126,7 @@ SYSTEM_PROMPT = """
 - 等待用户选择并确认待评估数据表
 
 **第二步：数据表结构获取**  
-- 调用工具获取选定数据表的schema信息（多张表需多次调用）
+- 调用get_schema工具，传入所有选定表名，一次获取这些表的schema信息（列、主键、外键、索引）；返回结果即generate_rules所需的table_schema
 - 简要概括每张数据表的基本信息
 - 询问用户是否确认评估这些表
 
@@ -218,25 +234,53 @@ app.add_middleware(
 # Configuration
 SESSION_TIMEOUT_MINUTES = int(os.getenv("SESSION_TIMEOUT_MINUTES", "30"))
 CLEANUP_INTERVAL_SECONDS = int(os.getenv("CLEANUP_INTERVAL_SECONDS", "300"))
+# Hard cap on live sessions per worker; the least recently active idle session is evicted
+MAX_LIVE_SESSIONS = int(os.getenv("MAX_LIVE_SESSIONS", "1000"))
 # BASE_INSTRUCTIONS = METIS_SYSTEM_PROMPT
 BASE_INSTRUCTIONS = SYSTEM_PROMPT
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+# 每条用户消息最多的模型轮数（每轮可以包含一组并发的工具调用）
+AGENT_MAX_TURNS = int(os.getenv("AGENT_MAX_TURNS", "10"))
+# 单个会话同时执行的工具调用数上限
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "4"))
+SERVER_URL = os.getenv("SERVER_URL", "http://localhost:9999")
+# Startup warm-up: /health reports "starting" until it finishes or times out
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "60"))
+# Open the model API connection during warm-up (one cheap /models request)
+WARMUP_LLM = os.getenv("WARMUP_LLM", "true").lower() == "true"
+
+# Cold start breakdown, exposed on /health
+startup_state: Dict[str, Any] = {
+    "ready": False,
+    "import_seconds": None,
+    "warmup_seconds": {},
+    "warmup_errors": {},
+    "first_connect_seconds": None,
+}
+
+# 预热的MCP连接池，所有会话共享
+mcp_pool = MCPConnectionPool(SERVER_URL)
 
 class MCPClient:
     """MCP客户端，类似dqa_client.py中的实现"""
-    def __init__(self, session_id: str):
+    def __init__(
+        self,
+        session_id: str,
+        max_turns: int = AGENT_MAX_TURNS,
+        tool_concurrency: int = TOOL_CALL_CONCURRENCY,
+        user_id: Optional[str] = None,
+    ):
         self.session_id = session_id
-        self.session = None
-        self.exit_stack = AsyncExitStack()
+        # 全局准入控制按该键公平排队
+        self.user_id = user_id or session_id
+        self.lease: Optional[MCPLease] = None
+        # 回放模式下工具目录和工具调用都来自trace，不借用MCP连接
+        self.replay_session = tracer.replay_session() if tracer.replaying else None
+        self.max_turns = max(1, max_turns)
+        self.tool_semaphore = asyncio.Semaphore(max(1, tool_concurrency))
         
-        # 初始化OpenAI客户端
-        openai_config = {}
-        if os.getenv("OPENAI_API_KEY"):
-            openai_config["api_key"] = os.getenv("OPENAI_API_KEY")
-        if os.getenv("OPENAI_BASE_URL"):
-            openai_config["base_url"] = os.getenv("OPENAI_BASE_URL")
-            
-        self.openai = AsyncOpenAI(**openai_config)
+        # 所有会话共享同一个OpenAI客户端（连接池）；回放模式不需要
+        self.openai = None if tracer.replaying else get_openai_client()
         
         # 保存对话历史
         self.conversation_history = [
@@ -246,45 +290,47 @@ class MCPClient:
             }
         ]
         self.tools = []
+        self.compactor = HistoryCompactor(DEFAULT_MODEL)
         
+    @property
+    def session(self) -> Optional["ClientSession"]:
+        if self.replay_session:
+            return self.replay_session
+        return self.lease.session if self.lease else None
+
     async def connect_to_server(self):
-        """连接到MCP服务器"""
+        """从连接池借出MCP连接，已借出但失效时重新借出"""
+        if self.session:
+            return True
+
         logging.info(f"正在连接到服务器...")
-        
-        # 使用环境变量中的服务器URL
-        server_url = os.getenv("SERVER_URL", "http://localhost:9999")
-        
-        # 创建服务器参数
-        server_params = StdioServerParameters(
-            command="npx",
-            args=["-y", "mcp-remote", f"{server_url}/mcp"],
-            env=None
-        )
-        
+
         try:
-            # 建立连接
-            stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-            read_stream, write_stream = stdio_transport
-            self.session = await self.exit_stack.enter_async_context(ClientSession(read_stream, write_stream))
-            
-            # 初始化连接
-            await self.session.initialize()
-            logging.info("服务器连接成功初始化")
-            
-            # 列出可用工具
-            response = await self.session.list_tools()
-            self.tools = response.tools
+            if self.lease:
+                await mcp_pool.release(self.lease)
+                self.lease = None
+
+            self.lease = await mcp_pool.acquire()
+            self.tools = self.lease.tools
+            if tracer.recording:
+                await tracer.record_tools(self.tools)
             logging.info(f"\n服务器可用工具: {[tool.name for tool in self.tools]}")
-            
+
             return True
         except Exception as e:
             logging.error(f"连接到服务器时出错: {e}")
             return False
     
     async def process_message_stream(self, query: str):
-        """处理用户消息并流式返回，类似dqa_client.py中的实现"""
+        """处理用户消息并流式返回事件（dict），类似dqa_client.py中的实现
+
+        模型每轮可以请求多个工具调用，同一轮中的工具调用相互独立，
+        并发执行并按完成顺序推送tool_response，直到模型不再调用工具或达到max_turns。
+        """
+        if not self.session:
+            await self.connect_to_server()
         if not self.session:
-            yield json.dumps({"type": "error", "message": "未连接到服务器"}) + "\n"
+            yield {"type": "error", "message": "未连接到服务器"}
             return
         
         # 将用户消息添加到历史
@@ -293,42 +339,123 @@ class MCPClient:
             "content": query
         })
         
-        # 格式化工具定义以符合OpenAI API要求
-        formatted_tools = []
-        for tool in self.tools:
-            formatted_tools.append({
-                "type": "function",
-                "function": {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "parameters": tool.inputSchema
-                }
-            })
-        
         try:
+            # 使用共享的工具目录（已格式化为OpenAI工具定义）
+            catalog = await tool_catalog.get(self.session)
+            self.tools = list(catalog.tools)
+            formatted_tools = catalog.openai_tools
+
             logging.info(f"发送请求到模型:{query}")
+
+            for turn in range(self.max_turns):
+                # 最后一轮不再允许调用工具，强制模型给出回答
+                is_last_turn = turn == self.max_turns - 1
+
+                # 超出token预算时压缩历史（截断已消费的旧工具输出）
+                self.compactor.compact(self.conversation_history)
+
+                # 流式调用模型
+                completion_kind = "initial" if turn == 0 else "follow_up"
+                tool_choice = "none" if is_last_turn else "auto"
+                cache_key = completion_cache.key(DEFAULT_MODEL, self.conversation_history, formatted_tools, tool_choice)
+                cached = await completion_cache.get(cache_key)
+                completion = {}
+                if cached is not None:
+                    # 命中缓存：按普通token流回放，前端无法区分
+                    async for event in completion_cache.replay(cached, completion):
+                        yield event
+                else:
+                    async for event in self._stream_completion(formatted_tools, tool_choice, completion_kind, completion):
+                        yield event
+                    await completion_cache.put(cache_key, completion)
+
+                assistant_content = completion["content"]
+                current_tool_calls = completion["tool_calls"]
+
+                # 模型没有调用工具，直接将响应添加到历史并结束
+                if not current_tool_calls:
+                    self.conversation_history.append({
+                        "role": "assistant",
+                        "content": assistant_content
+                    })
+                    break
+
+                # 添加助手消息到历史
+                self.conversation_history.append({
+                    "role": "assistant",
+                    "content": assistant_content or None,
+                    "tool_calls": current_tool_calls
+                })
+
+                for tool_call in current_tool_calls:
+                    logging.info(f"处理工具调用: {tool_call['function']['name']} (ID: {tool_call['id']})")
+                    yield {'type': 'tool_call', 'name': tool_call['function']['name'], 'call_id': tool_call['id'], 'arguments': self._parse_tool_arguments(tool_call)}
+
+                # 并发执行本轮所有工具调用，按完成顺序推送结果
+                tool_results = {}
+                tasks = [asyncio.create_task(self._execute_tool_call(tool_call)) for tool_call in current_tool_calls]
+                try:
+                    for next_done in asyncio.as_completed(tasks):
+                        tool_call, tool_result = await next_done
+                        tool_results[tool_call["id"]] = tool_result
+                        yield {'type': 'tool_response', 'name': tool_call['function']['name'], 'call_id': tool_call['id'], 'output': tool_result}
+                finally:
+                    for task in tasks:
+                        task.cancel()
+
+                # 添加工具响应到历史（保持与tool_calls相同的顺序）
+                for tool_call in current_tool_calls:
+                    self.conversation_history.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call["id"],
+                        "content": tool_results[tool_call["id"]]
+                    })
+
+                logging.info(f"第{turn + 1}轮工具调用处理完毕，再次调用模型处理结果")
             
-            # 流式调用模型
-            response_stream = await self.openai.chat.completions.create(
-                model=DEFAULT_MODEL,
-                messages=self.conversation_history,
-                tools=formatted_tools,
-                tool_choice="auto",
-                stream=True
-            )
+            yield {'type': 'completion', 'message': 'Response completed'}
             
+        except Exception as e:
+            error_msg = f"处理请求时出错: {str(e)}"
+            logging.error(error_msg)
+            yield {'type': 'error', 'message': error_msg}
+
+    async def _stream_completion(self, formatted_tools: List[Dict[str, Any]], tool_choice: str, completion_kind: str, result: Dict[str, Any]):
+        """流式调用模型并推送token/tool_call_started事件，完整的回复写入result"""
+        # 在全局模型并发名额内调用模型
+        async with llm_limiter.slot(self.user_id):
+            request_started = time.perf_counter()
+            first_chunk_at = None
+            content_deltas = 0
+            request = {
+                "model": DEFAULT_MODEL,
+                "messages": self.conversation_history,
+                "tools": formatted_tools,
+                "tool_choice": tool_choice,
+            }
+            if tracer.replaying:
+                response_stream = tracer.replay_completion(request)
+            else:
+                response_stream = await self.openai.chat.completions.create(**request, stream=True)
+                if tracer.recording:
+                    response_stream = tracer.record_completion(request, response_stream, request_started)
+
             current_tool_calls = []
             assistant_content = ""
-            
+
             async for chunk in response_stream:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                    metrics.LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(first_chunk_at - request_started, kind=completion_kind)
                 if chunk.choices and len(chunk.choices) > 0:
                     delta = chunk.choices[0].delta
-                    
+
                     # 处理普通文本内容
                     if delta.content:
                         assistant_content += delta.content
-                        yield f"data: {json.dumps({'type': 'token', 'content': delta.content})}\n\n"
-                    
+                        content_deltas += 1
+                        yield {'type': 'token', 'content': delta.content}
+
                     # 处理工具调用
                     if delta.tool_calls:
                         for tool_call_delta in delta.tool_calls:
@@ -339,125 +466,92 @@ class MCPClient:
                                     "type": "function",
                                     "function": {"name": None, "arguments": ""}
                                 })
-                            
+
                             # 更新工具调用信息
                             if tool_call_delta.id:
                                 current_tool_calls[tool_call_delta.index]["id"] = tool_call_delta.id
-                            
+
                             if tool_call_delta.function:
                                 if tool_call_delta.function.name:
                                     current_tool_calls[tool_call_delta.index]["function"]["name"] = tool_call_delta.function.name
-                                    yield f"data: {json.dumps({'type': 'tool_call_started', 'tool_name': tool_call_delta.function.name, 'call_id': current_tool_calls[tool_call_delta.index]['id']})}\n\n"
-                                
+                                    yield {'type': 'tool_call_started', 'tool_name': tool_call_delta.function.name, 'call_id': current_tool_calls[tool_call_delta.index]['id']}
+
                                 if tool_call_delta.function.arguments:
                                     current_tool_calls[tool_call_delta.index]["function"]["arguments"] += tool_call_delta.function.arguments
-            
-            # 如果有工具调用，处理它们
-            if current_tool_calls and any(tc["function"]["name"] for tc in current_tool_calls):
-                # 添加助手消息到历史
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": assistant_content or None,
-                    "tool_calls": current_tool_calls
-                })
-                
-                # 处理每个工具调用
-                for tool_call in current_tool_calls:
-                    if tool_call["function"]["name"]:
-                        tool_id = tool_call["id"]
-                        function_name = tool_call["function"]["name"]
-                        function_args = json.loads(tool_call["function"]["arguments"])
-                        
-                        logging.info(f"处理工具调用: {function_name} (ID: {tool_id})")
-                        yield f"data: {json.dumps({'type': 'tool_call', 'name': function_name, 'call_id': tool_id, 'arguments': function_args})}\n\n"
-                        
-                        # 调用MCP工具
-                        try:
-                            result = await self.session.call_tool(function_name, function_args)
-                            
-                            # 处理工具结果
-                            tool_result = ""
-                            if hasattr(result, 'isError') and result.isError:
-                                tool_result = "工具调用失败"
-                                if hasattr(result, 'content') and result.content:
-                                    for content_item in result.content:
-                                        if hasattr(content_item, 'text'):
-                                            tool_result = content_item.text
-                            else:
-                                tool_result = str(result.content)
-                            
-                            logging.info(f"工具调用结果: {tool_result}")
-                            
-                            yield f"data: {json.dumps({'type': 'tool_response', 'name': function_name, 'call_id': tool_id, 'output': tool_result})}\n\n"
-                            
-                            # 添加工具响应到历史
-                            self.conversation_history.append({
-                                "role": "tool",
-                                "tool_call_id": tool_id,
-                                "content": tool_result
-                            })
-                            
-                        except Exception as e:
-                            tool_result = f"工具调用错误: {str(e)}"
-                            logging.error(f"工具调用失败: {str(e)}")
-                            
-                            yield f"data: {json.dumps({'type': 'tool_response', 'name': function_name, 'call_id': tool_id, 'output': tool_result})}\n\n"
-                            
-                            # 添加错误响应到历史
-                            self.conversation_history.append({
-                                "role": "tool",
-                                "tool_call_id": tool_id,
-                                "content": tool_result
-                            })
-                
-                # 所有工具调用完成后，再次调用模型处理结果
-                logging.info("所有工具调用处理完毕，再次调用模型处理结果")
-                
-                follow_up_stream = await self.openai.chat.completions.create(
-                    model=DEFAULT_MODEL,
-                    messages=self.conversation_history,
-                    stream=True
-                )
-                
-                follow_up_content = ""
-                async for chunk in follow_up_stream:
-                    if chunk.choices and len(chunk.choices) > 0:
-                        delta = chunk.choices[0].delta
-                        if delta.content:
-                            follow_up_content += delta.content
-                            yield f"data: {json.dumps({'type': 'token', 'content': delta.content})}\n\n"
-                
-                # 将模型的最终响应添加到历史
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": follow_up_content
-                })
-            else:
-                # 模型没有调用工具，直接将响应添加到历史
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": assistant_content
-                })
-            
-            yield f"data: {json.dumps({'type': 'completion', 'message': 'Response completed'})}\n\n"
-            
-        except Exception as e:
-            error_msg = f"处理请求时出错: {str(e)}"
-            logging.error(error_msg)
-            yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
+
+        finished_at = time.perf_counter()
+        metrics.LLM_COMPLETION_SECONDS.observe(finished_at - request_started, kind=completion_kind)
+        if first_chunk_at is not None and content_deltas > 1 and finished_at > first_chunk_at:
+            metrics.LLM_TOKENS_PER_SECOND.observe(content_deltas / (finished_at - first_chunk_at), kind=completion_kind)
+
+        result["content"] = assistant_content
+        result["tool_calls"] = [tc for tc in current_tool_calls if tc["function"]["name"]]
+        result["seconds"] = finished_at - request_started
+
+    @staticmethod
+    def _parse_tool_arguments(tool_call: Dict[str, Any]) -> Any:
+        try:
+            return json.loads(tool_call["function"]["arguments"] or "{}")
+        except json.JSONDecodeError:
+            return tool_call["function"]["arguments"]
+
+    async def _execute_tool_call(self, tool_call: Dict[str, Any]):
+        """在会话并发限制内调用MCP工具，返回(tool_call, 结果文本)"""
+        function_name = tool_call["function"]["name"]
+        function_args = self._parse_tool_arguments(tool_call)
+        if not isinstance(function_args, dict):
+            return tool_call, f"工具调用错误: 参数不是合法的JSON对象: {function_args}"
+
+        async with self.tool_semaphore, tool_limiter.slot(self.user_id):
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                result = await tracer.call_tool(self.session, function_name, function_args)
+
+                # 处理工具结果
+                tool_result = ""
+                if hasattr(result, 'isError') and result.isError:
+                    tool_result = "工具调用失败"
+                    if hasattr(result, 'content') and result.content:
+                        for content_item in result.content:
+                            if hasattr(content_item, 'text'):
+                                tool_result = content_item.text
+                    status = "error"
+                else:
+                    tool_result = str(result.content)
+
+                logging.info(f"工具调用结果: {tool_result}")
+
+            except Exception as e:
+                tool_result = f"工具调用错误: {str(e)}"
+                status = "error"
+                logging.error(f"工具调用失败: {str(e)}")
+
+            metrics.MCP_TOOL_CALL_SECONDS.observe(time.perf_counter() - started, tool=function_name, status=status)
+
+        return tool_call, tool_result
     
     async def cleanup(self):
-        """清理资源"""
+        """归还MCP连接"""
         try:
-            if self.exit_stack:
-                await self.exit_stack.aclose()
+            if self.lease:
+                await mcp_pool.release(self.lease)
+                self.lease = None
         except Exception as e:
             logging.error(f"清理资源时出错: {e}")
 
-# Session storage with metadata for cleanup
+# Live sessions held by this worker (MCP lease + in-memory history). The running generation,
+# its event log and the busy check below are per worker: with several workers, requests of a
+# session must be routed to the same worker (sticky sessions), see README "Scaling Considerations"
 agent_sessions: Dict[str, Dict[str, Any]] = {}
 active_sse_connections: Dict[str, bool] = {}
 
+# Shared session store, lets any worker rehydrate a session
+session_store = create_session_store()
+
+metrics.ACTIVE_SESSIONS.set_function(lambda: len(agent_sessions))
+metrics.MCP_CONNECTIONS.set_function(mcp_pool.connection_counts)
+
 def create_agent_instructions(chat_history: List[Dict[str, str]]) -> str:
     """Parse chat history to create dynamic agent instructions"""
     if chat_history:
@@ -467,13 +561,101 @@ def create_agent_instructions(chat_history: List[Dict[str, str]]) -> str:
         return BASE_INSTRUCTIONS + recent_context
     return BASE_INSTRUCTIONS
 
-async def cleanup_session_resources(session_id: str):
+async def persist_session(session_data: Dict[str, Any]):
+    """Write the session's history and metadata to the session store"""
+    await session_store.save(SessionRecord(
+        session_id=session_data["session_id"],
+        chat_history=session_data["chat_history"],
+        conversation_history=session_data["mcp_client"].conversation_history,
+        created_at=session_data["created_at"],
+        last_activity=session_data["last_activity"],
+        user_id=session_data["mcp_client"].user_id,
+    ))
+
+async def get_session_data(session_id: str) -> Dict[str, Any]:
+    """Return the live session, rehydrating it from the session store if this worker doesn't hold it"""
+    record = await session_store.get(session_id)
+    if record is None:
+        # Deleted or expired by another worker
+        await cleanup_session_resources(session_id, delete_from_store=False)
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    session_data = agent_sessions.get(session_id)
+    if session_data is None:
+        mcp_client = MCPClient(session_id, user_id=record.user_id)
+        if not await mcp_client.connect_to_server():
+            raise HTTPException(status_code=500, detail="Failed to connect to MCP server")
+
+        if session_id in agent_sessions:
+            # Rehydrated concurrently by another request
+            await mcp_client.cleanup()
+            session_data = agent_sessions[session_id]
+        else:
+            session_data = {
+                "mcp_client": mcp_client,
+                "chat_history": record.chat_history,
+                "session_id": session_id,
+                "created_at": record.created_at,
+                "last_activity": record.last_activity,
+                "event_log": EventLog(),
+                "producer": None,
+            }
+            await register_live_session(session_data)
+            logging.info(f"Rehydrated session from store: {session_id}")
+
+    # Pick up changes made by other workers, unless this worker is generating into the history
+    if not is_session_busy(session_id):
+        session_data["mcp_client"].conversation_history = record.conversation_history
+        session_data["chat_history"] = record.chat_history
+        if record.last_activity > session_data["last_activity"]:
+            session_data["last_activity"] = record.last_activity
+            session_expiry.touch(session_id)
+
+    return session_data
+
+def is_session_busy(session_id: str) -> bool:
+    """A session is busy while a client is streaming or a generation is still running"""
+    if session_id in active_sse_connections:
+        return True
+    session_data = agent_sessions.get(session_id)
+    producer = session_data.get("producer") if session_data else None
+    return producer is not None and not producer.done()
+
+async def ensure_session_capacity():
+    """Evict least recently active idle sessions until there is room for one more"""
+    while len(agent_sessions) >= MAX_LIVE_SESSIONS:
+        victim = session_expiry.least_recently_active(exclude=is_session_busy)
+        if victim is None:
+            raise HTTPException(status_code=503, detail="Too many active sessions")
+        logging.info(f"Evicting least recently active session: {victim}")
+        await cleanup_session_resources(victim, delete_from_store=False)
+
+async def register_live_session(session_data: Dict[str, Any]):
+    await ensure_session_capacity()
+    agent_sessions[session_data["session_id"]] = session_data
+    session_expiry.touch(session_data["session_id"])
+
+def touch_session(session_data: Dict[str, Any]):
+    """Record activity and push back the session's expiry deadline"""
+    session_data["last_activity"] = datetime.now()
+    session_expiry.touch(session_data["session_id"])
+
+async def cleanup_session_resources(session_id: str, delete_from_store: bool = True):
     """Properly cleanup all resources for a session"""
+    if delete_from_store:
+        await session_store.delete(session_id)
+
+    session_expiry.remove(session_id)
     if session_id not in agent_sessions:
         return
 
     session_data = agent_sessions[session_id]
 
+    # Stop any generation still running for the session
+    producer = session_data.get("producer")
+    if producer and not producer.done():
+        producer.cancel()
+
     # 清理MCP客户端
     mcp_client = session_data.get("mcp_client")
     if mcp_client:
@@ -491,41 +673,92 @@ async def cleanup_session_resources(session_id: str):
 
     logging.info(f"Cleaned up session: {session_id}")
 
+# Local expiry is driven by deadlines; evicted sessions stay in the store and can be rehydrated
+session_expiry = SessionExpiryScheduler(
+    SESSION_TIMEOUT_MINUTES * 60,
+    on_expire=lambda session_id: cleanup_session_resources(session_id, delete_from_store=False),
+    is_busy=is_session_busy,
+)
+
 async def cleanup_expired_sessions():
-    """Background task to cleanup expired sessions"""
+    """Background task to remove expired sessions from the session store"""
     while True:
         try:
-            current_time = datetime.now()
-            expired_sessions = []
-
-            for session_id, session_data in agent_sessions.items():
-                last_activity = session_data.get("last_activity") or session_data.get("created_at")
-                if last_activity and current_time - last_activity > timedelta(minutes=SESSION_TIMEOUT_MINUTES):
-                    expired_sessions.append(session_id)
-
-            for session_id in expired_sessions:
-                logging.info(f"Cleaning up expired session: {session_id}")
-                await cleanup_session_resources(session_id)
-
+            cutoff = datetime.now() - timedelta(minutes=SESSION_TIMEOUT_MINUTES)
+            await session_store.delete_expired(cutoff)
         except Exception as e:
             logging.error(f"Error in cleanup task: {e}")
 
         await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
 
-# Start cleanup task
+async def warm_up():
+    """Pre-create the model API connection and the MCP pool before /health reports ready
+
+    Phases that exceed WARMUP_TIMEOUT_SECONDS keep running in the background;
+    the backend reports ready anyway and lists the slow or failed phases.
+    """
+    started = time.perf_counter()
+
+    async def timed(name: str, coro):
+        phase_started = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            startup_state["warmup_errors"][name] = str(e)
+            logging.warning(f"Warm-up phase {name} failed: {e}")
+        finally:
+            startup_state["warmup_seconds"][name] = round(time.perf_counter() - phase_started, 3)
+
+    phases = []
+    if tracer.replaying:
+        # 回放模式不访问MCP服务器和模型服务，只加载trace
+        phases.append(asyncio.create_task(timed("trace", asyncio.to_thread(tracer.preload))))
+    else:
+        phases.append(asyncio.create_task(timed("mcp_pool", mcp_pool.start())))
+        if WARMUP_LLM:
+            phases.append(asyncio.create_task(timed("llm", warm_up_openai_client())))
+        else:
+            get_openai_client()
+
+    pending = set()
+    if phases:
+        _, pending = await asyncio.wait(phases, timeout=WARMUP_TIMEOUT_SECONDS)
+    if pending:
+        startup_state["warmup_errors"]["timeout"] = f"warm-up exceeded {WARMUP_TIMEOUT_SECONDS}s"
+
+    startup_state["warmup_seconds"]["total"] = round(time.perf_counter() - started, 3)
+    startup_state["ready"] = True
+    logging.info(f"Warm-up finished: {startup_state['warmup_seconds']}")
+
 @app.on_event("startup")
 async def startup_event():
+    app.state.warmup_task = asyncio.create_task(warm_up())
     asyncio.create_task(cleanup_expired_sessions())
+    session_expiry.start()
+    await start_batch_queue()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    session_expiry.stop()
+    if batch_queue is not None:
+        await batch_queue.stop()
+    await mcp_pool.close()
+    await session_store.close()
+    await close_openai_client()
 
 @app.post("/connect")
 async def connect_endpoint(request: Dict[str, Any]):
     """Initialize MCP client session"""
+    connect_started = time.perf_counter()
     try:
         session_id = str(uuid.uuid4())
         chat_history = request.get("chat_history", [])
+        user_id = request.get("user_id")
+
+        await ensure_session_capacity()
 
         # 创建MCP客户端
-        mcp_client = MCPClient(session_id)
+        mcp_client = MCPClient(session_id, user_id=user_id)
         
         # 连接到MCP服务器
         if not await mcp_client.connect_to_server():
@@ -542,13 +775,20 @@ async def connect_endpoint(request: Dict[str, Any]):
                     })
 
         # Store session with metadata
-        agent_sessions[session_id] = {
+        session_data = {
             "mcp_client": mcp_client,
             "chat_history": chat_history.copy(),
             "session_id": session_id,
             "created_at": datetime.now(),
             "last_activity": datetime.now(),
+            "event_log": EventLog(),
+            "producer": None,
         }
+        await register_live_session(session_data)
+        await persist_session(session_data)
+        metrics.SESSION_CONNECT_SECONDS.observe(time.perf_counter() - connect_started)
+        if startup_state["first_connect_seconds"] is None:
+            startup_state["first_connect_seconds"] = round(time.perf_counter() - _import_started, 3)
 
         return {
             "success": True,
@@ -556,6 +796,8 @@ async def connect_endpoint(request: Dict[str, Any]):
             "message": "MCP client initialized successfully",
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         # Cleanup on failure
         if "mcp_client" in locals():
@@ -567,73 +809,135 @@ async def connect_endpoint(request: Dict[str, Any]):
 
 @app.post("/sessions/{session_id}/message")
 async def send_message(session_id: str, request: Dict[str, Any]):
-    """Send a message to the MCP client and stream response via SSE"""
-    # Validate session
-    if session_id not in agent_sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
+    """Send a message to the MCP client and start generating the response
 
-    session_data = agent_sessions[session_id]
+    Generation starts immediately in the background; the SSE stream only
+    follows the events it produces.
+    """
+    # Validate session
+    session_data = await get_session_data(session_id)
     user_message = request.get("message", "")
 
     if not user_message:
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
+    # One generation per session at a time, so turns never interleave in the history
+    # (enforced per worker; multi-worker deployments rely on sticky sessions)
+    producer = session_data["producer"]
+    if producer is not None and not producer.done():
+        raise HTTPException(status_code=409, detail="A response is still being generated for this session")
+
+    check_admission()
+
     # Update last activity
-    session_data["last_activity"] = datetime.now()
+    touch_session(session_data)
 
-    # Add user message to history
+    # Add user message to history and start generating right away
     chat_history = session_data["chat_history"]
     chat_history.append({"role": "user", "content": user_message})
+    start_generation(session_data)
+    await persist_session(session_data)
 
     return {
         "success": True,
         "message": "Message received, connect to SSE stream for response",
+        "last_event_id": session_data["event_log"].turn_start_id - 1,
     }
 
+def check_admission():
+    """Shed load early instead of queueing past the configured bound"""
+    try:
+        llm_limiter.check()
+        tool_limiter.check()
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(int(e.retry_after))},
+        )
+
+def start_generation(session_data: Dict[str, Any]):
+    """Run the model for the latest user message in the background, writing events to the session's event log"""
+    event_log = session_data["event_log"]
+    event_log.start_turn()
+    session_data["producer"] = asyncio.create_task(run_generation(session_data))
+
+async def run_generation(session_data: Dict[str, Any]):
+    mcp_client = session_data["mcp_client"]
+    chat_history = session_data["chat_history"]
+    event_log = session_data["event_log"]
+
+    try:
+        user_message = chat_history[-1]["content"]
+
+        # Stream response from MCP client, merging bursts of token events into fewer frames
+        await coalesce_tokens(mcp_client.process_message_stream(user_message), event_log.append)
+
+        # Update chat history with assistant response
+        if mcp_client.conversation_history:
+            last_message = mcp_client.conversation_history[-1]
+            if last_message.get("role") == "assistant":
+                chat_history.append({
+                    "role": "assistant",
+                    "content": last_message.get("content", "")
+                })
+
+        touch_session(session_data)
+        await persist_session(session_data)
+
+    except Exception as e:
+        event_log.append({'type': 'error', 'message': f'MCP client execution error: {str(e)}'})
+
+    finally:
+        event_log.end_turn()
+
+def parse_last_event_id(request: Request) -> Optional[int]:
+    """Last-Event-ID header (sent by EventSource on reconnect) or last_event_id query parameter"""
+    value = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
 @app.get("/sessions/{session_id}/stream")
 async def stream_response(session_id: str, request: Request):
-    """SSE endpoint for streaming MCP client responses"""
+    """SSE endpoint for streaming MCP client responses
+
+    Only consumes the events produced by the generation started in
+    POST /message. Every event carries an id. Connecting with Last-Event-ID (or
+    ?last_event_id=, returned by POST /message) replays the events after it from the
+    session's buffer and then follows the live generation, which keeps running while
+    no client is attached. Without it only new events of the running turn are sent.
+    If the requested events have already left the buffer, a "gap" event comes first.
+    """
     # Validate session
-    if session_id not in agent_sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
+    session_data = await get_session_data(session_id)
+    event_log = session_data["event_log"]
+    last_event_id = parse_last_event_id(request)
 
-    session_data = agent_sessions[session_id]
-    mcp_client = session_data["mcp_client"]
-    chat_history = session_data["chat_history"]
+    # Replay only what the client asks for; without Last-Event-ID follow the running turn from now on
+    cursor = last_event_id if last_event_id is not None else event_log.last_id
+    nothing_to_stream = last_event_id is None and not event_log.turn_active
 
     # Mark connection as active
     active_sse_connections[session_id] = True
 
     async def event_stream():
+        metrics.SSE_ACTIVE_STREAMS.inc()
         try:
-            # Get the latest user message
-            if not chat_history or chat_history[-1].get("role") != "user":
-                yield f"data: {json.dumps({'type': 'error', 'message': 'No user message to process'})}\n\n"
+            if nothing_to_stream:
+                yield format_sse({'type': 'error', 'message': 'No response in progress, send a message first'})
                 return
 
-            user_message = chat_history[-1]["content"]
-            
-            # Stream response from MCP client
-            async for event_data in mcp_client.process_message_stream(user_message):
-                # Check if client disconnected
+            async for event_id, event in event_log.follow(cursor):
+                # Check if client disconnected; generation keeps running for a later reconnect
                 if await request.is_disconnected():
                     break
-                    
-                yield event_data
-
-            # Update chat history with assistant response
-            if mcp_client.conversation_history:
-                last_message = mcp_client.conversation_history[-1]
-                if last_message.get("role") == "assistant":
-                    chat_history.append({
-                        "role": "assistant",
-                        "content": last_message.get("content", "")
-                    })
 
-        except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'message': f'MCP client execution error: {str(e)}'})}\n\n"
+                yield format_sse(event, event_id)
 
         finally:
+            metrics.SSE_ACTIVE_STREAMS.dec()
             # Mark connection as inactive
             if session_id in active_sse_connections:
                 del active_sse_connections[session_id]
@@ -651,7 +955,7 @@ async def stream_response(session_id: str, request: Request):
 @app.delete("/sessions/{session_id}")
 async def cleanup_session(session_id: str):
     """Manual cleanup of session"""
-    if session_id not in agent_sessions:
+    if session_id not in agent_sessions and await session_store.get(session_id) is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
     await cleanup_session_resources(session_id)
@@ -661,10 +965,7 @@ async def cleanup_session(session_id: str):
 @app.get("/sessions/{session_id}/status")
 async def get_session_status(session_id: str):
     """Get session status and metadata"""
-    if session_id not in agent_sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    session_data = agent_sessions[session_id]
+    session_data = await get_session_data(session_id)
 
     return {
         "session_id": session_id,
@@ -673,16 +974,14 @@ async def get_session_status(session_id: str):
         "created_at": session_data["created_at"].isoformat(),
         "last_activity": session_data["last_activity"].isoformat(),
         "is_sse_active": session_id in active_sse_connections,
+        "history_compaction": session_data["mcp_client"].compactor.stats,
     }
 
 @app.get("/sessions/{session_id}/tools")
 async def list_session_tools(session_id: str):
     """List tools available for the MCP client in this session"""
     # Validate session
-    if session_id not in agent_sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    session_data = agent_sessions[session_id]
+    session_data = await get_session_data(session_id)
     mcp_client = session_data["mcp_client"]
 
     try:
@@ -711,15 +1010,178 @@ async def list_session_tools(session_id: str):
         print(f"Error listing tools: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error listing tools: {str(e)}")
 
+# Recent assessment runs, oldest first, for GET /assessments/{id}
+assessments: Dict[str, AssessmentPipeline] = {}
+background_tasks = set()
+
+async def run_assessment(pipeline: AssessmentPipeline) -> Dict[str, Any]:
+    # 回放模式下工具调用和模型总结都来自trace，不借用MCP连接也不访问模型服务
+    if tracer.replaying:
+        return await pipeline.run(tracer.replay_session(), None, DEFAULT_MODEL)
+
+    lease = await mcp_pool.acquire()
+    try:
+        if tracer.recording:
+            await tracer.record_tools(lease.tools)
+        return await pipeline.run(lease.session, get_openai_client(), DEFAULT_MODEL)
+    finally:
+        await mcp_pool.release(lease)
+
+@app.post("/assessments")
+async def create_assessment(request: Dict[str, Any]):
+    """Run the data quality assessment pipeline directly, without the agent loop
+
+    The mechanical steps (list tables, fetch schemas, generate and execute
+    rules, generate the report) call the MCP tools in a fixed order; the
+    model is only used when summarize is true. With wait=false the run
+    continues in the background and can be polled via GET /assessments/{id}.
+    """
+    database_config = request.get("database_config") or {}
+    missing = [key for key in ("host", "user", "password", "database") if not database_config.get(key)]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"database_config is missing: {', '.join(missing)}")
+
+    try:
+        pipeline = AssessmentPipeline(
+            database_config=database_config,
+            tables=request.get("tables"),
+            indicators=request.get("indicators"),
+            thresholds=request.get("thresholds"),
+            generate_report=request.get("generate_report", True),
+            summarize=request.get("summarize", False),
+            use_sandbox=request.get("use_sandbox", True),
+            user_id=request.get("user_id"),
+        )
+    except AssessmentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    check_admission()
+
+    assessments[pipeline.assessment_id] = pipeline
+    while len(assessments) > ASSESSMENT_HISTORY_SIZE:
+        del assessments[next(iter(assessments))]
+
+    if request.get("wait", True):
+        return await run_assessment(pipeline)
+
+    task = asyncio.create_task(run_assessment(pipeline))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return pipeline.to_dict()
+
+@app.get("/assessments/{assessment_id}")
+async def get_assessment(assessment_id: str):
+    """Get the state and results of an assessment run"""
+    pipeline = assessments.get(assessment_id)
+    if pipeline is None:
+        raise HTTPException(status_code=404, detail="Assessment not found")
+    return pipeline.to_dict()
+
+# Headless batch assessments; results are persisted so they outlive the process.
+# Created on startup, so importing the app doesn't open (or create) the job database
+batch_queue: Optional[BatchJobQueue] = None
+
+async def start_batch_queue():
+    global batch_queue
+    if batch_queue is None:
+        batch_queue = BatchJobQueue(run_assessment, JobStore())
+        metrics.BATCH_QUEUED_ITEMS.set_function(batch_queue.queued_items)
+    await batch_queue.start()
+
+def get_batch_queue() -> BatchJobQueue:
+    if batch_queue is None:
+        raise HTTPException(status_code=503, detail="Batch job queue is not running")
+    return batch_queue
+
+@app.post("/jobs")
+async def create_job(request: Dict[str, Any]):
+    """Queue a batch of assessments (datasource, tables, indicators) for the worker pool
+
+    Top-level indicators, thresholds and generate_report apply to every
+    item that doesn't set its own.
+    """
+    items = request.get("items") or []
+    if not items:
+        raise HTTPException(status_code=400, detail="items cannot be empty")
+
+    defaults = {key: request[key] for key in ("indicators", "thresholds", "generate_report") if key in request}
+    normalized = []
+    for index, item in enumerate(items):
+        database_config = item.get("database_config") or {}
+        missing = [key for key in ("host", "user", "password", "database") if not database_config.get(key)]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"items[{index}].database_config is missing: {', '.join(missing)}")
+        normalized.append({**defaults, **item})
+
+    try:
+        job = await get_batch_queue().submit(normalized, name=request.get("name"))
+    except AssessmentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return job.progress()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status with a per-item summary"""
+    queue = get_batch_queue()
+    job = queue.jobs.get(job_id)
+    if job is not None:
+        return {**job.progress(), "items": job.item_summaries()}
+
+    progress = await queue.get_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    results = await queue.get_results(job_id)
+    return {
+        **progress,
+        "items": [
+            {"index": result["index"], "database": result.get("database"), "state": result["state"],
+             "error": result.get("error"), "timings": result.get("timings")}
+            for result in results
+        ],
+    }
+
+@app.get("/jobs/{job_id}/progress")
+async def get_job_progress(job_id: str):
+    """Lightweight job progress for polling"""
+    progress = await get_batch_queue().get_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return progress
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str):
+    """Full results of the job's finished items"""
+    results = await get_batch_queue().get_results(job_id)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, "results": results}
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; 503 until the startup warm-up has finished"""
+    if not startup_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting", "startup": startup_state})
+
     return {
-        "status": "healthy",
+        "status": "degraded" if startup_state["warmup_errors"] else "healthy",
+        "startup": startup_state,
         "active_sessions": len(agent_sessions),
         "active_sse_connections": len(active_sse_connections),
+        "mcp_pool": mcp_pool.stats(),
+        "tool_catalog_version": tool_catalog.current.version if tool_catalog.current else None,
+        "history_compaction": compaction_totals,
+        "admission": {"llm": llm_limiter.stats(), "tool": tool_limiter.stats()},
+        "trace": tracer.stats(),
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics endpoint"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+startup_state["import_seconds"] = round(time.perf_counter() - _import_started, 3)
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -34,7 +34,8 @@ from openai.types.responses import (
     ResponseOutputItemDoneEvent,
     ResponseTextDeltaEvent,
 )
-from openai import AsyncOpenAI
+
+from llm_client import close_openai_client, get_openai_client
 
 # uvicorn app:app --host localhost --port 8000 --reload
 
@@ -217,9 +218,16 @@ async def cleanup_expired_sessions():
 # Start cleanup task
 @app.on_event("startup")
 async def startup_event():
+    # One pooled client for every session's agent runs
+    set_default_openai_client(get_openai_client())
     asyncio.create_task(cleanup_expired_sessions())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_openai_client()
+
+
 @app.post("/connect")
 async def connect_endpoint(request: Dict[str, Any]):
     """Initialize agent session"""
@@ -227,12 +235,6 @@ async def connect_endpoint(request: Dict[str, Any]):
         session_id = str(uuid.uuid4())
         chat_history = request.get("chat_history", [])
 
-        custom_client = AsyncOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-        )
-        set_default_openai_client(custom_client)
-
         # Create Metis MCP server connection for this session
         server_url = os.getenv("SERVER_URL", "http://localhost:9999")
         metis_mcp_server = MCPServerStdio(
@@ -0,0 +1,379 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from admission import llm_limiter, tool_limiter
+from tool_catalog import tool_catalog
+from trace_replay import tracer
+
+if TYPE_CHECKING:
+    from mcp import ClientSession
+
+# 并发获取表结构的工具调用数上限
+ASSESSMENT_SCHEMA_CONCURRENCY = int(os.getenv("ASSESSMENT_SCHEMA_CONCURRENCY", "8"))
+# 保留在内存中供查询的评估任务数
+ASSESSMENT_HISTORY_SIZE = int(os.getenv("ASSESSMENT_HISTORY_SIZE", "200"))
+
+# 与SYSTEM_PROMPT第三步一致的14项评估指标，mode: 单表并发为0，多表串行为1
+ASSESSMENT_INDICATORS: List[Dict[str, Any]] = [
+    {"dimension_name": "完整性", "indicator_name": "数据值完整", "indicator_definition": "核查必填字段或非空字段的值是否为空", "indicator_mode": 0},
+    {"dimension_name": "完整性", "indicator_name": "记录关联完整", "indicator_definition": "核查数据是否满足存储结构的关联设计，包括一对一关联和一对多关联", "indicator_mode": 1},
+    {"dimension_name": "完整性", "indicator_name": "数据量足够", "indicator_definition": "核查记录总量是否足以支撑预期使用目的，需要阈值", "indicator_mode": 0},
+    {"dimension_name": "完整性", "indicator_name": "上下文逻辑完整", "indicator_definition": "核查数据之间的完整程度是否符合应有的临床语义约束（如高血压患者应有对应的最高血压记录；血常规检查应有血小板检查数值）", "indicator_mode": 1},
+    {"dimension_name": "可靠性", "indicator_name": "数值合理", "indicator_definition": "核查数值是否符合值域范围", "indicator_mode": 0},
+    {"dimension_name": "可靠性", "indicator_name": "标识不重复", "indicator_definition": "核查数据的标识列或主键是否重复", "indicator_mode": 0},
+    {"dimension_name": "可靠性", "indicator_name": "不同数据项逻辑合理", "indicator_definition": "核查不同数据之间的描述是否存在逻辑冲突", "indicator_mode": 1},
+    {"dimension_name": "可靠性", "indicator_name": "记录不冗余", "indicator_definition": "核查数据中是否存在重复的数据", "indicator_mode": 0},
+    {"dimension_name": "一致性", "indicator_name": "相同事实描述一致", "indicator_definition": "核查对同一事实的描述是否一致", "indicator_mode": 1},
+    {"dimension_name": "一致性", "indicator_name": "内容与编码一致", "indicator_definition": "核查有编码的数据，其值以及和所对应的编码是否一致", "indicator_mode": 1},
+    {"dimension_name": "一致性", "indicator_name": "数据的度量单位一致", "indicator_definition": "核查同一字段所采用的的度量单位一致", "indicator_mode": 0},
+    {"dimension_name": "时间性", "indicator_name": "数据的时间逻辑", "indicator_definition": "有时间顺序的数据，其时间逻辑顺序符合临床实际要求", "indicator_mode": 1},
+    {"dimension_name": "准确性", "indicator_name": "数据类型准确", "indicator_definition": "核查数据的存储类型是否准确", "indicator_mode": 0},
+    {"dimension_name": "准确性", "indicator_name": "编码_术语标准", "indicator_definition": "核查数据所使用的编码/术语是否符合或国家/行业标准，需要阈值", "indicator_mode": 0},
+]
+
+SUMMARY_PROMPT = (
+    "你是临床数据质量评估助手。下面是一次评估的规则执行结果（JSON）。"
+    "请用专业、清晰的中文，以表格形式列出未通过和执行出错的规则，并简要说明主要问题。"
+)
+
+
+class AssessmentError(Exception):
+    """评估流水线某一步失败"""
+
+
+class ArtifactCache:
+    """按键共享的中间结果（表清单、表结构、规则集）
+
+    同一键的并发请求只执行一次；成功结果保留ttl_seconds，失败不缓存。
+    批量任务中同一数据库的多个评估项借此共享表结构获取和规则生成。
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Tuple, Tuple[float, asyncio.Task]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: Tuple, factory: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and (not entry[1].done() or entry[0] > now):
+            self.hits += 1
+            return await asyncio.shield(entry[1])
+
+        self.misses += 1
+        if len(self._entries) > 1024:
+            self._entries = {k: v for k, v in self._entries.items() if not v[1].done() or v[0] > now}
+
+        task = asyncio.ensure_future(factory())
+        self._entries[key] = (now + self.ttl_seconds, task)
+
+        def forget_failure(done: asyncio.Task):
+            if (done.cancelled() or done.exception() is not None) and self._entries.get(key, (0, None))[1] is done:
+                del self._entries[key]
+
+        task.add_done_callback(forget_failure)
+        return await asyncio.shield(task)
+
+
+class AssessmentState:
+    PENDING = "pending"
+    LISTING_TABLES = "listing_tables"
+    FETCHING_SCHEMA = "fetching_schema"
+    GENERATING_RULES = "generating_rules"
+    EXECUTING_RULES = "executing_rules"
+    REPORTING = "reporting"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+def select_indicators(requested: Optional[List[Any]], thresholds: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """按名称选择评估指标（也接受完整的指标对象），并把阈值写入指标定义"""
+    if not requested:
+        selected = [dict(indicator) for indicator in ASSESSMENT_INDICATORS]
+    else:
+        by_name = {indicator["indicator_name"]: indicator for indicator in ASSESSMENT_INDICATORS}
+        selected = []
+        for item in requested:
+            if isinstance(item, dict):
+                selected.append(dict(item))
+            elif item in by_name:
+                selected.append(dict(by_name[item]))
+            else:
+                raise AssessmentError(f"Unknown indicator: {item}")
+
+    for indicator in selected:
+        threshold = (thresholds or {}).get(indicator["indicator_name"])
+        if threshold is not None:
+            indicator["indicator_definition"] = f"{indicator['indicator_definition']}（阈值：{threshold}）"
+    return selected
+
+
+def columns_to_schema(table: Dict[str, Any], columns: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """把get_table_columns的结果转换为generate_rules/generate_report使用的table_schema格式"""
+    return {
+        "table_name": table["tableName"],
+        "table_comment": table.get("tableComment", ""),
+        "columns": [
+            {
+                "name": column["columnName"],
+                "type": column["columnType"],
+                "description": column.get("columnComment", ""),
+                "nullable": column.get("isNullable") == "YES",
+            }
+            for column in columns
+        ],
+    }
+
+
+class AssessmentPipeline:
+    """确定性的数据质量评估流水线
+
+    按固定顺序直接调用MCP工具（SYSTEM_PROMPT中的第一、二、五、六、十步），
+    不经过模型决定下一步：
+    listing_tables -> fetching_schema（get_schema一次获取；不支持时各表并发）-> generating_rules -> executing_rules
+    -> reporting（报告生成与可选的模型总结并发）-> completed
+    只有summarize=True时才调用模型，用于向用户呈现结果。
+    """
+
+    def __init__(
+        self,
+        database_config: Dict[str, Any],
+        tables: Optional[List[str]] = None,
+        indicators: Optional[List[Any]] = None,
+        thresholds: Optional[Dict[str, Any]] = None,
+        generate_report: bool = True,
+        summarize: bool = False,
+        use_sandbox: bool = True,
+        user_id: Optional[str] = None,
+        artifacts: Optional[ArtifactCache] = None,
+    ):
+        self.assessment_id = str(uuid.uuid4())
+        port = database_config.get("port", 3306)
+        try:
+            port = int(port)
+        except (TypeError, ValueError):
+            raise AssessmentError(f"Invalid database port: {port!r}")
+        self.database_config = {**database_config, "port": port}
+        self.tables = tables
+        self.indicators = select_indicators(indicators, thresholds)
+        self.generate_report = generate_report
+        self.summarize = summarize
+        self.use_sandbox = use_sandbox
+        self.user_id = user_id or self.assessment_id
+        # 未提供时每次运行单独缓存（ttl为0，只合并本次运行内的重复请求）
+        self.artifacts = artifacts or ArtifactCache(0)
+
+        self.state = AssessmentState.PENDING
+        self.created_at = datetime.now()
+        self.step_seconds: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.failed_step: Optional[str] = None
+        self.result: Dict[str, Any] = {}
+
+    def _db_args(self) -> Dict[str, Any]:
+        return {
+            "host": self.database_config["host"],
+            "user": self.database_config["user"],
+            "password": self.database_config["password"],
+            "database": self.database_config["database"],
+            "port": self.database_config["port"],
+        }
+
+    def _artifact_key(self, kind: str, *parts: Any) -> Tuple:
+        # 含密码摘要：密码错误或已撤销的调用方不会拿到别人凭据下缓存的结果
+        config = self.database_config
+        digest = hashlib.sha256(str(config["password"]).encode("utf-8")).hexdigest()[:16]
+        return (kind, config["host"], config["port"], config["user"], config["database"], digest, *parts)
+
+    async def _call_tool(self, session: "ClientSession", name: str, arguments: Dict[str, Any]) -> Any:
+        """调用MCP工具并解析返回的JSON结果，失败时抛出AssessmentError"""
+        async with tool_limiter.slot(self.user_id):
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                result = await tracer.call_tool(session, name, arguments)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                metrics.MCP_TOOL_CALL_SECONDS.observe(time.perf_counter() - started, tool=name, status=status)
+
+        text = "".join(getattr(item, "text", "") for item in result.content or [])
+        if getattr(result, "isError", False) or text.startswith("Error:"):
+            raise AssessmentError(f"{name} failed: {text}")
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError:
+            raise AssessmentError(f"{name} returned non-JSON output: {text[:200]}")
+        if isinstance(payload, dict) and payload.get("success") is False:
+            raise AssessmentError(f"{name} failed: {payload.get('message') or payload.get('error')}")
+        return payload.get("data") if isinstance(payload, dict) and "success" in payload else payload
+
+    def _enter(self, state: str):
+        self.state = state
+        logging.info(f"评估 {self.assessment_id}: {state}")
+
+    async def _step(self, state: str, coro):
+        self._enter(state)
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            elapsed = time.perf_counter() - started
+            self.step_seconds[state] = round(elapsed, 3)
+            metrics.ASSESSMENT_STEP_SECONDS.observe(elapsed, step=state)
+
+    async def _list_tables(self, session: "ClientSession") -> List[Dict[str, Any]]:
+        tables = await self.artifacts.get(
+            self._artifact_key("tables"),
+            lambda: self._call_tool(session, "get_tables", self._db_args()),
+        )
+        if self.tables:
+            wanted = set(self.tables)
+            tables = [table for table in tables if table["tableName"] in wanted]
+            missing = wanted - {table["tableName"] for table in tables}
+            if missing:
+                raise AssessmentError(f"Tables not found: {', '.join(sorted(missing))}")
+        if not tables:
+            raise AssessmentError("No tables to assess")
+        return tables
+
+    async def _fetch_schema(self, session: "ClientSession", tables: List[Dict[str, Any]]) -> Dict[str, Any]:
+        names = [table["tableName"] for table in tables]
+        catalog = await tool_catalog.get(session)
+        if any(tool.name == "get_schema" for tool in catalog.tools):
+            # 一次调用获取所有表的结构（含主键、外键、索引）
+            return await self.artifacts.get(
+                self._artifact_key("schema", tuple(sorted(names))),
+                lambda: self._call_tool(session, "get_schema", {**self._db_args(), "tableNames": names}),
+            )
+
+        # 数据库服务不支持get_schema时逐表获取
+        semaphore = asyncio.Semaphore(max(1, ASSESSMENT_SCHEMA_CONCURRENCY))
+
+        async def fetch(table: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                columns = await self._call_tool(
+                    session, "get_table_columns", {**self._db_args(), "tableName": table["tableName"]}
+                )
+            return columns_to_schema(table, columns)
+
+        schemas = await asyncio.gather(*(
+            self.artifacts.get(self._artifact_key("schema", table["tableName"]), lambda table=table: fetch(table))
+            for table in tables
+        ))
+        return {"tables": list(schemas)}
+
+    async def _generate_rules(self, session: "ClientSession", table_schema: Dict[str, Any]) -> Dict[str, Any]:
+        key = self._artifact_key(
+            "rules",
+            tuple(sorted(table["table_name"] for table in table_schema["tables"])),
+            json.dumps(self.indicators, ensure_ascii=False, sort_keys=True),
+            self.use_sandbox,
+        )
+        return await self.artifacts.get(key, lambda: self._request_rules(session, table_schema))
+
+    async def _request_rules(self, session: "ClientSession", table_schema: Dict[str, Any]) -> Dict[str, Any]:
+        data = await self._call_tool(session, "generate_rules", {
+            "table_schema": table_schema,
+            "assessment_indicators": {"indicators": self.indicators},
+            "database_config": self.database_config,
+            "use_sandbox": self.use_sandbox,
+        })
+        # 兼容规则服务返回的几种结构
+        if isinstance(data, list):
+            return {"rules": data}
+        if isinstance(data, dict):
+            if "rules" in data:
+                return {"rules": data["rules"]}
+            if isinstance(data.get("rule_set"), dict):
+                return data["rule_set"]
+        raise AssessmentError("generate_rules returned no rules")
+
+    async def _summarize(self, openai, model: str, results: Any) -> str:
+        """流式请求模型总结，与对话一样可以录制和回放"""
+        async with llm_limiter.slot(self.user_id):
+            request = {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": json.dumps(results, ensure_ascii=False, default=str)},
+                ],
+            }
+            if tracer.replaying:
+                response_stream = tracer.replay_completion(request)
+            else:
+                request_started = time.perf_counter()
+                response_stream = await openai.chat.completions.create(**request, stream=True)
+                if tracer.recording:
+                    response_stream = tracer.record_completion(request, response_stream, request_started)
+            parts = []
+            async for chunk in response_stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+        return "".join(parts)
+
+    async def run(self, session: "ClientSession", openai=None, model: Optional[str] = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            tables = await self._step(AssessmentState.LISTING_TABLES, self._list_tables(session))
+            table_schema = await self._step(AssessmentState.FETCHING_SCHEMA, self._fetch_schema(session, tables))
+            self.result["table_schema"] = table_schema
+
+            rule_set = await self._step(AssessmentState.GENERATING_RULES, self._generate_rules(session, table_schema))
+            self.result["rule_set"] = rule_set
+
+            assessment_results = await self._step(AssessmentState.EXECUTING_RULES, self._call_tool(session, "execute_rules", {
+                "rule_set": rule_set,
+                "database_config": self.database_config,
+            }))
+            self.result["assessment_results"] = assessment_results
+
+            # 报告与结果总结互不依赖，并发执行
+            followups = {}
+            if self.generate_report:
+                followups["report"] = self._call_tool(session, "generate_report", {
+                    "table_schema": table_schema,
+                    "assessment_indicators": {"indicators": self.indicators},
+                    "assessment_results": assessment_results,
+                })
+            if self.summarize and (openai is not None or tracer.replaying):
+                followups["summary"] = self._summarize(openai, model, assessment_results)
+            if followups:
+                values = await self._step(AssessmentState.REPORTING, asyncio.gather(*followups.values()))
+                self.result.update(zip(followups.keys(), values))
+
+            self._enter(AssessmentState.COMPLETED)
+            metrics.ASSESSMENTS.inc(status="completed")
+        except Exception as e:
+            self.error = str(e)
+            logging.error(f"评估 {self.assessment_id} 在 {self.state} 步骤失败: {e}")
+            self.failed_step = self.state
+            self._enter(AssessmentState.FAILED)
+            metrics.ASSESSMENTS.inc(status="failed")
+        finally:
+            self.step_seconds["total"] = round(time.perf_counter() - started, 3)
+
+        return self.to_dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "assessment_id": self.assessment_id,
+            "state": self.state,
+            "created_at": self.created_at.isoformat(),
+            "database": self.database_config.get("database"),
+            "indicators": [indicator["indicator_name"] for indicator in self.indicators],
+            "timings": self.step_seconds,
+            "error": self.error,
+            "failed_step": self.failed_step,
+            "result": self.result,
+        }
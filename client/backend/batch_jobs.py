@@ -0,0 +1,366 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import metrics
+from assessment import ArtifactCache, AssessmentError, AssessmentPipeline, AssessmentState
+
+# 同时运行的评估项数
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+# 同一数据库主机同时运行的评估项数
+BATCH_PER_HOST_CONCURRENCY = int(os.getenv("BATCH_PER_HOST_CONCURRENCY", "2"))
+# 同一数据库的表结构和规则集在批量任务间共享的时间
+BATCH_ARTIFACT_TTL_SECONDS = float(os.getenv("BATCH_ARTIFACT_TTL_SECONDS", "3600"))
+BATCH_JOB_STORE_PATH = os.getenv("BATCH_JOB_STORE_PATH", "jobs.db")
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    # 部分评估项失败
+    PARTIAL = "partial"
+    FAILED = "failed"
+    # 服务重启时尚未完成
+    INTERRUPTED = "interrupted"
+
+
+class BatchJob:
+    """一个批量评估任务，包含多个（数据源, 表, 指标）评估项"""
+
+    def __init__(self, items: List[Dict[str, Any]], name: Optional[str] = None):
+        self.job_id = str(uuid.uuid4())
+        self.name = name
+        self.items = items
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        # 每个评估项的最终结果（AssessmentPipeline.to_dict()），运行中为None
+        self.results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        # 正在运行的评估项，用于查询实时步骤
+        self.running: Dict[int, AssessmentPipeline] = {}
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        counts = {"total": len(self.items), "queued": 0, "running": len(self.running), "completed": 0, "failed": 0}
+        for index, result in enumerate(self.results):
+            if result is not None:
+                counts["completed" if result["state"] == AssessmentState.COMPLETED else "failed"] += 1
+            elif index not in self.running:
+                counts["queued"] += 1
+        return counts
+
+    @property
+    def status(self) -> str:
+        counts = self.counts
+        if counts["completed"] + counts["failed"] < counts["total"]:
+            return JobStatus.RUNNING if counts["running"] or counts["completed"] or counts["failed"] else JobStatus.QUEUED
+        if counts["failed"] == 0:
+            return JobStatus.COMPLETED
+        return JobStatus.FAILED if counts["completed"] == 0 else JobStatus.PARTIAL
+
+    def progress(self) -> Dict[str, Any]:
+        counts = self.counts
+        done = counts["completed"] + counts["failed"]
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "progress": round(done / counts["total"], 4) if counts["total"] else 1.0,
+            "counts": counts,
+            "running": [
+                {"index": index, "database": pipeline.database_config.get("database"), "state": pipeline.state}
+                for index, pipeline in sorted(self.running.items())
+            ],
+        }
+
+    def item_summaries(self) -> List[Dict[str, Any]]:
+        summaries = []
+        for index, item in enumerate(self.items):
+            result = self.results[index]
+            config = item["database_config"]
+            summary = {
+                "index": index,
+                "host": config.get("host"),
+                "database": config.get("database"),
+                "tables": item.get("tables"),
+            }
+            if result is not None:
+                summary.update(state=result["state"], error=result["error"], timings=result["timings"])
+            else:
+                pipeline = self.running.get(index)
+                summary["state"] = pipeline.state if pipeline else AssessmentState.PENDING
+            summaries.append(summary)
+        return summaries
+
+
+def _redact(config: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: ("***" if key == "password" else value) for key, value in config.items()}
+
+
+class JobStore:
+    """批量任务结果持久化（SQLite），阻塞操作放到线程池执行"""
+
+    def __init__(self, path: str = BATCH_JOB_STORE_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _init_db(self):
+        with self._connect() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    progress TEXT NOT NULL,
+                    items TEXT NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS batch_job_results (
+                    job_id TEXT NOT NULL,
+                    item_index INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    PRIMARY KEY (job_id, item_index)
+                )
+                """
+            )
+
+    def _save_job(self, job_id: str, progress: Dict[str, Any], items: List[Dict[str, Any]]):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO batch_jobs (job_id, progress, items) VALUES (?, ?, ?)",
+                (job_id, json.dumps(progress, ensure_ascii=False), json.dumps(items, ensure_ascii=False, default=str)),
+            )
+
+    def _save_result(self, job_id: str, index: int, result: Dict[str, Any]):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO batch_job_results (job_id, item_index, result) VALUES (?, ?, ?)",
+                (job_id, index, json.dumps(result, ensure_ascii=False, default=str)),
+            )
+
+    def _load_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT progress FROM batch_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _load_results(self, job_id: str) -> List[Dict[str, Any]]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT item_index, result FROM batch_job_results WHERE job_id = ? ORDER BY item_index", (job_id,)
+            ).fetchall()
+        return [{"index": row[0], **json.loads(row[1])} for row in rows]
+
+    def _mark_interrupted(self) -> int:
+        """上次运行中未完成的任务标记为interrupted"""
+        unfinished = (JobStatus.QUEUED, JobStatus.RUNNING)
+        with self._connect() as connection:
+            rows = connection.execute("SELECT job_id, progress FROM batch_jobs").fetchall()
+            count = 0
+            for job_id, progress_text in rows:
+                progress = json.loads(progress_text)
+                if progress.get("status") in unfinished:
+                    progress["status"] = JobStatus.INTERRUPTED
+                    progress["running"] = []
+                    connection.execute(
+                        "UPDATE batch_jobs SET progress = ? WHERE job_id = ?",
+                        (json.dumps(progress, ensure_ascii=False), job_id),
+                    )
+                    count += 1
+        return count
+
+    async def save_job(self, job: BatchJob):
+        items = [{**item, "database_config": _redact(item["database_config"])} for item in job.items]
+        await asyncio.to_thread(self._save_job, job.job_id, job.progress(), items)
+
+    async def save_result(self, job: BatchJob, index: int):
+        await asyncio.to_thread(self._save_result, job.job_id, index, job.results[index])
+
+    async def load_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._load_progress, job_id)
+
+    async def load_results(self, job_id: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._load_results, job_id)
+
+    async def mark_interrupted(self) -> int:
+        return await asyncio.to_thread(self._mark_interrupted)
+
+
+class BatchJobQueue:
+    """批量评估任务队列
+
+    所有任务的评估项进入同一个队列，由固定数量的worker执行；
+    同一数据库主机的评估项受per_host_concurrency限制，占满时worker转去执行其他主机的评估项。
+    同一数据库的表清单、表结构和规则集通过ArtifactCache在评估项之间共享。
+    """
+
+    def __init__(
+        self,
+        run_pipeline: Callable[[AssessmentPipeline], Awaitable[Dict[str, Any]]],
+        store: Optional[JobStore] = None,
+        workers: int = BATCH_WORKERS,
+        per_host_concurrency: int = BATCH_PER_HOST_CONCURRENCY,
+        artifact_ttl_seconds: float = BATCH_ARTIFACT_TTL_SECONDS,
+    ):
+        self.run_pipeline = run_pipeline
+        self.store = store
+        self.workers = max(1, workers)
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.artifacts = ArtifactCache(artifact_ttl_seconds)
+
+        # 未结束的任务（已结束的任务从存储中读取）
+        self.jobs: Dict[str, BatchJob] = {}
+        # 每个主机的待执行项；_ready中每个元素是某个主机的一个执行名额
+        self._pending: Dict[str, deque] = defaultdict(deque)
+        # 已发放的名额数（排队中 + 执行中）和其中正在执行的评估项数
+        self._slots: Dict[str, int] = defaultdict(int)
+        self._active: Dict[str, int] = defaultdict(int)
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    @staticmethod
+    def _host_key(item: Dict[str, Any]) -> str:
+        config = item["database_config"]
+        return f"{config['host']}:{config.get('port', 3306)}"
+
+    def queued_items(self) -> int:
+        return sum(len(items) for items in self._pending.values())
+
+    async def start(self):
+        if self._tasks:
+            return
+        if self.store:
+            interrupted = await self.store.mark_interrupted()
+            if interrupted:
+                logging.warning(f"{interrupted}个批量任务在上次运行中未完成，已标记为interrupted")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _fill(self, host: str):
+        """为主机发放执行名额：不超过并发上限，排队中的名额也不超过待执行项数"""
+        while (
+            self._slots[host] < self.per_host_concurrency
+            and self._slots[host] - self._active[host] < len(self._pending[host])
+        ):
+            self._slots[host] += 1
+            self._ready.put_nowait(host)
+
+    async def submit(self, items: List[Dict[str, Any]], name: Optional[str] = None) -> BatchJob:
+        job = BatchJob(items, name)
+        # 提前校验指标和端口，避免任务排队后才失败
+        for item in items:
+            AssessmentPipeline(item["database_config"], indicators=item.get("indicators"), thresholds=item.get("thresholds"))
+
+        self.jobs[job.job_id] = job
+        if self.store:
+            await self.store.save_job(job)
+
+        hosts = set()
+        for index, item in enumerate(items):
+            host = self._host_key(item)
+            self._pending[host].append((job, index))
+            hosts.add(host)
+        for host in hosts:
+            self._fill(host)
+
+        logging.info(f"批量任务 {job.job_id} 已提交: {len(items)}个评估项, {len(hosts)}个数据库主机")
+        return job
+
+    async def _worker(self):
+        while True:
+            host = await self._ready.get()
+            if not self._pending[host]:
+                self._slots[host] -= 1
+                self._forget_idle_host(host)
+                continue
+            job, index = self._pending[host].popleft()
+            self._active[host] += 1
+            try:
+                await self._run_item(job, index)
+            finally:
+                self._active[host] -= 1
+                self._slots[host] -= 1
+                self._fill(host)
+                self._forget_idle_host(host)
+
+    def _forget_idle_host(self, host: str):
+        """主机没有待执行和执行中的评估项时删除其计数，避免字典随主机数增长"""
+        if not self._pending[host] and self._slots[host] == 0:
+            del self._pending[host]
+            del self._slots[host]
+            self._active.pop(host, None)
+
+    async def _run_item(self, job: BatchJob, index: int):
+        item = job.items[index]
+        try:
+            pipeline = AssessmentPipeline(
+                database_config=item["database_config"],
+                tables=item.get("tables"),
+                indicators=item.get("indicators"),
+                thresholds=item.get("thresholds"),
+                generate_report=item.get("generate_report", True),
+                use_sandbox=item.get("use_sandbox", True),
+                user_id=f"job:{job.job_id}",
+                artifacts=self.artifacts,
+            )
+        except AssessmentError as e:
+            job.results[index] = {"state": AssessmentState.FAILED, "error": str(e), "timings": {}}
+        else:
+            job.running[index] = pipeline
+            try:
+                job.results[index] = await self.run_pipeline(pipeline)
+            except Exception as e:
+                logging.error(f"批量任务 {job.job_id} 第{index}项执行出错: {e}")
+                job.results[index] = {**pipeline.to_dict(), "state": AssessmentState.FAILED, "error": str(e)}
+            finally:
+                job.running.pop(index, None)
+
+        metrics.BATCH_ITEMS.inc(status=job.results[index]["state"])
+        counts = job.counts
+        finished = counts["completed"] + counts["failed"] == counts["total"]
+        if finished:
+            job.finished_at = datetime.now()
+            logging.info(f"批量任务 {job.job_id} 已结束: {job.status}")
+
+        if self.store:
+            try:
+                await self.store.save_result(job, index)
+                await self.store.save_job(job)
+            except Exception as e:
+                logging.error(f"保存批量任务结果失败: {e}")
+            else:
+                if finished:
+                    self.jobs.pop(job.job_id, None)
+
+    async def get_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.progress()
+        return await self.store.load_progress(job_id) if self.store else None
+
+    async def get_results(self, job_id: str) -> Optional[List[Dict[str, Any]]]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return [{"index": index, **result} for index, result in enumerate(job.results) if result is not None]
+        if self.store and await self.store.load_progress(job_id) is not None:
+            return await self.store.load_results(job_id)
+        return None
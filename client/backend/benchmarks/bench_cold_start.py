@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""测量后端冷启动：模块导入耗时、端口可用、/health就绪以及首次/connect的延迟
+
+每轮启动一个新的uvicorn进程，结束后关闭；需要MCP服务器可用（SERVER_URL）才能测到/connect。
+
+用法:
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --runs 3 --port 8765 --skip-connect
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def measure_import() -> float:
+    """新进程中只导入app模块的耗时（秒）"""
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def request(url: str, data: dict = None, timeout: float = 30, method: str = None):
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+
+
+def measure_server(args) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    result = {"port_open": None, "ready": None, "first_connect": None, "startup": None}
+    try:
+        deadline = started + args.timeout
+        while time.perf_counter() < deadline:
+            try:
+                status, body = request(f"{base_url}/health", timeout=2)
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+                continue
+            if result["port_open"] is None:
+                result["port_open"] = time.perf_counter() - started
+            if status == 200:
+                result["ready"] = time.perf_counter() - started
+                result["startup"] = body.get("startup")
+                break
+            time.sleep(0.05)
+
+        if result["ready"] is not None and not args.skip_connect:
+            connect_started = time.perf_counter()
+            status, body = request(f"{base_url}/connect", {"chat_history": []}, timeout=args.timeout)
+            if status == 200:
+                result["first_connect"] = time.perf_counter() - connect_started
+                request(f"{base_url}/sessions/{body['session_id']}", timeout=10, method="DELETE")
+            else:
+                print(f"/connect失败: {status} {body}")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return result
+
+
+def summarize(name: str, samples: list):
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        print(f"{name:<16}{'n/a':>12}")
+        return
+    print(
+        f"{name:<16}{statistics.mean(samples) * 1000:>10.1f}ms"
+        f"{min(samples) * 1000:>10.1f}ms{max(samples) * 1000:>10.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120, help="等待就绪的最长时间（秒）")
+    parser.add_argument("--skip-connect", action="store_true", help="不测量首次/connect")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    runs = [measure_server(args) for _ in range(args.runs)]
+
+    print(f"{'phase':<16}{'mean':>12}{'min':>12}{'max':>12}")
+    summarize("import", imports)
+    summarize("port_open", [r["port_open"] for r in runs])
+    summarize("ready", [r["ready"] for r in runs])
+    summarize("first_connect", [r["first_connect"] for r in runs])
+
+    last_startup = next((r["startup"] for r in reversed(runs) if r["startup"]), None)
+    if last_startup:
+        print(f"\n最后一轮/health启动明细: {json.dumps(last_startup, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
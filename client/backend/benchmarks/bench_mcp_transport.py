@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""对比stdio(mcp-remote)与streamable HTTP两种MCP传输方式的连接耗时和单次调用延迟
+
+--sessions N 再通过后端的MCP连接池让N个会话并发调用，检查会话之间是否互相影响。
+这一项应对真实代理（server目录下 npm run dev:http）运行。
+http连接失败并回退到stdio时（MCP_TRANSPORT_FALLBACK），结果中的transport列显示实际使用的传输方式。
+
+用法:
+    python benchmarks/bench_mcp_transport.py --server-url http://localhost:9999 --calls 50
+    python benchmarks/bench_mcp_transport.py --tool get_tables --arguments '{"host": "..."}'
+    python benchmarks/bench_mcp_transport.py --transports http --sessions 16 --calls 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mcp_pool import MCPConnectionPool, PooledConnection, close_shared_http_transport
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def bench_transport(transport: str, args) -> dict:
+    conn = PooledConnection(0, args.server_url, transport)
+
+    started = time.perf_counter()
+    await conn.start()
+    connect_ms = (time.perf_counter() - started) * 1000
+    # start()可能回退到stdio，按实际建立的传输方式报告
+    actual_transport = conn.transport
+
+    arguments = json.loads(args.arguments) if args.arguments else {}
+    latencies = []
+    try:
+        for i in range(args.warmup + args.calls):
+            started = time.perf_counter()
+            if args.tool:
+                await conn.session.call_tool(args.tool, arguments)
+            else:
+                await conn.session.list_tools()
+            if i >= args.warmup:
+                latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        await conn.close()
+
+    return {
+        "transport": actual_transport if actual_transport == transport else f"{transport}->{actual_transport}",
+        "connect_ms": connect_ms,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+async def bench_pooled_sessions(transport: str, args) -> dict:
+    """N个会话各自从连接池借出连接并发调用，统计失败次数"""
+    pool = MCPConnectionPool(args.server_url, min_size=1, sessions_per_connection=1, transport=transport)
+    arguments = json.loads(args.arguments) if args.arguments else {}
+    errors = []
+
+    async def run_session():
+        lease = await pool.acquire()
+        try:
+            for _ in range(args.calls):
+                try:
+                    if args.tool:
+                        result = await asyncio.wait_for(lease.session.call_tool(args.tool, arguments), 30)
+                        if result.isError:
+                            raise RuntimeError(result.content[0].text if result.content else "tool error")
+                    else:
+                        await asyncio.wait_for(lease.session.list_tools(), 30)
+                except Exception as e:
+                    errors.append(repr(e))
+        finally:
+            await pool.release(lease)
+
+    await pool.start()
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(run_session() for _ in range(args.sessions)))
+        elapsed = time.perf_counter() - started
+        stats = pool.stats()
+    finally:
+        await pool.close()
+    return {
+        "transports": stats["transports"],
+        "connections": stats["connections"],
+        "calls": args.sessions * args.calls,
+        "errors": errors,
+        "calls_per_s": args.sessions * args.calls / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server-url", default=os.getenv("SERVER_URL", "http://localhost:9999"))
+    parser.add_argument("--transports", default="stdio,http", help="逗号分隔，stdio和/或http")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--tool", default=None, help="要调用的工具名，默认测量list_tools往返")
+    parser.add_argument("--arguments", default=None, help="工具参数(JSON)")
+    parser.add_argument("--sessions", type=int, default=0, help="通过连接池并发调用的会话数，0为不测")
+    args = parser.parse_args()
+
+    results = []
+    for transport in args.transports.split(","):
+        results.append(await bench_transport(transport.strip(), args))
+    await close_shared_http_transport()
+
+    print(f"{'transport':<15}{'connect':>12}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for r in results:
+        print(
+            f"{r['transport']:<15}{r['connect_ms']:>10.1f}ms"
+            f"{r['mean_ms']:>8.2f}ms{r['p50_ms']:>8.2f}ms{r['p95_ms']:>8.2f}ms{r['p99_ms']:>8.2f}ms"
+        )
+
+    if args.sessions:
+        for transport in args.transports.split(","):
+            r = await bench_pooled_sessions(transport.strip(), args)
+            print(
+                f"\n{args.sessions}个会话并发（{','.join(r['transports'])}，{r['connections']}条连接）: "
+                f"{r['calls']}次调用，失败{len(r['errors'])}次，{r['calls_per_s']:.1f} calls/s"
+            )
+            for error in sorted(set(r["errors"]))[:5]:
+                print(f"  {error}")
+        await close_shared_http_transport()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""对比逐token发送与合并发送时SSE的帧数、帧率和CPU时间
+
+模拟N个并发流，每个流按固定间隔产生token事件，中间穿插工具调用事件。
+事件和服务端一样经过合并写入EventLog，再由StreamingResponse跟随读取、
+检查断开、编码并通过ASGI send发出，CPU时间包含这条路径上的逐帧开销（不含网络和前端解析）。
+
+用法:
+    python benchmarks/bench_sse_coalescing.py --streams 200 --tokens 500 --interval-ms 2
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from sse import EventLog, coalesce_tokens, format_sse
+
+SCOPE = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "method": "GET", "headers": []}
+
+
+async def fake_model_stream(tokens: int, interval: float):
+    for i in range(tokens):
+        if i and i % 200 == 0:
+            yield {"type": "tool_call", "name": "get_tables", "call_id": f"call_{i}", "arguments": {}}
+            yield {"type": "tool_response", "name": "get_tables", "call_id": f"call_{i}", "output": "ok"}
+        yield {"type": "token", "content": "数据"}
+        await asyncio.sleep(interval)
+    yield {"type": "completion", "message": "Response completed"}
+
+
+async def produce(event_log: EventLog, window_ms: int, max_bytes: int, args):
+    try:
+        events = fake_model_stream(args.tokens, args.interval_ms / 1000)
+        await coalesce_tokens(events, event_log.append, window_ms=window_ms, max_bytes=max_bytes)
+    finally:
+        event_log.end_turn()
+
+
+async def consume(window_ms: int, max_bytes: int, args) -> tuple:
+    frames = 0
+    payload_bytes = 0
+    event_log = EventLog()
+    event_log.start_turn()
+    producer = asyncio.create_task(produce(event_log, window_ms, max_bytes, args))
+    never = asyncio.Event()
+
+    async def receive():
+        await never.wait()
+
+    async def send(message):
+        nonlocal frames, payload_bytes
+        if message["type"] == "http.response.body" and message.get("body"):
+            frames += 1
+            payload_bytes += len(message["body"])
+
+    request = Request(SCOPE, receive)
+
+    async def event_stream():
+        # 与app.py中stream_response的event_stream相同的逐帧工作
+        async for event_id, event in event_log.follow(0):
+            if await request.is_disconnected():
+                break
+            yield format_sse(event, event_id)
+
+    response = StreamingResponse(event_stream(), media_type="text/event-stream")
+    await response(SCOPE, receive, send)
+    await producer
+    return frames, payload_bytes
+
+
+async def run(window_ms: int, args) -> dict:
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    results = await asyncio.gather(*(consume(window_ms, args.max_bytes, args) for _ in range(args.streams)))
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+    frames = sum(r[0] for r in results)
+    return {
+        "window_ms": window_ms,
+        "frames": frames,
+        "frames_per_second": frames / wall,
+        "bytes": sum(r[1] for r in results),
+        "cpu_seconds": cpu,
+        "wall_seconds": wall,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--interval-ms", type=float, default=2)
+    parser.add_argument("--windows", default="0,30", help="逗号分隔的合并窗口（毫秒），0为不合并")
+    parser.add_argument("--max-bytes", type=int, default=1024)
+    args = parser.parse_args()
+
+    print(f"{'window':>8}{'frames':>10}{'frames/s':>12}{'bytes':>12}{'cpu':>10}{'wall':>10}")
+    for window_ms in (int(w) for w in args.windows.split(",")):
+        r = await run(window_ms, args)
+        print(
+            f"{r['window_ms']:>6}ms{r['frames']:>10}{r['frames_per_second']:>12.0f}"
+            f"{r['bytes']:>12}{r['cpu_seconds']:>9.2f}s{r['wall_seconds']:>9.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
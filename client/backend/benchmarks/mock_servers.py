@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""本地模拟服务：OpenAI兼容的流式模型接口 + MCP工具服务器（streamable HTTP，会话语义与server/src/http-streaming.ts一致）
+
+供 `chat_cli.py bench --mock` 压测后端使用，不依赖外部模型服务和数据库。
+模型按固定脚本工作：每条用户消息先依次调用脚本中的工具，再流式返回一段文字回答。
+
+用法:
+    python benchmarks/mock_servers.py --llm-port 9101 --mcp-port 9102
+    # 后端: OPENAI_BASE_URL=http://127.0.0.1:9101/v1 SERVER_URL=http://127.0.0.1:9102
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# 模拟的数据库连接参数，与database MCP服务器的工具参数一致
+MOCK_DATABASE = {"host": "mock-db", "user": "mock", "password": "mock", "database": "clinical", "port": 3306}
+
+# 每条用户消息依次执行的工具调用
+TOOL_SCRIPT = [
+    ("get_tables", MOCK_DATABASE),
+    ("get_schema", {**MOCK_DATABASE, "tableNames": ["patients"]}),
+]
+
+# 回答由这些英文单词组成，每个token是一个单词（bench按空白分词统计token数）
+WORDS = ["data", "quality", "table", "column", "rule", "passed", "failed", "value", "record", "check"]
+
+MOCK_TABLES = [
+    {"tableName": "patients", "tableComment": "患者基本信息"},
+    {"tableName": "visits", "tableComment": "就诊记录"},
+]
+MOCK_COLUMNS = [
+    {"columnName": "id", "columnType": "int", "columnComment": "主键", "isNullable": "NO"},
+    {"columnName": "name", "columnType": "varchar(64)", "columnComment": "姓名", "isNullable": "YES"},
+    {"columnName": "birth_date", "columnType": "date", "columnComment": "出生日期", "isNullable": "YES"},
+]
+
+
+@dataclass
+class MockLLMConfig:
+    # 首个chunk前的延迟
+    ttft_ms: float = 200
+    # 相邻token之间的间隔
+    token_interval_ms: float = 10
+    # 最终回答的token数
+    answer_tokens: int = 100
+    # 随机返回500的比例
+    error_rate: float = 0.0
+
+
+def _chunk(model: str, delta: Dict[str, Any], finish_reason: str = None) -> bytes:
+    payload = {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+
+
+def _next_tool_call(body: Dict[str, Any]):
+    """按最近一条用户消息之后已经执行的工具轮数，决定下一步要调用的工具（None表示直接回答）"""
+    if not body.get("tools") or body.get("tool_choice") == "none":
+        return None
+    messages: List[Dict[str, Any]] = body.get("messages", [])
+    step = 0
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            break
+        if message.get("role") == "assistant" and message.get("tool_calls"):
+            step += 1
+    if step >= len(TOOL_SCRIPT):
+        return None
+    available = {tool["function"]["name"] for tool in body["tools"]}
+    name, arguments = TOOL_SCRIPT[step]
+    return (name, arguments) if name in available else None
+
+
+def create_llm_app(config: MockLLMConfig) -> web.Application:
+    async def list_models(request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]})
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "mock-model")
+        if config.error_rate and random.random() < config.error_rate:
+            return web.json_response({"error": {"message": "mock failure", "type": "server_error"}}, status=500)
+
+        await asyncio.sleep(config.ttft_ms / 1000)
+        tool_call = _next_tool_call(body)
+        answer = [f"{random.choice(WORDS)} " for _ in range(config.answer_tokens)]
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": "".join(answer)}
+            if tool_call:
+                message = {"role": "assistant", "content": None, "tool_calls": [{
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": tool_call[0], "arguments": json.dumps(tool_call[1])},
+                }]}
+            return web.json_response({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(answer), "total_tokens": len(answer)},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        await response.write(_chunk(model, {"role": "assistant", "content": ""}))
+        if tool_call:
+            await response.write(_chunk(model, {"tool_calls": [{
+                "index": 0,
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": tool_call[0], "arguments": json.dumps(tool_call[1])},
+            }]}))
+            await response.write(_chunk(model, {}, "tool_calls"))
+        else:
+            for token in answer:
+                await response.write(_chunk(model, {"content": token}))
+                if config.token_interval_ms:
+                    await asyncio.sleep(config.token_interval_ms / 1000)
+            await response.write(_chunk(model, {}, "stop"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/v1/models", list_models)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+def create_mcp_server(tool_latency_ms: float = 20):
+    """模拟database MCP服务器的只读工具，返回DatabaseResult格式的JSON"""
+    from mcp.server.fastmcp import FastMCP
+
+    server = FastMCP("mock-database", log_level="WARNING", stateless_http=True)
+
+    def result(data: Any) -> str:
+        return json.dumps({"success": True, "data": data, "message": "ok"}, ensure_ascii=False)
+
+    @server.tool()
+    async def get_tables(host: str, user: str, password: str, database: str, port: int = 3306) -> str:
+        """获取数据库中的所有表"""
+        await asyncio.sleep(tool_latency_ms / 1000)
+        return result(MOCK_TABLES)
+
+    @server.tool()
+    async def get_table_columns(host: str, user: str, password: str, database: str, tableName: str, port: int = 3306) -> str:
+        """获取表的列信息"""
+        await asyncio.sleep(tool_latency_ms / 1000)
+        return result(MOCK_COLUMNS)
+
+    @server.tool()
+    async def get_schema(host: str, user: str, password: str, database: str, tableNames: Optional[List[str]] = None, port: int = 3306) -> str:
+        """一次获取多张表的结构"""
+        await asyncio.sleep(tool_latency_ms / 1000)
+        tables = [table for table in MOCK_TABLES if not tableNames or table["tableName"] in tableNames]
+        return result({"tables": [
+            {
+                "table_name": table["tableName"],
+                "table_comment": table["tableComment"],
+                "columns": [
+                    {"name": c["columnName"], "type": c["columnType"], "description": c["columnComment"], "nullable": c["isNullable"] == "YES"}
+                    for c in MOCK_COLUMNS
+                ],
+                "primary_key": ["id"],
+                "foreign_keys": [],
+                "indexes": [{"name": "PRIMARY", "unique": True, "columns": ["id"]}],
+            }
+            for table in tables
+        ]})
+
+    return server
+
+
+class SharedTransportMCPApp:
+    """按server/src/http-streaming.ts的会话语义提供/mcp端点的ASGI应用
+
+    整个进程只有一个共享transport：每个initialize请求都会关闭旧transport并新建一个，
+    之前的会话ID随之失效（404）；DELETE不看会话ID，直接关闭共享transport。
+    FastMCP自带的streamable_http_app为每个会话单独建transport，测不出会话互相顶掉的问题。
+    """
+
+    def __init__(self, server):
+        # server是mcp的lowlevel Server（FastMCP._mcp_server）
+        self.server = server
+        self.transport = None
+        self._task: Optional[asyncio.Task] = None
+        self.initialize_requests = 0
+        self.delete_requests = 0
+
+    async def _replace_transport(self):
+        from mcp.server.streamable_http import StreamableHTTPServerTransport
+
+        await self._close_transport()
+        transport = StreamableHTTPServerTransport(mcp_session_id=uuid.uuid4().hex)
+        started = asyncio.Event()
+
+        async def run():
+            async with transport.connect() as (read_stream, write_stream):
+                started.set()
+                await self.server.run(
+                    read_stream, write_stream, self.server.create_initialization_options(), stateless=False
+                )
+
+        self._task = asyncio.create_task(run())
+        await started.wait()
+        self.transport = transport
+
+    async def _close_transport(self):
+        transport, task = self.transport, self._task
+        self.transport = self._task = None
+        if transport is not None:
+            await transport.terminate()
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes = b""):
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        request_receive = receive
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await self._close_transport()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        if scope["path"].rstrip("/") != "/mcp":
+            await self._respond(send, 404)
+            return
+
+        if scope["method"] == "DELETE":
+            self.delete_requests += 1
+            status = 200 if self.transport is not None else 400
+            await self._close_transport()
+            await self._respond(send, status)
+            return
+
+        if scope["method"] == "POST":
+            # 先读出请求体判断是否为initialize，再原样交给transport
+            body = b""
+            more_body = True
+            while more_body:
+                message = await receive()
+                body += message.get("body", b"")
+                more_body = message.get("more_body", False)
+            replayed = False
+
+            async def receive_body():
+                nonlocal replayed
+                if not replayed:
+                    replayed = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                return await receive()
+
+            try:
+                is_initialize = json.loads(body).get("method") == "initialize"
+            except (ValueError, AttributeError):
+                is_initialize = False
+            if is_initialize:
+                self.initialize_requests += 1
+                await self._replace_transport()
+            request_receive = receive_body
+
+        if self.transport is None:
+            await self._respond(send, 400, b'{"error": "No transport available and not an initialization request"}')
+            return
+        await self.transport.handle_request(scope, request_receive, send)
+
+
+class MockServers:
+    """在当前事件循环中运行模拟模型服务和模拟MCP服务器"""
+
+    def __init__(self, llm_config: MockLLMConfig, llm_port: int, mcp_port: int, tool_latency_ms: float = 20):
+        self.llm_config = llm_config
+        self.llm_port = llm_port
+        self.mcp_port = mcp_port
+        self.tool_latency_ms = tool_latency_ms
+        self._llm_runner = None
+        self._mcp_server = None
+        self._mcp_task = None
+
+    @property
+    def llm_base_url(self) -> str:
+        return f"http://127.0.0.1:{self.llm_port}/v1"
+
+    @property
+    def mcp_server_url(self) -> str:
+        return f"http://127.0.0.1:{self.mcp_port}"
+
+    async def start(self):
+        import uvicorn
+
+        self._llm_runner = web.AppRunner(create_llm_app(self.llm_config))
+        await self._llm_runner.setup()
+        await web.TCPSite(self._llm_runner, "127.0.0.1", self.llm_port).start()
+
+        # 与真实代理一样只有一个共享transport，后端连接池若同时保持多条连接会在这里出错
+        mcp_app = SharedTransportMCPApp(create_mcp_server(self.tool_latency_ms)._mcp_server)
+        self._mcp_server = uvicorn.Server(uvicorn.Config(mcp_app, host="127.0.0.1", port=self.mcp_port, log_level="warning"))
+        self._mcp_task = asyncio.create_task(self._mcp_server.serve())
+        while not self._mcp_server.started:
+            if self._mcp_task.done():
+                self._mcp_task.result()
+            await asyncio.sleep(0.05)
+
+    async def stop(self):
+        if self._mcp_server:
+            self._mcp_server.should_exit = True
+            await self._mcp_task
+        if self._llm_runner:
+            await self._llm_runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-port", type=int, default=9101)
+    parser.add_argument("--mcp-port", type=int, default=9102)
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--token-interval-ms", type=float, default=10)
+    parser.add_argument("--answer-tokens", type=int, default=100)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    servers = MockServers(
+        MockLLMConfig(args.ttft_ms, args.token_interval_ms, args.answer_tokens, args.llm_error_rate),
+        args.llm_port,
+        args.mcp_port,
+        args.tool_latency_ms,
+    )
+    await servers.start()
+    print(f"模拟模型服务: {servers.llm_base_url}")
+    print(f"模拟MCP服务器: {servers.mcp_server_url}/mcp")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await servers.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -1,165 +1,229 @@
 #!/usr/bin/env python3
+"""Metis命令行客户端
+
+用法:
+    python chat_cli.py                          # 交互式对话
+    python chat_cli.py bench --users 50 --mock  # 压测（模拟模型和MCP服务），见 bench --help
+"""
+import argparse
 import asyncio
 import aiohttp
 import json
+import os
+import statistics
+import subprocess
 import sys
-from typing import Optional
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
 
 
 class ChatCLI:
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", http: Optional[aiohttp.ClientSession] = None, quiet: bool = False):
         self.base_url = base_url
         self.session_id: Optional[str] = None
+        # 所有调用复用同一个HTTP连接池；由调用方传入时由调用方关闭
+        self._http = http
+        self._owns_http = False
+        self.quiet = quiet
+        # 最近一次请求的HTTP状态码，bench按状态码统计错误
+        self.last_status: Optional[int] = None
+        # POST /message返回的事件ID，打开流时带上，从本轮第一个事件开始接收
+        self.last_event_id: Optional[int] = None
+
+    def _print(self, *args, **kwargs):
+        if not self.quiet:
+            print(*args, **kwargs)
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self._http is None:
+            self._http = aiohttp.ClientSession()
+            self._owns_http = True
+        return self._http
+
+    async def close(self):
+        """关闭自己创建的HTTP连接池"""
+        if self._http is not None and self._owns_http:
+            await self._http.close()
+            self._http = None
         
     async def connect(self, chat_history: Optional[list] = None) -> bool:
         """Initialize a new chat session"""
         if chat_history is None:
             chat_history = []
             
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    f"{self.base_url}/connect",
-                    json={"chat_history": chat_history}
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        self.session_id = data["session_id"]
-                        print(f"✅ Connected! Session ID: {self.session_id}")
-                        return True
-                    else:
-                        print(f"❌ Connection failed: {response.status}")
-                        return False
-            except Exception as e:
-                print(f"❌ Connection error: {e}")
-                return False
+        session = self._session()
+        try:
+            async with session.post(
+                f"{self.base_url}/connect",
+                json={"chat_history": chat_history}
+            ) as response:
+                self.last_status = response.status
+                if response.status == 200:
+                    data = await response.json()
+                    self.session_id = data["session_id"]
+                    self._print(f"✅ Connected! Session ID: {self.session_id}")
+                    return True
+                else:
+                    self._print(f"❌ Connection failed: {response.status}")
+                    return False
+        except Exception as e:
+            self._print(f"❌ Connection error: {e}")
+            return False
     
     async def send_message(self, message: str) -> bool:
         """Send a message to the agent"""
         if not self.session_id:
-            print("❌ No active session. Please connect first.")
+            self._print("❌ No active session. Please connect first.")
             return False
             
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    f"{self.base_url}/sessions/{self.session_id}/message",
-                    json={"message": message}
-                ) as response:
-                    return response.status == 200
-            except Exception as e:
-                print(f"❌ Error sending message: {e}")
-                return False
+        session = self._session()
+        try:
+            async with session.post(
+                f"{self.base_url}/sessions/{self.session_id}/message",
+                json={"message": message}
+            ) as response:
+                self.last_status = response.status
+                if response.status != 200:
+                    return False
+                self.last_event_id = (await response.json()).get("last_event_id")
+                return True
+        except Exception as e:
+            self._print(f"❌ Error sending message: {e}")
+            return False
     
-    async def stream_response(self):
-        """Stream and display the agent's response"""
+    async def stream_response(self) -> Dict[str, Any]:
+        """Stream and display the agent's response
+
+        Returns timing stats: first_token_at / finished_at (perf_counter), the
+        streamed text, and an error message if the response did not complete.
+        """
+        stats = {"first_token_at": None, "finished_at": None, "text": "", "completed": False, "error": None}
         if not self.session_id:
-            print("❌ No active session. Please connect first.")
-            return
+            self._print("❌ No active session. Please connect first.")
+            stats["error"] = "no session"
+            return stats
             
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(
-                    f"{self.base_url}/sessions/{self.session_id}/stream"
-                ) as response:
-                    if response.status != 200:
-                        print(f"❌ Stream error: {response.status}")
-                        return
-                        
-                    print("\n🤖 Agent:", end=" ", flush=True)
+        session = self._session()
+        try:
+            params = {"last_event_id": self.last_event_id} if self.last_event_id is not None else None
+            async with session.get(
+                f"{self.base_url}/sessions/{self.session_id}/stream", params=params
+            ) as response:
+                self.last_status = response.status
+                if response.status != 200:
+                    self._print(f"❌ Stream error: {response.status}")
+                    stats["error"] = f"HTTP {response.status}"
+                    return stats
                     
-                    async for line in response.content:
-                        line_str = line.decode('utf-8').strip()
-                        if line_str.startswith('data: '):
-                            try:
-                                data = json.loads(line_str[6:])  # Remove "data: " prefix
-                                
-                                if data['type'] == 'token':
-                                    print(data['content'], end='', flush=True)
-                                elif data['type'] == 'tool_call':
-                                    print(f"\n\n🔧 Tool Call: {data.get('arguments', data)}")
-                                elif data['type'] == 'tool_call_complete':
-                                    print(f"📞 Calling: {data['name']}")
-                                elif data['type'] == 'tool_response':
-                                    output = data['output']
-                                    if isinstance(output, dict) and 'text' in output:
-                                        print(f"📋 Tool Result: {output['text'][:200]}...")
-                                    else:
-                                        print(f"📋 Tool Result: {str(output)[:200]}...")
-                                elif data['type'] == 'completion':
-                                    print("\n\n✅ Response completed")
-                                    break
-                                elif data['type'] == 'error':
-                                    print(f"\n❌ Error: {data['message']}")
-                                    break
-                                    
-                            except json.JSONDecodeError:
-                                continue
+                self._print("\n🤖 Agent:", end=" ", flush=True)
+                
+                async for line in response.content:
+                    line_str = line.decode('utf-8').strip()
+                    if line_str.startswith('data: '):
+                        try:
+                            data = json.loads(line_str[6:])  # Remove "data: " prefix
+                            
+                            if data['type'] == 'token':
+                                if stats["first_token_at"] is None:
+                                    stats["first_token_at"] = time.perf_counter()
+                                stats["text"] += data['content']
+                                self._print(data['content'], end='', flush=True)
+                            elif data['type'] == 'tool_call':
+                                self._print(f"\n\n🔧 Tool Call: {data.get('arguments', data)}")
+                            elif data['type'] == 'tool_call_complete':
+                                self._print(f"📞 Calling: {data['name']}")
+                            elif data['type'] == 'tool_response':
+                                output = data['output']
+                                if isinstance(output, dict) and 'text' in output:
+                                    self._print(f"📋 Tool Result: {output['text'][:200]}...")
+                                else:
+                                    self._print(f"📋 Tool Result: {str(output)[:200]}...")
+                            elif data['type'] == 'completion':
+                                self._print("\n\n✅ Response completed")
+                                stats["completed"] = True
+                                break
+                            elif data['type'] == 'gap':
+                                self._print(f"\n⚠️ {data['message']}")
+                            elif data['type'] == 'error':
+                                self._print(f"\n❌ Error: {data['message']}")
+                                stats["error"] = data['message']
+                                break
                                 
-            except Exception as e:
-                print(f"\n❌ Streaming error: {e}")
+                        except json.JSONDecodeError:
+                            continue
+                            
+        except Exception as e:
+            self._print(f"\n❌ Streaming error: {e}")
+            stats["error"] = str(e)
+
+        stats["finished_at"] = time.perf_counter()
+        if not stats["completed"] and stats["error"] is None:
+            stats["error"] = "stream closed before completion"
+        return stats
     
     async def cleanup(self):
         """Clean up the session"""
         if not self.session_id:
             return
             
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.delete(
-                    f"{self.base_url}/sessions/{self.session_id}"
-                ) as response:
-                    if response.status == 200:
-                        print(f"🧹 Session {self.session_id} cleaned up")
-                    self.session_id = None
-            except Exception as e:
-                print(f"❌ Cleanup error: {e}")
+        session = self._session()
+        try:
+            async with session.delete(
+                f"{self.base_url}/sessions/{self.session_id}"
+            ) as response:
+                if response.status == 200:
+                    self._print(f"🧹 Session {self.session_id} cleaned up")
+                self.session_id = None
+        except Exception as e:
+            self._print(f"❌ Cleanup error: {e}")
 
     async def list_tools(self):
         """List available tools for the current session"""
         if not self.session_id:
-            print("❌ No active session. Please connect first.")
+            self._print("❌ No active session. Please connect first.")
             return
             
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(
-                    f"{self.base_url}/sessions/{self.session_id}/tools"
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        print(f"\n🛠️  Available Tools for Agent '{data['agent_name']}':")
-                        print(f"📊 Total tools: {data['tools_count']}")
-                        print(f"🔧 MCP Server: {data.get('mcp_server_name', 'Unknown')}")
-                        print("─" * 60)
-                        
-                        for i, tool in enumerate(data['tools'], 1):
-                            print(f"\n{i}. 🔨 {tool['name']}")
-                            print(f"   📝 {tool['description']}")
-                            
-                            if 'input_schema' in tool and tool['input_schema']:
-                                schema = tool['input_schema']
-                                if isinstance(schema, dict):
-                                    properties = schema.get('properties', {})
-                                    if properties:
-                                        print("   📋 Parameters:")
-                                        for param_name, param_info in properties.items():
-                                            param_type = param_info.get('type', 'unknown')
-                                            param_desc = param_info.get('description', 'No description')
-                                            required = param_name in schema.get('required', [])
-                                            req_indicator = " (required)" if required else " (optional)"
-                                            print(f"      • {param_name} ({param_type}){req_indicator}: {param_desc}")
+        session = self._session()
+        try:
+            async with session.get(
+                f"{self.base_url}/sessions/{self.session_id}/tools"
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    self._print(f"\n🛠️  Available Tools for Agent '{data['agent_name']}':")
+                    self._print(f"📊 Total tools: {data['tools_count']}")
+                    self._print(f"🔧 MCP Server: {data.get('mcp_server_name', 'Unknown')}")
+                    self._print("─" * 60)
+                    
+                    for i, tool in enumerate(data['tools'], 1):
+                        self._print(f"\n{i}. 🔨 {tool['name']}")
+                        self._print(f"   📝 {tool['description']}")
                         
-                        print("\n" + "─" * 60)
-                        return data
-                    else:
-                        print(f"❌ Failed to list tools: {response.status}")
-                        error_text = await response.text()
-                        print(f"Error details: {error_text}")
-                        return None
-            except Exception as e:
-                print(f"❌ Error listing tools: {e}")
-                return None
+                        if 'input_schema' in tool and tool['input_schema']:
+                            schema = tool['input_schema']
+                            if isinstance(schema, dict):
+                                properties = schema.get('properties', {})
+                                if properties:
+                                    self._print("   📋 Parameters:")
+                                    for param_name, param_info in properties.items():
+                                        param_type = param_info.get('type', 'unknown')
+                                        param_desc = param_info.get('description', 'No description')
+                                        required = param_name in schema.get('required', [])
+                                        req_indicator = " (required)" if required else " (optional)"
+                                        self._print(f"      • {param_name} ({param_type}){req_indicator}: {param_desc}")
+                    
+                    self._print("\n" + "─" * 60)
+                    return data
+                else:
+                    self._print(f"❌ Failed to list tools: {response.status}")
+                    error_text = await response.text()
+                    self._print(f"Error details: {error_text}")
+                    return None
+        except Exception as e:
+            self._print(f"❌ Error listing tools: {e}")
+            return None
 
 async def main():
     print("🚀 Metis Chat CLI")
@@ -171,6 +235,7 @@ async def main():
     
     # Connect to the API
     if not await cli.connect():
+        await cli.close()
         return
     
     try:
@@ -201,10 +266,243 @@ async def main():
                 
     finally:
         await cli.cleanup()
+        await cli.close()
+
+
+# ---------------------------------------------------------------------------
+# bench: N个虚拟用户并发执行脚本化的评估对话
+# ---------------------------------------------------------------------------
+
+# 每个虚拟用户依次发送的消息（--turns超过条数时循环使用）
+BENCH_MESSAGES = [
+    "请评估数据库clinical（host: mock-db, user: mock, password: mock, port: 3306）中patients表的数据质量",
+    "总结一下主要问题",
+]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class BenchStats:
+    """压测结果汇总：各阶段延迟样本与错误计数"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {"connect_ms": [], "ttft_ms": [], "turn_ms": [], "tokens_per_s": []}
+        self.attempts = Counter()
+        self.errors = Counter()
+        # 失败请求的HTTP状态码或错误信息
+        self.reasons = Counter()
+
+    def record_error(self, phase: str, reason: Any):
+        self.errors[phase] += 1
+        self.reasons[f"{phase}: {reason}"] += 1
+
+    def report(self) -> Dict[str, Any]:
+        latency = {}
+        for name, samples in self.samples.items():
+            if samples:
+                latency[name] = {
+                    "n": len(samples),
+                    "p50": round(percentile(samples, 50), 2),
+                    "p95": round(percentile(samples, 95), 2),
+                    "p99": round(percentile(samples, 99), 2),
+                    "mean": round(statistics.mean(samples), 2),
+                }
+        errors = {
+            phase: {
+                "errors": self.errors[phase],
+                "attempts": attempts,
+                "rate": round(self.errors[phase] / attempts, 4) if attempts else 0.0,
+            }
+            for phase, attempts in self.attempts.items()
+        }
+        return {"latency": latency, "errors": errors, "error_reasons": dict(self.reasons.most_common(10))}
+
+
+async def run_virtual_user(base_url: str, http: aiohttp.ClientSession, stats: BenchStats, turns: int, stream_timeout: float):
+    """一个虚拟用户：connect，依次发送消息并读取完整回复，最后删除会话"""
+    cli = ChatCLI(base_url, http=http, quiet=True)
+
+    stats.attempts["connect"] += 1
+    started = time.perf_counter()
+    if not await cli.connect():
+        stats.record_error("connect", cli.last_status or "connection error")
+        return
+    stats.samples["connect_ms"].append((time.perf_counter() - started) * 1000)
+
+    try:
+        for turn in range(turns):
+            message = BENCH_MESSAGES[turn % len(BENCH_MESSAGES)]
+
+            stats.attempts["message"] += 1
+            sent_at = time.perf_counter()
+            if not await cli.send_message(message):
+                stats.record_error("message", cli.last_status or "connection error")
+                continue
+
+            stats.attempts["stream"] += 1
+            try:
+                result = await asyncio.wait_for(cli.stream_response(), stream_timeout)
+            except asyncio.TimeoutError:
+                stats.record_error("stream", "timeout")
+                continue
+            if result["error"]:
+                stats.record_error("stream", result["error"][:80])
+                continue
+
+            stats.samples["turn_ms"].append((result["finished_at"] - sent_at) * 1000)
+            first_token_at = result["first_token_at"]
+            if first_token_at is not None:
+                stats.samples["ttft_ms"].append((first_token_at - sent_at) * 1000)
+                # token数按空白分词估算（模拟模型每个token是一个单词）
+                tokens = len(result["text"].split())
+                if tokens > 1 and result["finished_at"] > first_token_at:
+                    stats.samples["tokens_per_s"].append(tokens / (result["finished_at"] - first_token_at))
+    finally:
+        await cli.cleanup()
+
+
+async def wait_until_ready(http: aiohttp.ClientSession, base_url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"backend exited with code {process.returncode}")
+        try:
+            async with http.get(f"{base_url}/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"backend at {base_url} not ready after {timeout:.0f}s")
+
+
+def start_backend(port: int, llm_base_url: str, mcp_server_url: str, workdir: str) -> subprocess.Popen:
+    """启动指向模拟服务的后端进程；已设置的环境变量（如LLM_MAX_CONCURRENCY）会传给后端"""
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": llm_base_url,
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_MODEL": "mock-model",
+        "SERVER_URL": mcp_server_url,
+        "MCP_TRANSPORT": "http",
+        "MCP_TRANSPORT_FALLBACK": "false",
+        "SESSION_STORE": "memory",
+        "BATCH_JOB_STORE_PATH": os.path.join(workdir, "jobs.db"),
+        "COMPLETION_CACHE_ENABLED": "false",
+    }
+    log = open(os.path.join(workdir, "backend.log"), "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def print_report(report: Dict[str, Any], users: int, turns: int, elapsed: float):
+    print(f"\n📊 users={users} turns={turns} duration={elapsed:.1f}s")
+    print(f"{'metric':<16}{'n':>8}{'p50':>12}{'p95':>12}{'p99':>12}{'mean':>12}")
+    for name, row in report["latency"].items():
+        print(f"{name:<16}{row['n']:>8}{row['p50']:>12.2f}{row['p95']:>12.2f}{row['p99']:>12.2f}{row['mean']:>12.2f}")
+    print(f"\n{'phase':<16}{'errors':>8}{'attempts':>10}{'rate':>10}")
+    for phase, row in report["errors"].items():
+        print(f"{phase:<16}{row['errors']:>8}{row['attempts']:>10}{row['rate'] * 100:>9.1f}%")
+    for reason, count in report["error_reasons"].items():
+        print(f"  {count:>6} × {reason}")
+
+
+async def bench(args):
+    mock = None
+    backend = None
+    base_url = args.base_url
+    connector = aiohttp.TCPConnector(limit=0)
+    http = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None, connect=30))
+    workdir = tempfile.mkdtemp(prefix="metis-bench-")
+    try:
+        if args.mock:
+            from benchmarks.mock_servers import MockLLMConfig, MockServers
+
+            mock = MockServers(
+                MockLLMConfig(args.ttft_ms, args.token_interval_ms, args.answer_tokens, args.llm_error_rate),
+                args.llm_port,
+                args.mcp_port,
+                args.tool_latency_ms,
+            )
+            await mock.start()
+            backend = start_backend(args.backend_port, mock.llm_base_url, mock.mcp_server_url, workdir)
+            base_url = f"http://127.0.0.1:{args.backend_port}"
+            print(f"🧪 Mock LLM {mock.llm_base_url}, mock MCP {mock.mcp_server_url}/mcp, backend {base_url}")
+            print(f"   Backend log: {os.path.join(workdir, 'backend.log')}")
+
+        await wait_until_ready(http, base_url, args.ready_timeout, backend)
+
+        stats = BenchStats()
+        started = time.perf_counter()
+
+        async def delayed_user(index: int):
+            if args.ramp_up:
+                await asyncio.sleep(args.ramp_up * index / args.users)
+            await run_virtual_user(base_url, http, stats, args.turns, args.stream_timeout)
+
+        await asyncio.gather(*(delayed_user(index) for index in range(args.users)))
+        elapsed = time.perf_counter() - started
+
+        report = stats.report()
+        print_report(report, args.users, args.turns, elapsed)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"users": args.users, "turns": args.turns, "duration_s": round(elapsed, 3), **report}, f, indent=2, ensure_ascii=False)
+            print(f"\n📝 Report written to {args.json}")
+    finally:
+        await http.close()
+        if backend is not None:
+            backend.terminate()
+            try:
+                backend.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                backend.kill()
+        if mock is not None:
+            await mock.stop()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Metis Chat CLI")
+    subparsers = parser.add_subparsers(dest="command")
+    parser_bench = subparsers.add_parser(
+        "bench",
+        help="Load-test the backend with concurrent virtual users",
+        description="Run N concurrent virtual users through a scripted assessment conversation and "
+                    "report p50/p95/p99 connect latency, time to first token, tokens/s and error rates.",
+    )
+    parser_bench.add_argument("--base-url", default="http://localhost:8000", help="Backend to test (ignored with --mock)")
+    parser_bench.add_argument("--users", type=int, default=10)
+    parser_bench.add_argument("--turns", type=int, default=1, help="Messages per virtual user")
+    parser_bench.add_argument("--ramp-up", type=float, default=0, help="Seconds over which users are started")
+    parser_bench.add_argument("--stream-timeout", type=float, default=120)
+    parser_bench.add_argument("--ready-timeout", type=float, default=60)
+    parser_bench.add_argument("--json", default=None, help="Also write the report to this file")
+    mock_group = parser_bench.add_argument_group("mock mode (no external services)")
+    mock_group.add_argument("--mock", action="store_true", help="Start mock LLM/MCP servers and a backend pointed at them")
+    mock_group.add_argument("--backend-port", type=int, default=8766)
+    mock_group.add_argument("--llm-port", type=int, default=9101)
+    mock_group.add_argument("--mcp-port", type=int, default=9102)
+    mock_group.add_argument("--ttft-ms", type=float, default=200)
+    mock_group.add_argument("--token-interval-ms", type=float, default=10)
+    mock_group.add_argument("--answer-tokens", type=int, default=100)
+    mock_group.add_argument("--llm-error-rate", type=float, default=0.0)
+    mock_group.add_argument("--tool-latency-ms", type=float, default=20)
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(bench(args) if args.command == "bench" else main())
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
         sys.exit(0) 
\ No newline at end of file
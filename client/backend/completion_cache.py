@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import metrics
+
+# 默认关闭：开启后相同(模型, 消息, 工具, 温度)的请求直接回放缓存的回复
+COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+COMPLETION_CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH", "completions.db")
+COMPLETION_CACHE_TTL_SECONDS = int(os.getenv("COMPLETION_CACHE_TTL_SECONDS", "86400"))
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "10000"))
+# 回放时每个token事件的字符数
+COMPLETION_CACHE_REPLAY_CHUNK_CHARS = int(os.getenv("COMPLETION_CACHE_REPLAY_CHUNK_CHARS", "8"))
+
+
+def normalize_tool_call_ids(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """把tool_calls[].id和tool_call_id按出现顺序替换为call_0、call_1……
+
+    工具调用ID由模型服务随机生成，不替换的话同样的对话在不同会话中永远得到不同的缓存键。
+    只复制需要替换的消息，不修改传入的对话历史。
+    """
+    mapping: Dict[str, str] = {}
+
+    def placeholder(call_id: str) -> str:
+        return mapping.setdefault(call_id, f"call_{len(mapping)}")
+
+    normalized = []
+    for message in messages:
+        if message.get("tool_calls"):
+            message = {
+                **message,
+                "tool_calls": [
+                    {**call, "id": placeholder(call["id"])} if call.get("id") else call
+                    for call in message["tool_calls"]
+                ],
+            }
+        if message.get("tool_call_id"):
+            message = {**message, "tool_call_id": placeholder(message["tool_call_id"])}
+        normalized.append(message)
+    return normalized
+
+
+class CompletionCache:
+    """模型回复的精确匹配缓存（SQLite）
+
+    键是(模型, 消息, 工具定义, tool_choice, 温度)的哈希，消息中的工具调用ID先替换为按位置编号的占位符；条目在ttl_seconds后过期，
+    超过max_entries时按最近使用时间淘汰。阻塞操作放到线程池执行。
+    """
+
+    def __init__(
+        self,
+        path: str = COMPLETION_CACHE_PATH,
+        enabled: bool = COMPLETION_CACHE_ENABLED,
+        ttl_seconds: int = COMPLETION_CACHE_TTL_SECONDS,
+        max_entries: int = COMPLETION_CACHE_MAX_ENTRIES,
+        replay_chunk_chars: int = COMPLETION_CACHE_REPLAY_CHUNK_CHARS,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.replay_chunk_chars = max(1, replay_chunk_chars)
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _init_db(self):
+        if self._initialized:
+            return
+        with self._connect() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS completions (
+                    cache_key TEXT PRIMARY KEY,
+                    completion TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions (last_used)"
+            )
+        self._initialized = True
+
+    def key(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        tool_choice: str,
+        temperature: Optional[float] = None,
+    ) -> Optional[str]:
+        """缓存键，未开启缓存时返回None"""
+        if not self.enabled:
+            return None
+        payload = json.dumps(
+            {"model": model, "messages": normalize_tool_call_ids(messages), "tools": tools, "tool_choice": tool_choice, "temperature": temperature},
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        self._init_db()
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT completion, created_at FROM completions WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                connection.execute("DELETE FROM completions WHERE cache_key = ?", (cache_key,))
+                return None
+            connection.execute("UPDATE completions SET last_used = ? WHERE cache_key = ?", (now, cache_key))
+        return json.loads(row[0])
+
+    def _put(self, cache_key: str, completion: Dict[str, Any]):
+        self._init_db()
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO completions (cache_key, completion, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (cache_key, json.dumps(completion, ensure_ascii=False), now, now),
+            )
+            connection.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl_seconds,))
+            count = connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            if count > self.max_entries:
+                # 淘汰最久未使用的条目
+                connection.execute(
+                    "DELETE FROM completions WHERE cache_key IN "
+                    "(SELECT cache_key FROM completions ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    async def get(self, cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        if cache_key is None:
+            return None
+        try:
+            cached = await asyncio.to_thread(self._get, cache_key)
+        except Exception as e:
+            logging.error(f"读取模型回复缓存失败: {e}")
+            return None
+        metrics.COMPLETION_CACHE_REQUESTS.inc(result="hit" if cached is not None else "miss")
+        return cached
+
+    async def put(self, cache_key: Optional[str], completion: Dict[str, Any]):
+        """缓存一次完整的模型回复（content、tool_calls、原始耗时）"""
+        if cache_key is None:
+            return
+        try:
+            await asyncio.to_thread(self._put, cache_key, {
+                "content": completion["content"],
+                "tool_calls": completion["tool_calls"],
+                "seconds": completion.get("seconds", 0),
+            })
+        except Exception as e:
+            logging.error(f"写入模型回复缓存失败: {e}")
+
+    async def replay(self, cached: Dict[str, Any], result: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """把缓存的回复按普通流式事件推送，并写入result（格式同MCPClient._stream_completion）"""
+        started = time.perf_counter()
+        content = cached["content"] or ""
+        for i in range(0, len(content), self.replay_chunk_chars):
+            yield {"type": "token", "content": content[i:i + self.replay_chunk_chars]}
+
+        # 重新生成tool_call id，避免同一对话中出现重复id
+        tool_calls = []
+        for tool_call in cached["tool_calls"]:
+            tool_call = {**tool_call, "id": f"call_{uuid.uuid4().hex[:24]}", "function": dict(tool_call["function"])}
+            tool_calls.append(tool_call)
+            yield {"type": "tool_call_started", "tool_name": tool_call["function"]["name"], "call_id": tool_call["id"]}
+
+        result["content"] = content
+        result["tool_calls"] = tool_calls
+        result["seconds"] = time.perf_counter() - started
+        metrics.COMPLETION_CACHE_SECONDS_SAVED.inc(max(0.0, cached.get("seconds", 0) - result["seconds"]))
+
+
+completion_cache = CompletionCache()
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+# tiktoken在首次计数时导入，未安装时使用字符数估算
+tiktoken = None
+_tiktoken_loaded = False
+
+# 发送给模型的对话历史token预算（不含工具定义）
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "24000"))
+# 最近N轮对话（从用户消息开始计）始终原样保留
+HISTORY_KEEP_RECENT_TURNS = int(os.getenv("HISTORY_KEEP_RECENT_TURNS", "2"))
+# 截断后的工具输出保留的字符数
+TOOL_OUTPUT_PREVIEW_CHARS = int(os.getenv("TOOL_OUTPUT_PREVIEW_CHARS", "600"))
+
+# 每条消息的固定开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encodings: Dict[str, Any] = {}
+
+# 所有会话累计的压缩统计
+compaction_totals = {"compactions": 0, "tokens_saved": 0, "messages_trimmed": 0, "messages_dropped": 0}
+
+
+def _load_tiktoken():
+    global tiktoken, _tiktoken_loaded
+    if not _tiktoken_loaded:
+        _tiktoken_loaded = True
+        try:
+            import tiktoken as module
+            tiktoken = module
+        except ImportError:
+            tiktoken = None
+    return tiktoken
+
+
+def _get_encoding(model: str):
+    if _load_tiktoken() is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def count_text_tokens(text: str, model: str) -> int:
+    """本地计算文本token数"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # 粗略估算：中日韩字符约1个token，其他字符约4个一个token
+    cjk = sum(1 for ch in text if ord(ch) > 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    text = message.get("content") or ""
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False)
+    if message.get("tool_calls"):
+        text += json.dumps(message["tool_calls"], ensure_ascii=False)
+    return text
+
+
+class HistoryCompactor:
+    """在每次调用模型前压缩conversation_history
+
+    - 系统提示词和最近的对话轮次保持原样
+    - 超出预算时，先截断已被模型消费过的旧工具输出：先截断更早轮次的，再截断最近轮次中
+      已有后续助手消息的（同一轮里多次调用工具时，只保留最后一批工具输出）
+    - 仍超出预算时，整轮丢弃最早的对话（保证tool_calls与tool消息成对）
+    """
+
+    def __init__(
+        self,
+        model: str,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        keep_recent_turns: int = HISTORY_KEEP_RECENT_TURNS,
+        preview_chars: int = TOOL_OUTPUT_PREVIEW_CHARS,
+    ):
+        self.model = model
+        self.token_budget = token_budget
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.preview_chars = preview_chars
+        self.stats = {"compactions": 0, "tokens_saved": 0, "messages_trimmed": 0, "messages_dropped": 0}
+        # id(message) -> (content, tokens)，避免每轮重复编码未变化的消息
+        self._token_cache: Dict[int, Any] = {}
+
+    def message_tokens(self, message: Dict[str, Any]) -> int:
+        text = _message_text(message)
+        cached = self._token_cache.get(id(message))
+        if cached is not None and cached[0] is message.get("content") and cached[2] == len(text):
+            return cached[1]
+        tokens = count_text_tokens(text, self.model) + MESSAGE_OVERHEAD_TOKENS
+        self._token_cache[id(message)] = (message.get("content"), tokens, len(text))
+        return tokens
+
+    def count(self, history: List[Dict[str, Any]]) -> int:
+        return sum(self.message_tokens(message) for message in history)
+
+    def _recent_start(self, history: List[Dict[str, Any]]) -> int:
+        """最近keep_recent_turns轮对话的起始下标"""
+        user_indexes = [i for i, message in enumerate(history) if message.get("role") == "user"]
+        if len(user_indexes) <= self.keep_recent_turns:
+            return user_indexes[0] if user_indexes else len(history)
+        return user_indexes[-self.keep_recent_turns]
+
+    @staticmethod
+    def _consumed_end(history: List[Dict[str, Any]]) -> int:
+        """最后一条助手消息的下标，此前的工具输出都已被模型消费过"""
+        for i in range(len(history) - 1, -1, -1):
+            if history[i].get("role") == "assistant":
+                return i
+        return 0
+
+    def _trim_tool_output(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        content = message.get("content") or ""
+        if not isinstance(content, str) or len(content) <= self.preview_chars:
+            return None
+        return {
+            **message,
+            "content": (
+                f"{content[:self.preview_chars]}\n"
+                f"...[已截断：该工具输出已被处理，原始长度{len(content)}字符]"
+            ),
+        }
+
+    def compact(self, history: List[Dict[str, Any]]) -> int:
+        """原地压缩对话历史，返回节省的token数"""
+        before = self.count(history)
+        if before <= self.token_budget:
+            return 0
+
+        total = before
+        recent_start = self._recent_start(history)
+        trimmed = 0
+
+        # 第一步：截断已被消费的工具输出（其后已有助手消息）。先截断最近轮次之前的，
+        # 再截断最近轮次中更早几次工具调用的，最后一批工具输出保持原样
+        consumed_end = max(recent_start, self._consumed_end(history))
+        for i in range(1, consumed_end):
+            if total <= self.token_budget:
+                break
+            message = history[i]
+            if message.get("role") != "tool":
+                continue
+            replacement = self._trim_tool_output(message)
+            if replacement is None:
+                continue
+            old_tokens = self.message_tokens(message)
+            history[i] = replacement
+            total -= old_tokens - self.message_tokens(replacement)
+            trimmed += 1
+
+        # 第二步：整轮丢弃最早的对话
+        dropped = 0
+        while total > self.token_budget:
+            recent_start = self._recent_start(history)
+            user_indexes = [i for i in range(1, recent_start) if history[i].get("role") == "user"]
+            if not user_indexes:
+                break
+            start = user_indexes[0]
+            next_users = [i for i in range(start + 1, len(history)) if history[i].get("role") == "user"]
+            end = next_users[0] if next_users else recent_start
+            if end > recent_start:
+                break
+            for message in history[start:end]:
+                total -= self.message_tokens(message)
+                self._token_cache.pop(id(message), None)
+            dropped += end - start
+            del history[start:end]
+
+        saved = before - total
+        if saved > 0:
+            for stats in (self.stats, compaction_totals):
+                stats["compactions"] += 1
+                stats["tokens_saved"] += saved
+                stats["messages_trimmed"] += trimmed
+                stats["messages_dropped"] += dropped
+            logging.info(
+                f"对话历史已压缩: {before} -> {total} tokens "
+                f"(截断{trimmed}条工具输出，丢弃{dropped}条消息)"
+            )
+
+        live_ids = {id(message) for message in history}
+        for key in [key for key in self._token_cache if key not in live_ids]:
+            del self._token_cache[key]
+
+        return saved
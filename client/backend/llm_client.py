@@ -0,0 +1,82 @@
+import logging
+import os
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+# openai在首次创建客户端（启动预热）时才导入
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# 所有会话共享的OpenAI客户端连接池
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "600"))
+# HTTP/2需要安装h2，未安装时回退到HTTP/1.1
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() in ("1", "true", "yes")
+
+_client: Optional["AsyncOpenAI"] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_openai_client() -> "AsyncOpenAI":
+    """进程内共享的AsyncOpenAI客户端，首次调用时创建
+
+    TLS连接和keep-alive连接池在所有会话间复用；会话只保存自己的模型参数。
+    """
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+
+        http2 = OPENAI_HTTP2 and _http2_available()
+        if OPENAI_HTTP2 and not http2:
+            logging.warning("未安装h2，OpenAI客户端使用HTTP/1.1")
+
+        openai_config = {}
+        if os.getenv("OPENAI_API_KEY"):
+            openai_config["api_key"] = os.getenv("OPENAI_API_KEY")
+        if os.getenv("OPENAI_BASE_URL"):
+            openai_config["base_url"] = os.getenv("OPENAI_BASE_URL")
+
+        _client = AsyncOpenAI(
+            **openai_config,
+            timeout=OPENAI_TIMEOUT_SECONDS,
+            http_client=httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+                ),
+                timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=10),
+            ),
+        )
+        logging.info(
+            f"已创建共享OpenAI客户端 (http2={http2}, max_connections={OPENAI_MAX_CONNECTIONS})"
+        )
+    return _client
+
+
+async def warm_up_openai_client():
+    """启动时创建客户端并建立到模型服务的连接（TLS握手、keep-alive），首个请求不再承担这部分延迟"""
+    client = get_openai_client()
+    try:
+        await client.with_options(max_retries=0, timeout=10).models.list()
+    except Exception as e:
+        # 部分兼容服务没有/models端点，连接仍然已经建立
+        logging.warning(f"预热OpenAI连接时请求/models失败: {e}")
+
+
+async def close_openai_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
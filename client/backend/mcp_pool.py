@@ -0,0 +1,384 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import httpx
+
+from metrics import MCP_CONNECTION_OPEN_SECONDS
+from tool_catalog import ToolCatalogCache, tool_catalog
+
+# mcp在建立第一条连接时才导入，不拖慢进程启动
+if TYPE_CHECKING:
+    from mcp import ClientSession
+
+# 连接池配置
+MCP_POOL_MIN_SIZE = int(os.getenv("MCP_POOL_MIN_SIZE", "1"))
+MCP_POOL_MAX_SIZE = int(os.getenv("MCP_POOL_MAX_SIZE", "4"))
+# 每条连接期望承载的会话数，超过后才会新建连接（达到上限后继续复用负载最低的连接）
+MCP_POOL_SESSIONS_PER_CONNECTION = int(os.getenv("MCP_POOL_SESSIONS_PER_CONNECTION", "8"))
+# 无租约的连接空闲超过该时间后休眠（关闭子进程），但始终保留min_size条
+MCP_POOL_IDLE_SECONDS = int(os.getenv("MCP_POOL_IDLE_SECONDS", "300"))
+MCP_POOL_HEALTH_INTERVAL_SECONDS = int(os.getenv("MCP_POOL_HEALTH_INTERVAL_SECONDS", "30"))
+MCP_POOL_CONNECT_TIMEOUT_SECONDS = float(os.getenv("MCP_POOL_CONNECT_TIMEOUT_SECONDS", "60"))
+MCP_POOL_PING_TIMEOUT_SECONDS = float(os.getenv("MCP_POOL_PING_TIMEOUT_SECONDS", "10"))
+
+# 传输方式：http直接使用streamable HTTP连接代理的/mcp端点，stdio通过npx mcp-remote桥接
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "http")
+# http连接失败时是否回退到stdio桥接
+MCP_TRANSPORT_FALLBACK = os.getenv("MCP_TRANSPORT_FALLBACK", "true").lower() == "true"
+MCP_HTTP_MAX_CONNECTIONS = int(os.getenv("MCP_HTTP_MAX_CONNECTIONS", "32"))
+MCP_HTTP_KEEPALIVE_SECONDS = float(os.getenv("MCP_HTTP_KEEPALIVE_SECONDS", "60"))
+# MCP路由同时能保持的会话数，连接池的连接数不会超过它。
+# server/src/http-streaming.ts只有一个共享transport：每个initialize都会替换它（之前的会话随之失效），
+# 所以对它只能保持一条连接，所有聊天会话在这条连接上并发请求（stdio桥接的mcp-remote同样连到这个端点）
+MCP_SERVER_MAX_SESSIONS = int(os.getenv("MCP_SERVER_MAX_SESSIONS", "1"))
+
+
+class _SharedHTTPTransport(httpx.AsyncHTTPTransport):
+    """所有MCP连接共享的keep-alive连接池
+
+    streamablehttp_client退出时会关闭它创建的AsyncClient，这里忽略关闭，
+    由close_shared_http_transport()在进程退出时统一释放。
+    """
+
+    async def aclose(self):
+        pass
+
+    async def shutdown(self):
+        await super().aclose()
+
+
+_shared_http_transport: Optional[_SharedHTTPTransport] = None
+
+
+def _get_shared_http_transport() -> _SharedHTTPTransport:
+    global _shared_http_transport
+    if _shared_http_transport is None:
+        _shared_http_transport = _SharedHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=MCP_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=MCP_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=MCP_HTTP_KEEPALIVE_SECONDS,
+            )
+        )
+    return _shared_http_transport
+
+
+def _shared_http_client_factory(
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[httpx.Timeout] = None,
+    auth: Optional[httpx.Auth] = None,
+) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        headers=headers,
+        timeout=timeout or httpx.Timeout(30, read=300),
+        auth=auth,
+        transport=_get_shared_http_transport(),
+    )
+
+
+async def close_shared_http_transport():
+    global _shared_http_transport
+    if _shared_http_transport is not None:
+        await _shared_http_transport.shutdown()
+        _shared_http_transport = None
+
+
+class PooledConnection:
+    """一条已初始化的MCP连接（streamable HTTP或mcp-remote子进程 + ClientSession）
+
+    连接的打开与关闭都在同一个后台任务中完成，避免在其他请求的任务里
+    退出stdio_client的cancel scope。
+    """
+
+    def __init__(
+        self,
+        conn_id: int,
+        server_url: str,
+        transport: str = MCP_TRANSPORT,
+        catalog: ToolCatalogCache = tool_catalog,
+    ):
+        self.conn_id = conn_id
+        self.server_url = server_url
+        self.transport = transport
+        self.catalog = catalog
+        self.session: Optional["ClientSession"] = None
+        self.tools: List[Any] = []
+        self.leases = 0
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self._ready: Optional[asyncio.Future] = None
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.session is not None and not self._closing.is_set()
+
+    @property
+    def is_closed(self) -> bool:
+        return self._task is not None and self._task.done()
+
+    async def start(self):
+        """启动后台任务并等待initialize()与list_tools()完成"""
+        if self._ready is None:
+            self._ready = asyncio.get_running_loop().create_future()
+            self._task = asyncio.create_task(self._run())
+        await asyncio.wait_for(asyncio.shield(self._ready), MCP_POOL_CONNECT_TIMEOUT_SECONDS)
+
+    async def _open_streams(self, stack: AsyncExitStack, transport: str):
+        if transport == "http":
+            from mcp.client.streamable_http import streamablehttp_client
+
+            return await stack.enter_async_context(
+                streamablehttp_client(
+                    f"{self.server_url}/mcp",
+                    httpx_client_factory=_shared_http_client_factory,
+                    # 代理收到DELETE时不看会话ID，直接关闭共享transport；关闭连接时不发送DELETE
+                    terminate_on_close=False,
+                )
+            )
+
+        from mcp import StdioServerParameters
+        from mcp.client.stdio import stdio_client
+
+        server_params = StdioServerParameters(
+            command="npx",
+            args=["-y", "mcp-remote", f"{self.server_url}/mcp"],
+            env=None
+        )
+        return await stack.enter_async_context(stdio_client(server_params))
+
+    async def _run(self):
+        transports = [self.transport]
+        if self.transport == "http" and MCP_TRANSPORT_FALLBACK:
+            transports.append("stdio")
+
+        try:
+            for i, transport in enumerate(transports):
+                try:
+                    await self._serve(transport)
+                    return
+                except Exception as e:
+                    # 只有在连接建立之前失败才回退
+                    if self._ready.done() or i == len(transports) - 1:
+                        raise
+                    logging.warning(f"MCP连接#{self.conn_id}通过{transport}连接失败，回退到{transports[i + 1]}: {e}")
+        except Exception as e:
+            logging.error(f"MCP连接#{self.conn_id}出错: {e}")
+            if not self._ready.done():
+                self._ready.set_exception(e)
+        finally:
+            self.session = None
+            self._closing.set()
+
+    async def _serve(self, transport: str):
+        from mcp import ClientSession
+
+        async with AsyncExitStack() as stack:
+            with MCP_CONNECTION_OPEN_SECONDS.time(phase="spawn", transport=transport):
+                streams = await self._open_streams(stack, transport)
+            read_stream, write_stream = streams[0], streams[1]
+            session = await stack.enter_async_context(
+                ClientSession(read_stream, write_stream, message_handler=self.catalog.handle_message)
+            )
+            with MCP_CONNECTION_OPEN_SECONDS.time(phase="initialize", transport=transport):
+                await session.initialize()
+            with MCP_CONNECTION_OPEN_SECONDS.time(phase="list_tools", transport=transport):
+                catalog = await self.catalog.get(session)
+
+            self.transport = transport
+            self.tools = list(catalog.tools)
+            self.session = session
+            logging.info(f"MCP连接#{self.conn_id}已就绪({transport})，可用工具: {[tool.name for tool in self.tools]}")
+            self._ready.set_result(True)
+
+            await self._closing.wait()
+
+    async def ping(self) -> bool:
+        """健康检查"""
+        if not self.is_open:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), MCP_POOL_PING_TIMEOUT_SECONDS)
+            return True
+        except Exception as e:
+            logging.warning(f"MCP连接#{self.conn_id}健康检查失败: {e}")
+            return False
+
+    async def close(self):
+        """关闭连接并等待子进程退出"""
+        self._closing.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, MCP_POOL_CONNECT_TIMEOUT_SECONDS)
+            except Exception as e:
+                logging.warning(f"关闭MCP连接#{self.conn_id}时出错: {e}")
+
+
+class MCPLease:
+    """会话从连接池借出的连接"""
+
+    def __init__(self, connection: PooledConnection):
+        self.connection = connection
+        self.released = False
+
+    @property
+    def session(self) -> Optional["ClientSession"]:
+        return self.connection.session
+
+    @property
+    def tools(self) -> List[Any]:
+        return self.connection.tools
+
+
+class MCPConnectionPool:
+    """预热的MCP连接池
+
+    多个聊天会话复用同一条ClientSession（JSON-RPC请求可并发），
+    子进程数量受max_size限制，不再随并发用户数增长。
+    """
+
+    def __init__(
+        self,
+        server_url: str,
+        min_size: int = MCP_POOL_MIN_SIZE,
+        max_size: int = MCP_POOL_MAX_SIZE,
+        sessions_per_connection: int = MCP_POOL_SESSIONS_PER_CONNECTION,
+        idle_seconds: int = MCP_POOL_IDLE_SECONDS,
+        health_interval_seconds: int = MCP_POOL_HEALTH_INTERVAL_SECONDS,
+        transport: str = MCP_TRANSPORT,
+        server_max_sessions: int = MCP_SERVER_MAX_SESSIONS,
+    ):
+        self.server_url = server_url
+        self.transport = transport
+        self.max_size = max(1, min(max_size, server_max_sessions))
+        if max_size > self.max_size:
+            logging.info(
+                f"MCP_POOL_MAX_SIZE={max_size}超过MCP服务器支持的会话数{server_max_sessions}，连接池最多保持{self.max_size}条连接"
+            )
+        self.min_size = min(max(0, min_size), self.max_size)
+        self.sessions_per_connection = max(1, sessions_per_connection)
+        self.idle_seconds = idle_seconds
+        self.health_interval_seconds = health_interval_seconds
+
+        self._connections: List[PooledConnection] = []
+        self._lock = asyncio.Lock()
+        self._next_id = 0
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+    def _new_connection(self) -> PooledConnection:
+        self._next_id += 1
+        return PooledConnection(self._next_id, self.server_url, self.transport)
+
+    async def start(self):
+        """启动连接池：预热min_size条连接并启动维护任务"""
+        await self._fill_to_min()
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    async def _fill_to_min(self):
+        async with self._lock:
+            missing = self.min_size - len(self._connections)
+            new_connections = [self._new_connection() for _ in range(max(0, missing))]
+            self._connections.extend(new_connections)
+
+        results = await asyncio.gather(*(conn.start() for conn in new_connections), return_exceptions=True)
+        for conn, result in zip(new_connections, results):
+            if isinstance(result, Exception):
+                logging.warning(f"预热MCP连接#{conn.conn_id}失败: {result}")
+                await self._discard(conn)
+
+    async def acquire(self) -> MCPLease:
+        """借出一条已初始化的连接"""
+        async with self._lock:
+            self._connections = [c for c in self._connections if not c.is_closed]
+            candidates = sorted(self._connections, key=lambda c: c.leases)
+            conn = candidates[0] if candidates else None
+
+            if conn is None or (
+                conn.leases >= self.sessions_per_connection and len(self._connections) < self.max_size
+            ):
+                conn = self._new_connection()
+                self._connections.append(conn)
+
+            conn.leases += 1
+            conn.last_used = time.monotonic()
+
+        try:
+            await conn.start()
+        except Exception:
+            conn.leases -= 1
+            await self._discard(conn)
+            raise
+
+        return MCPLease(conn)
+
+    async def release(self, lease: MCPLease):
+        """归还连接"""
+        if lease.released:
+            return
+        lease.released = True
+        lease.connection.leases = max(0, lease.connection.leases - 1)
+        lease.connection.last_used = time.monotonic()
+
+    async def _discard(self, conn: PooledConnection):
+        async with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        await conn.close()
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval_seconds)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logging.error(f"MCP连接池维护任务出错: {e}")
+
+    async def check_health(self):
+        """健康检查 + 空闲连接休眠 + 补足min_size"""
+        now = time.monotonic()
+        idle_connections = [c for c in self._connections if c.leases == 0 and c.is_open]
+        surplus = len(self._connections) - self.min_size
+
+        for conn in sorted(idle_connections, key=lambda c: c.last_used):
+            if surplus > 0 and now - conn.last_used > self.idle_seconds:
+                logging.info(f"MCP连接#{conn.conn_id}空闲超时，关闭子进程")
+                await self._discard(conn)
+                surplus -= 1
+
+        for conn in list(self._connections):
+            if conn.is_closed or (conn.is_open and not await conn.ping()):
+                await self._discard(conn)
+
+        await self._fill_to_min()
+
+    def connection_counts(self) -> Dict[tuple, int]:
+        counts: Dict[tuple, int] = {}
+        for conn in self._connections:
+            if conn.is_open:
+                counts[(conn.transport,)] = counts.get((conn.transport,), 0) + 1
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len([c for c in self._connections if c.is_open]),
+            "leases": sum(c.leases for c in self._connections),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "transports": sorted({c.transport for c in self._connections if c.is_open}),
+        }
+
+    async def close(self):
+        """关闭所有连接"""
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        async with self._lock:
+            connections, self._connections = self._connections, []
+        await asyncio.gather(*(conn.close() for conn in connections), return_exceptions=True)
+        await close_shared_http_transport()
@@ -0,0 +1,269 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 轻量级Prometheus指标：所有更新都在事件循环线程内完成，无锁，每次observe只做一次二分查找
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]):
+        """抓取时才计算取值，适合会话数、连接数这类已有数据结构"""
+        if self.labelnames:
+            self._function = function
+        else:
+            self._function = lambda: {(): function()}
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        values = self._function() if self._function else self._values
+        for key, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [每个桶的计数..., +Inf计数, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._values.get(key)
+        if counts is None:
+            counts = self._values[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# 会话与MCP连接
+SESSION_CONNECT_SECONDS = REGISTRY.register(Histogram(
+    "backend_session_connect_seconds",
+    "Time for /connect to lease an MCP connection and create the session",
+))
+MCP_CONNECTION_OPEN_SECONDS = REGISTRY.register(Histogram(
+    "backend_mcp_connection_open_seconds",
+    "Time to open a pooled MCP connection, by phase (spawn, initialize, list_tools)",
+    ["phase", "transport"],
+))
+MCP_CONNECTIONS = REGISTRY.register(Gauge(
+    "backend_mcp_connections",
+    "Live pooled MCP connections by transport (stdio connections each own an mcp-remote subprocess)",
+    ["transport"],
+))
+MCP_TOOL_CALL_SECONDS = REGISTRY.register(Histogram(
+    "backend_mcp_tool_call_seconds",
+    "Latency of MCP call_tool by tool name",
+    ["tool", "status"],
+))
+
+# 模型调用
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = REGISTRY.register(Histogram(
+    "backend_llm_time_to_first_token_seconds",
+    "Time from sending a completion request to its first streamed chunk",
+    ["kind"],
+))
+LLM_COMPLETION_SECONDS = REGISTRY.register(Histogram(
+    "backend_llm_completion_seconds",
+    "Total streamed completion latency; kind=follow_up for completions after tool results",
+    ["kind"],
+))
+LLM_TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "backend_llm_stream_tokens_per_second",
+    "Streaming rate of content deltas after the first token",
+    ["kind"],
+    buckets=RATE_BUCKETS,
+))
+
+# 模型回复缓存
+COMPLETION_CACHE_REQUESTS = REGISTRY.register(Counter(
+    "backend_completion_cache_requests_total",
+    "Completion cache lookups by result (hit rate = hit / (hit + miss))",
+    ["result"],
+))
+COMPLETION_CACHE_SECONDS_SAVED = REGISTRY.register(Counter(
+    "backend_completion_cache_seconds_saved_total",
+    "Completion latency avoided by replaying cached completions",
+))
+
+# SSE
+SSE_ACTIVE_STREAMS = REGISTRY.register(Gauge(
+    "backend_sse_active_streams",
+    "Currently open SSE response streams",
+))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge(
+    "backend_active_sessions",
+    "Sessions held by this worker",
+))
+
+# 全局准入控制
+ADMISSION_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "backend_admission_queue_depth",
+    "Requests waiting for a global concurrency slot",
+    ["resource"],
+))
+ADMISSION_IN_FLIGHT = REGISTRY.register(Gauge(
+    "backend_admission_in_flight",
+    "Requests currently holding a global concurrency slot",
+    ["resource"],
+))
+ADMISSION_QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "backend_admission_queue_wait_seconds",
+    "Time spent waiting for a global concurrency slot",
+    ["resource"],
+))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "backend_admission_rejected_total",
+    "Requests shed with 429 because the expected queue wait exceeded the bound",
+    ["resource"],
+))
+
+# 确定性评估流水线
+ASSESSMENT_STEP_SECONDS = REGISTRY.register(Histogram(
+    "backend_assessment_step_seconds",
+    "Duration of each step of the POST /assessments pipeline",
+    ["step"],
+))
+ASSESSMENTS = REGISTRY.register(Counter(
+    "backend_assessments_total",
+    "Assessment pipeline runs by final state",
+    ["status"],
+))
+
+# 批量评估任务
+BATCH_ITEMS = REGISTRY.register(Counter(
+    "backend_batch_items_total",
+    "Batch job items finished, by final state",
+    ["status"],
+))
+BATCH_QUEUED_ITEMS = REGISTRY.register(Gauge(
+    "backend_batch_queued_items",
+    "Batch job items waiting for a worker",
+))
+
+
+def render() -> str:
+    return REGISTRY.render()
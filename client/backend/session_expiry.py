@@ -0,0 +1,113 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class SessionExpiryScheduler:
+    """按截止时间排序的会话过期调度器
+
+    每次活动把会话的截止时间推后（堆中旧条目惰性删除），后台任务只在
+    最早的截止时间到达时醒来，登记与刷新都是O(log n)。
+    """
+
+    def __init__(
+        self,
+        timeout_seconds: float,
+        on_expire: Callable[[str], Awaitable[None]],
+        is_busy: Callable[[str], bool] = lambda session_id: False,
+    ):
+        self.timeout_seconds = timeout_seconds
+        self.on_expire = on_expire
+        self.is_busy = is_busy
+
+        self._heap: List[Tuple[float, int, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._deadlines
+
+    def touch(self, session_id: str):
+        """登记会话或刷新其截止时间"""
+        deadline = time.monotonic() + self.timeout_seconds
+        self._deadlines[session_id] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), session_id))
+
+        # 惰性删除的旧条目过多时重建堆
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, next(self._counter), sid) for sid, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+        if self._heap[0][2] == session_id:
+            self._wakeup.set()
+
+    def remove(self, session_id: str):
+        self._deadlines.pop(session_id, None)
+
+    def _pop_live(self) -> Optional[Tuple[float, int, str]]:
+        """丢弃堆顶已失效的条目，返回当前最早的有效条目（不弹出）"""
+        while self._heap:
+            deadline, _, session_id = self._heap[0]
+            if self._deadlines.get(session_id) == deadline:
+                return self._heap[0]
+            heapq.heappop(self._heap)
+        return None
+
+    def least_recently_active(self, exclude: Callable[[str], bool]) -> Optional[str]:
+        """最久未活动且不满足exclude的会话（截止时间最早即最久未活动）"""
+        skipped = []
+        found = None
+        while True:
+            head = self._pop_live()
+            if head is None:
+                break
+            if not exclude(head[2]):
+                found = head[2]
+                break
+            skipped.append(heapq.heappop(self._heap))
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            head = self._pop_live()
+            timeout = None if head is None else head[0] - time.monotonic()
+
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, session_id = heapq.heappop(self._heap)
+            if self.is_busy(session_id):
+                # 正在生成回复的会话顺延
+                self.touch(session_id)
+                continue
+
+            self._deadlines.pop(session_id, None)
+            try:
+                logging.info(f"Cleaning up expired session: {session_id}")
+                await self.on_expire(session_id)
+            except Exception as e:
+                logging.error(f"Error expiring session {session_id}: {e}")
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# memory：单进程；sqlite：多个uvicorn worker（或重启后）共享会话
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "sessions.db")
+
+
+@dataclass
+class SessionRecord:
+    """可持久化的会话状态（不包含MCP连接等进程内资源）"""
+    session_id: str
+    chat_history: List[Dict[str, Any]] = field(default_factory=list)
+    conversation_history: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: datetime = field(default_factory=datetime.now)
+    last_activity: datetime = field(default_factory=datetime.now)
+    # 准入控制的公平排队按用户区分，未提供时按会话区分
+    user_id: Optional[str] = None
+
+
+class SessionStore(ABC):
+    """会话存储接口；未实现全部抽象方法的存储在创建时就会报错"""
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        ...
+
+    @abstractmethod
+    async def save(self, record: SessionRecord):
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    async def delete_expired(self, cutoff: datetime) -> List[str]:
+        """删除last_activity早于cutoff的会话，返回被删除的会话ID"""
+
+    @abstractmethod
+    async def count(self) -> int:
+        ...
+
+    async def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    def __init__(self):
+        self._records: Dict[str, SessionRecord] = {}
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        return self._records.get(session_id)
+
+    async def save(self, record: SessionRecord):
+        self._records[record.session_id] = record
+
+    async def delete(self, session_id: str):
+        self._records.pop(session_id, None)
+
+    async def delete_expired(self, cutoff: datetime) -> List[str]:
+        expired = [sid for sid, record in self._records.items() if record.last_activity < cutoff]
+        for session_id in expired:
+            del self._records[session_id]
+        return expired
+
+    async def count(self) -> int:
+        return len(self._records)
+
+
+class SQLiteSessionStore(SessionStore):
+    """基于SQLite文件的会话存储，阻塞操作放到线程池执行"""
+
+    def __init__(self, path: str = SESSION_STORE_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _init_db(self):
+        with self._connect() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    chat_history TEXT NOT NULL,
+                    conversation_history TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    last_activity TEXT NOT NULL,
+                    user_id TEXT
+                )
+                """
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(sessions)")}
+            if "user_id" not in columns:
+                # 兼容旧版本创建的数据库
+                connection.execute("ALTER TABLE sessions ADD COLUMN user_id TEXT")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions (last_activity)"
+            )
+
+    def _get(self, session_id: str) -> Optional[SessionRecord]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT session_id, chat_history, conversation_history, created_at, last_activity, user_id "
+                "FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return SessionRecord(
+            session_id=row[0],
+            chat_history=json.loads(row[1]),
+            conversation_history=json.loads(row[2]),
+            created_at=datetime.fromisoformat(row[3]),
+            last_activity=datetime.fromisoformat(row[4]),
+            user_id=row[5],
+        )
+
+    def _save(self, record: SessionRecord):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions "
+                "(session_id, chat_history, conversation_history, created_at, last_activity, user_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    record.session_id,
+                    json.dumps(record.chat_history, ensure_ascii=False, default=str),
+                    json.dumps(record.conversation_history, ensure_ascii=False, default=str),
+                    record.created_at.isoformat(),
+                    record.last_activity.isoformat(),
+                    record.user_id,
+                ),
+            )
+
+    def _delete(self, session_id: str):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _delete_expired(self, cutoff: datetime) -> List[str]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT session_id FROM sessions WHERE last_activity < ?", (cutoff.isoformat(),)
+            ).fetchall()
+            connection.execute("DELETE FROM sessions WHERE last_activity < ?", (cutoff.isoformat(),))
+        return [row[0] for row in rows]
+
+    def _count(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        return await asyncio.to_thread(self._get, session_id)
+
+    async def save(self, record: SessionRecord):
+        await asyncio.to_thread(self._save, record)
+
+    async def delete(self, session_id: str):
+        await asyncio.to_thread(self._delete, session_id)
+
+    async def delete_expired(self, cutoff: datetime) -> List[str]:
+        return await asyncio.to_thread(self._delete_expired, cutoff)
+
+    async def count(self) -> int:
+        return await asyncio.to_thread(self._count)
+
+
+def create_session_store(kind: str = SESSION_STORE) -> SessionStore:
+    if kind == "sqlite":
+        return SQLiteSessionStore(SESSION_STORE_PATH)
+    if kind == "memory":
+        return InMemorySessionStore()
+    raise ValueError(f"Unknown SESSION_STORE: {kind}")
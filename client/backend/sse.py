@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+# token事件合并窗口（毫秒），0表示不合并、每个token单独一帧
+SSE_COALESCE_WINDOW_MS = int(os.getenv("SSE_COALESCE_WINDOW_MS", "30"))
+# 缓冲的token超过该字节数时立即发送
+SSE_COALESCE_MAX_BYTES = int(os.getenv("SSE_COALESCE_MAX_BYTES", "1024"))
+# 每个会话保留的最近事件数，用于断线重连后按Last-Event-ID补发
+SSE_REPLAY_BUFFER_SIZE = int(os.getenv("SSE_REPLAY_BUFFER_SIZE", "1024"))
+
+def format_sse(event: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """把事件编码为一个SSE帧，带id时客户端重连会通过Last-Event-ID带回"""
+    if event_id is None:
+        return f"data: {json.dumps(event)}\n\n"
+    return f"id: {event_id}\ndata: {json.dumps(event)}\n\n"
+
+
+class EventLog:
+    """会话级的事件环形缓冲
+
+    生成任务把事件追加到这里，SSE连接只是从某个事件ID开始跟随读取，
+    连接断开不影响生成；重连时补发缺失的事件后继续跟随实时事件。
+    事件ID在会话内单调递增，跨轮次不重置。需要的事件已被挤出缓冲时，
+    先发送一个gap事件说明丢失的ID范围，再从缓冲中最早的事件继续。
+    """
+
+    def __init__(self, maxlen: int = SSE_REPLAY_BUFFER_SIZE):
+        self._events: deque = deque(maxlen=maxlen)
+        self.last_id = 0
+        # 当前（或最近一次）轮次第一个事件的ID
+        self.turn_start_id = 1
+        self.turn_active = False
+        self._updated = asyncio.Event()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def start_turn(self):
+        self.turn_start_id = self.last_id + 1
+        self.turn_active = True
+        self._notify()
+
+    def end_turn(self):
+        self.turn_active = False
+        self._notify()
+
+    def append(self, event: Dict[str, Any]) -> int:
+        self.last_id += 1
+        self._events.append((self.last_id, event))
+        self._notify()
+        return self.last_id
+
+    @property
+    def first_id(self) -> int:
+        """缓冲中最早的事件ID，缓冲为空时为下一个事件的ID"""
+        return self._events[0][0] if self._events else self.last_id + 1
+
+    def events_after(self, event_id: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """缓冲中ID大于event_id的事件（已被挤出缓冲的事件无法补发）"""
+        if not self._events:
+            return []
+        # ID连续，直接按偏移切片
+        offset = max(0, event_id - self._events[0][0] + 1)
+        return [self._events[i] for i in range(offset, len(self._events))]
+
+    async def follow(self, after_id: int) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """从after_id之后开始读取事件，直到当前轮次结束"""
+        cursor = after_id
+        while True:
+            first_id = self.first_id
+            if cursor < first_id - 1:
+                # 客户端落后太多（或很久之后才重连），中间的事件已无法补发
+                gap = {
+                    "type": "gap",
+                    "missed_from": cursor + 1,
+                    "missed_to": first_id - 1,
+                    "message": "Some events are no longer available, the response is incomplete",
+                }
+                cursor = first_id - 1
+                yield cursor, gap
+
+            for event_id, event in self.events_after(cursor):
+                cursor = event_id
+                yield event_id, event
+
+            if self.last_id > cursor:
+                continue
+            if not self.turn_active:
+                return
+            await self._updated.wait()
+
+
+async def coalesce_tokens(
+    events: AsyncIterator[Dict[str, Any]],
+    emit: Callable[[Dict[str, Any]], Any],
+    window_ms: int = SSE_COALESCE_WINDOW_MS,
+    max_bytes: int = SSE_COALESCE_MAX_BYTES,
+) -> None:
+    """读取events并把连续的token事件合并后交给emit
+
+    第一个token进入缓冲后最多等待window_ms，或缓冲达到max_bytes时发送一个合并后的token事件；
+    其他事件（工具调用、完成、错误）到达时先发送缓冲内容，保证事件顺序不变。
+    只有缓冲中有token时才挂一个事件循环定时器，到期直接发送缓冲内容，
+    不需要额外的任务或队列，也不会打断源生成器。源抛出异常时先发送已缓冲的token。
+    """
+    if window_ms <= 0:
+        async for event in events:
+            emit(event)
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    buffer: List[str] = []
+    buffered_bytes = 0
+    flush_timer: Optional[asyncio.TimerHandle] = None
+
+    def flush():
+        nonlocal buffered_bytes, flush_timer
+        if flush_timer is not None:
+            flush_timer.cancel()
+            flush_timer = None
+        if buffer:
+            content = "".join(buffer)
+            buffer.clear()
+            buffered_bytes = 0
+            emit({"type": "token", "content": content})
+
+    try:
+        async for event in events:
+            if event.get("type") == "token":
+                buffer.append(event["content"])
+                buffered_bytes += len(event["content"].encode("utf-8"))
+                if buffered_bytes >= max_bytes:
+                    flush()
+                elif flush_timer is None:
+                    flush_timer = loop.call_later(window, flush)
+                continue
+
+            flush()
+            emit(event)
+    finally:
+        flush()
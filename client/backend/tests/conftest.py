@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# app和llm_client导入时需要；测试不会访问真实的模型服务
+os.environ.setdefault("OPENAI_API_KEY", "test")
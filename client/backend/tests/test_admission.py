@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from admission import FairLimiter, Overloaded
+
+
+async def _admission_order(limiter, keys):
+    """占满名额后按keys顺序排队，释放后返回实际获得名额的顺序"""
+    order = []
+
+    async def request(key):
+        await limiter.acquire(key)
+        order.append(key)
+        await asyncio.sleep(0)
+        limiter.release()
+
+    await limiter.acquire("holder")
+    tasks = []
+    for key in keys:
+        tasks.append(asyncio.create_task(request(key)))
+        await asyncio.sleep(0)
+    assert limiter.queue_depth == len(keys)
+
+    limiter.release()
+    await asyncio.wait_for(asyncio.gather(*tasks), 5)
+    assert limiter.active == 0
+    return order
+
+
+def test_light_user_is_not_stuck_behind_heavy_user():
+    limiter = FairLimiter("test", 1, weights={})
+    order = asyncio.run(_admission_order(limiter, ["heavy"] * 4 + ["light"]))
+    assert order == ["heavy", "light", "heavy", "heavy", "heavy"]
+
+
+def test_weights_share_slots_proportionally():
+    limiter = FairLimiter("test", 1, weights={"a": 2.0})
+    order = asyncio.run(_admission_order(limiter, ["a"] * 4 + ["b"] * 4))
+    # a的权重为2，队首的6次名额中a占4次
+    assert order[:6].count("a") == 4
+    assert order == ["a", "a", "b", "a", "a", "b", "b", "b"]
+
+
+def test_free_slots_are_granted_without_queueing():
+    async def scenario():
+        limiter = FairLimiter("test", 2, weights={})
+        await limiter.acquire("a")
+        await limiter.acquire("b")
+        assert limiter.active == 2 and limiter.queue_depth == 0
+        limiter.release()
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_gives_up_its_turn():
+    async def scenario():
+        limiter = FairLimiter("test", 1, weights={})
+        await limiter.acquire("holder")
+        cancelled = asyncio.create_task(limiter.acquire("a"))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.wait_for(waiting, 5)
+        assert limiter.active == 1 and limiter.queue_depth == 0
+
+    asyncio.run(scenario())
+
+
+def test_check_rejects_when_estimated_wait_is_too_long():
+    async def scenario():
+        limiter = FairLimiter("test", 1, max_queue_wait_seconds=2.5, weights={})
+        await limiter.acquire("holder")
+        limiter.check()
+        waiters = [asyncio.create_task(limiter.acquire(f"user{i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        # 平均占用1秒、并发1，排在2个请求之后预计等待3秒
+        with pytest.raises(Overloaded) as error:
+            limiter.check()
+        assert error.value.retry_after == 3
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(scenario())
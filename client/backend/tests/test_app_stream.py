@@ -0,0 +1,71 @@
+import asyncio
+import importlib
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from session_store import SessionRecord
+from sse import EventLog
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    # 在临时目录导入，避免在工作目录下生成数据库文件
+    monkeypatch.chdir(tmp_path)
+    app_module = importlib.import_module("app")
+    yield app_module
+    app_module.agent_sessions.clear()
+
+
+def _add_session(app_module, session_id):
+    async def cleanup():
+        pass
+
+    now = datetime.now()
+    session_data = {
+        "mcp_client": SimpleNamespace(conversation_history=[], user_id=None, cleanup=cleanup),
+        "chat_history": [],
+        "session_id": session_id,
+        "created_at": now,
+        "last_activity": now,
+        "event_log": EventLog(maxlen=16),
+        "producer": None,
+    }
+    app_module.agent_sessions[session_id] = session_data
+    asyncio.run(app_module.session_store.save(SessionRecord(session_id=session_id, created_at=now, last_activity=now)))
+    return session_data
+
+
+def _finished_turn(event_log, *texts):
+    event_log.start_turn()
+    for text in texts:
+        event_log.append({"type": "token", "content": text})
+    event_log.append({"type": "completion"})
+    event_log.end_turn()
+
+
+def test_stream_without_last_event_id_does_not_replay_finished_turn(backend):
+    session_data = _add_session(backend, "finished-turn")
+    _finished_turn(session_data["event_log"], "previous ", "answer")
+
+    # 不进入TestClient上下文，不运行startup（不连接MCP代理）
+    client = TestClient(backend.app)
+    body = client.get("/sessions/finished-turn/stream").text
+
+    assert "No response in progress" in body
+    assert "previous" not in body
+
+
+def test_stream_with_last_event_id_replays_from_it(backend):
+    session_data = _add_session(backend, "resume")
+    _finished_turn(session_data["event_log"], "first ", "second")
+
+    client = TestClient(backend.app)
+    body = client.get("/sessions/resume/stream", params={"last_event_id": 1}).text
+    replay_all = client.get("/sessions/resume/stream", headers={"Last-Event-ID": "0"}).text
+
+    assert "first" not in body
+    assert "id: 2\n" in body and "second" in body and "completion" in body
+    assert "first" in replay_all and "second" in replay_all
@@ -0,0 +1,119 @@
+import asyncio
+import importlib
+import json
+from types import SimpleNamespace
+
+import mcp.types as types
+from openai.types.chat import ChatCompletionChunk
+
+import assessment
+from assessment import ArtifactCache, AssessmentPipeline, AssessmentState
+from tool_catalog import tool_catalog
+from trace_replay import Tracer
+
+
+def _pipeline(password, artifacts):
+    config = {"host": "db1", "user": "u", "password": password, "database": "db"}
+    return AssessmentPipeline(config, artifacts=artifacts)
+
+
+def test_artifacts_are_not_shared_across_passwords():
+    async def scenario():
+        artifacts = ArtifactCache(60)
+        calls = []
+
+        async def load(password):
+            calls.append(password)
+            return [f"tables for {password}"]
+
+        valid = _pipeline("secret", artifacts)
+        wrong = _pipeline("wrong", artifacts)
+        assert valid._artifact_key("tables") != wrong._artifact_key("tables")
+
+        assert await artifacts.get(valid._artifact_key("tables"), lambda: load("secret")) == ["tables for secret"]
+        assert await artifacts.get(wrong._artifact_key("tables"), lambda: load("wrong")) == ["tables for wrong"]
+        # 同一凭据仍然命中缓存
+        assert await artifacts.get(_pipeline("secret", artifacts)._artifact_key("tables"), lambda: load("again")) == [
+            "tables for secret"
+        ]
+        assert calls == ["secret", "wrong"]
+
+    asyncio.run(scenario())
+
+
+class FakeSession:
+    """录制阶段的MCP会话：按工具名返回固定结果"""
+
+    RESULTS = {
+        "get_tables": [{"tableName": "patients", "tableComment": ""}],
+        "get_schema": {"tables": [{"table_name": "patients", "columns": [{"name": "id", "type": "int"}]}]},
+        "generate_rules": {"rules": [{"rule_id": "r1"}]},
+        "execute_rules": {"passed": 1, "failed": 0},
+        "generate_report": {"report": "ok"},
+    }
+
+    def __init__(self):
+        self.calls = []
+
+    async def list_tools(self):
+        return types.ListToolsResult(tools=self.tools())
+
+    @staticmethod
+    def tools():
+        return [types.Tool(name=name, inputSchema={"type": "object"}) for name in FakeSession.RESULTS]
+
+    async def call_tool(self, name, arguments):
+        self.calls.append(name)
+        text = json.dumps({"success": True, "data": self.RESULTS[name]})
+        return types.CallToolResult(content=[types.TextContent(type="text", text=text)])
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        async def stream():
+            for text in ("一切", "正常"):
+                yield ChatCompletionChunk.model_validate({
+                    "id": "c", "object": "chat.completion.chunk", "created": 0, "model": request["model"],
+                    "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+                })
+        return stream()
+
+
+def test_assessment_replays_from_trace_without_mcp_or_model(tmp_path, monkeypatch):
+    app_module = importlib.import_module("app")
+    path = str(tmp_path / "trace.jsonl")
+    config = {"host": "db1", "user": "u", "password": "p", "database": "db"}
+
+    def pipeline():
+        return AssessmentPipeline(config, tables=["patients"], summarize=True)
+
+    async def record():
+        recorder = Tracer("record", path, speed=0)
+        monkeypatch.setattr(assessment, "tracer", recorder)
+        await recorder.record_tools(FakeSession.tools())
+        return await pipeline().run(FakeSession(), FakeOpenAI(), app_module.DEFAULT_MODEL)
+
+    async def fail(*args, **kwargs):
+        raise AssertionError("replay must not use the MCP pool or the model API")
+
+    async def replay():
+        replayer = Tracer("replay", path, speed=0)
+        monkeypatch.setattr(assessment, "tracer", replayer)
+        monkeypatch.setattr(app_module, "tracer", replayer)
+        monkeypatch.setattr(app_module.mcp_pool, "acquire", fail)
+        monkeypatch.setattr(app_module, "get_openai_client", fail)
+        tool_catalog.invalidate()
+        return await app_module.run_assessment(pipeline()), replayer
+
+    recorded = asyncio.run(record())
+    assert recorded["state"] == AssessmentState.COMPLETED, recorded
+    tool_catalog.invalidate()
+
+    replayed, replayer = asyncio.run(replay())
+    assert replayed["state"] == AssessmentState.COMPLETED, replayed
+    assert replayed["result"] == recorded["result"]
+    assert replayed["result"]["summary"] == "一切正常"
+    assert replayer.misses == 0
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from collections import defaultdict
+
+import pytest
+
+from assessment import AssessmentError, AssessmentState
+from batch_jobs import BatchJobQueue
+
+
+def _item(host, name, duration):
+    return {
+        "database_config": {"host": host, "user": "u", "password": "p", "database": "db"},
+        "tables": [name],
+        "duration": duration,
+    }
+
+
+class Recorder:
+    """模拟的流水线：按评估项的duration休眠，记录开始/结束时间和每个主机的并发数"""
+
+    def __init__(self, items):
+        self.durations = {item["tables"][0]: item["duration"] for item in items}
+        self.started = {}
+        self.finished = {}
+        self.running = defaultdict(int)
+        self.max_running = defaultdict(int)
+        self.t0 = time.perf_counter()
+
+    async def __call__(self, pipeline):
+        name = pipeline.tables[0]
+        host = pipeline.database_config["host"]
+        self.started[name] = time.perf_counter() - self.t0
+        self.running[host] += 1
+        self.max_running[host] = max(self.max_running[host], self.running[host])
+        try:
+            await asyncio.sleep(self.durations[name])
+        finally:
+            self.running[host] -= 1
+            self.finished[name] = time.perf_counter() - self.t0
+        return {"state": AssessmentState.COMPLETED, "timings": {}}
+
+
+async def _run_job(items, workers, per_host):
+    recorder = Recorder(items)
+    queue = BatchJobQueue(recorder, workers=workers, per_host_concurrency=per_host)
+    await queue.start()
+    try:
+        job = await queue.submit(items)
+        while job.status not in ("completed", "partial", "failed"):
+            await asyncio.sleep(0.01)
+    finally:
+        await queue.stop()
+    return queue, job, recorder
+
+
+def test_freed_slot_is_reused_while_a_long_item_runs():
+    items = [_item("db1", "long", 0.6)] + [_item("db1", f"short{i}", 0.2) for i in range(3)]
+    queue, job, recorder = asyncio.run(_run_job(items, workers=4, per_host=2))
+
+    assert job.status == "completed"
+    assert recorder.max_running["db1"] == 2
+    # 长任务运行期间，另一个名额依次执行三个短任务
+    assert recorder.started["short2"] < recorder.finished["long"]
+    assert max(recorder.finished.values()) < 0.75
+    # 主机空闲后计数全部清除
+    assert not queue._pending and not queue._slots and not queue._active
+
+
+def test_per_host_limit_does_not_block_other_hosts():
+    items = [_item("db1", f"a{i}", 0.1) for i in range(6)] + [_item("db2", f"b{i}", 0.1) for i in range(2)]
+    queue, job, recorder = asyncio.run(_run_job(items, workers=4, per_host=2))
+
+    assert job.status == "completed"
+    assert recorder.max_running["db1"] == 2
+    assert recorder.max_running["db2"] == 2
+    # db1排队的评估项不占用worker，db2的评估项立即开始
+    assert recorder.started["b0"] < 0.05 and recorder.started["b1"] < 0.05
+    assert not queue._pending and not queue._slots and not queue._active
+
+
+def test_invalid_port_is_rejected_at_submit():
+    async def scenario():
+        queue = BatchJobQueue(Recorder([]), workers=1)
+        item = _item("db1", "t1", 0)
+        item["database_config"]["port"] = "not-a-port"
+        with pytest.raises(AssessmentError, match="Invalid database port"):
+            await queue.submit([item])
+        assert queue.jobs == {}
+
+    asyncio.run(scenario())
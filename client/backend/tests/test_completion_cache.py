@@ -0,0 +1,61 @@
+import asyncio
+import copy
+
+from completion_cache import CompletionCache
+
+TOOLS = [{"type": "function", "function": {"name": "get_tables", "parameters": {"type": "object"}}}]
+
+
+def _conversation(first_id, second_id):
+    return [
+        {"role": "system", "content": "system"},
+        {"role": "user", "content": "list tables"},
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {"id": first_id, "type": "function", "function": {"name": "get_tables", "arguments": "{}"}},
+                {"id": second_id, "type": "function", "function": {"name": "get_tables", "arguments": "{\"db\": 2}"}},
+            ],
+        },
+        {"role": "tool", "tool_call_id": first_id, "content": "[\"a\"]"},
+        {"role": "tool", "tool_call_id": second_id, "content": "[\"b\"]"},
+    ]
+
+
+def test_key_ignores_tool_call_ids_from_different_sessions(tmp_path):
+    cache = CompletionCache(str(tmp_path / "completions.db"), enabled=True)
+    session_a = _conversation("call_Xq81abc", "call_9fZz01")
+    session_b = _conversation("call_Lm2kq7", "call_00Qp3s")
+    original = copy.deepcopy(session_a)
+
+    assert cache.key("gpt-4o", session_a, TOOLS, "auto") == cache.key("gpt-4o", session_b, TOOLS, "auto")
+    # 计算键不修改对话历史
+    assert session_a == original
+
+
+def test_key_keeps_tool_call_pairing(tmp_path):
+    cache = CompletionCache(str(tmp_path / "completions.db"), enabled=True)
+    swapped = _conversation("id_1", "id_2")
+    swapped[3]["tool_call_id"], swapped[4]["tool_call_id"] = "id_2", "id_1"
+
+    # 工具输出对应到另一个调用时，键必须不同
+    assert cache.key("gpt-4o", swapped, TOOLS, "auto") != cache.key("gpt-4o", _conversation("id_1", "id_2"), TOOLS, "auto")
+    assert cache.key("gpt-4o", _conversation("a", "b"), TOOLS, "auto") != cache.key("gpt-4o", _conversation("a", "b"), TOOLS, "none")
+
+
+def test_cached_completion_is_shared_across_sessions(tmp_path):
+    async def scenario():
+        cache = CompletionCache(str(tmp_path / "completions.db"), enabled=True)
+        completion = {"content": "two tables", "tool_calls": [], "seconds": 1.5}
+        await cache.put(cache.key("gpt-4o", _conversation("call_a1", "call_a2"), TOOLS, "auto"), completion)
+
+        cached = await cache.get(cache.key("gpt-4o", _conversation("call_b1", "call_b2"), TOOLS, "auto"))
+        assert cached == completion
+
+    asyncio.run(scenario())
+
+
+def test_disabled_cache_has_no_key(tmp_path):
+    cache = CompletionCache(str(tmp_path / "completions.db"), enabled=False)
+    assert cache.key("gpt-4o", _conversation("a", "b"), TOOLS, "auto") is None
@@ -0,0 +1,64 @@
+import json
+
+from history_compaction import HistoryCompactor
+
+
+def _tool_round(round_index, size):
+    call_id = f"call_{round_index}"
+    return [
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{"id": call_id, "type": "function",
+                            "function": {"name": "execute_query", "arguments": json.dumps({"n": round_index})}}],
+        },
+        {"role": "tool", "tool_call_id": call_id, "content": f"round {round_index} " + "x" * size},
+    ]
+
+
+def test_trims_earlier_rounds_in_current_turn():
+    history = [{"role": "system", "content": "system"}, {"role": "user", "content": "check data quality"}]
+    for round_index in range(4):
+        history.extend(_tool_round(round_index, 4000))
+    latest = history[-1]
+
+    compactor = HistoryCompactor("gpt-4o", token_budget=1500, keep_recent_turns=2, preview_chars=100)
+    saved = compactor.compact(history)
+
+    assert saved > 0
+    assert compactor.count(history) <= 1500
+    tool_messages = [message for message in history if message["role"] == "tool"]
+    assert len(tool_messages) == 4
+    # 前三次调用的输出已被后续助手消息消费，被截断；最后一次调用的输出原样保留
+    for message in tool_messages[:-1]:
+        assert "已截断" in message["content"]
+        assert len(message["content"]) < 200
+    assert tool_messages[-1] is latest
+    # tool_calls与tool消息仍然成对
+    assert [m["tool_call_id"] for m in tool_messages] == [f"call_{i}" for i in range(4)]
+
+
+def test_trims_older_turns_before_current_turn():
+    history = [{"role": "system", "content": "system"}, {"role": "user", "content": "first"}]
+    history.extend(_tool_round(0, 4000))
+    history.append({"role": "assistant", "content": "done"})
+    history.append({"role": "user", "content": "second"})
+    history.extend(_tool_round(1, 4000))
+    history.extend(_tool_round(2, 400))
+
+    compactor = HistoryCompactor("gpt-4o", token_budget=1200, keep_recent_turns=1, preview_chars=100)
+    compactor.compact(history)
+
+    tool_messages = [message for message in history if message["role"] == "tool"]
+    # 上一轮的输出先被截断，仍超出预算时再截断本轮较早的输出
+    assert "已截断" in tool_messages[0]["content"]
+    assert "已截断" in tool_messages[1]["content"]
+    assert "已截断" not in tool_messages[2]["content"]
+
+
+def test_within_budget_is_untouched():
+    history = [{"role": "system", "content": "system"}, {"role": "user", "content": "hi"}]
+    history.extend(_tool_round(0, 100))
+    snapshot = [dict(message) for message in history]
+    assert HistoryCompactor("gpt-4o", token_budget=10000).compact(history) == 0
+    assert history == snapshot
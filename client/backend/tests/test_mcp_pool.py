@@ -0,0 +1,101 @@
+import asyncio
+import json
+import socket
+from contextlib import asynccontextmanager
+
+import pytest
+import uvicorn
+
+from benchmarks.mock_servers import MOCK_DATABASE, SharedTransportMCPApp, create_mcp_server
+from mcp_pool import MCPConnectionPool, PooledConnection, close_shared_http_transport
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def shared_transport_proxy():
+    """在本进程中运行会话语义与server/src/http-streaming.ts一致的MCP端点"""
+    app = SharedTransportMCPApp(create_mcp_server(tool_latency_ms=0)._mcp_server)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield app, f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+        await close_shared_http_transport()
+
+
+async def _get_tables(session) -> list:
+    result = await asyncio.wait_for(session.call_tool("get_tables", MOCK_DATABASE), 10)
+    assert not result.isError, result
+    return json.loads(result.content[0].text)["data"]
+
+
+def test_new_initialize_invalidates_previous_session():
+    """代理的语义：第二条连接initialize后，第一条连接的会话失效"""
+
+    async def main():
+        async with shared_transport_proxy() as (app, url):
+            first = PooledConnection(1, url, "http")
+            second = PooledConnection(2, url, "http")
+            await first.start()
+            assert await _get_tables(first.session)
+            await second.start()
+            assert await _get_tables(second.session)
+            with pytest.raises(Exception):
+                await _get_tables(first.session)
+            await first.close()
+            await second.close()
+
+    asyncio.run(main())
+
+
+def test_pool_keeps_one_connection_for_many_sessions():
+    async def main():
+        async with shared_transport_proxy() as (app, url):
+            pool = MCPConnectionPool(url, min_size=1, max_size=4, sessions_per_connection=1, transport="http")
+            await pool.start()
+            try:
+                leases = [await pool.acquire() for _ in range(8)]
+                results = await asyncio.gather(*(_get_tables(lease.session) for lease in leases))
+                assert all(results)
+                assert pool.stats()["connections"] == 1
+                assert app.initialize_requests == 1
+                for lease in leases:
+                    await pool.release(lease)
+            finally:
+                await pool.close()
+            # 关闭连接时不发送DELETE（代理收到DELETE会关闭所有会话共用的transport）
+            assert app.delete_requests == 0
+
+    asyncio.run(main())
+
+
+def test_pool_reconnects_after_discarding_connection():
+    async def main():
+        async with shared_transport_proxy() as (app, url):
+            pool = MCPConnectionPool(url, min_size=1, max_size=1, transport="http")
+            await pool.start()
+            try:
+                lease = await pool.acquire()
+                await pool.release(lease)
+                # 模拟健康检查失败：丢弃连接后补足min_size
+                await pool._discard(lease.connection)
+                await pool.check_health()
+                lease = await pool.acquire()
+                assert await _get_tables(lease.session)
+                await pool.release(lease)
+            finally:
+                await pool.close()
+            assert app.initialize_requests == 2
+            assert app.delete_requests == 0
+
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+import asyncio
+
+from session_expiry import SessionExpiryScheduler
+
+
+def _scheduler(timeout, is_busy=lambda session_id: False):
+    expired = []
+
+    async def on_expire(session_id):
+        expired.append(session_id)
+
+    return SessionExpiryScheduler(timeout, on_expire, is_busy), expired
+
+
+def test_touched_session_is_not_evicted_at_its_old_deadline():
+    async def scenario():
+        scheduler, expired = _scheduler(0.1)
+        scheduler.start()
+        try:
+            scheduler.touch("a")
+            scheduler.touch("b")
+            await asyncio.sleep(0.06)
+            scheduler.touch("a")
+            # b的截止时间已过；a最初的截止时间也已过，但活动后已顺延
+            await asyncio.sleep(0.07)
+            assert expired == ["b"]
+            assert "a" in scheduler and "b" not in scheduler
+
+            await asyncio.sleep(0.1)
+            assert expired == ["b", "a"]
+        finally:
+            scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_busy_session_is_extended_instead_of_evicted():
+    async def scenario():
+        busy = {"a"}
+        scheduler, expired = _scheduler(0.05, is_busy=lambda session_id: session_id in busy)
+        scheduler.start()
+        try:
+            scheduler.touch("a")
+            await asyncio.sleep(0.08)
+            assert expired == [] and "a" in scheduler
+
+            busy.clear()
+            await asyncio.sleep(0.08)
+            assert expired == ["a"]
+        finally:
+            scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stale_heap_entries_are_skipped():
+    async def scenario():
+        scheduler, expired = _scheduler(0.05)
+        for _ in range(5):
+            scheduler.touch("a")
+        scheduler.touch("b")
+        # 堆中a的旧条目不算数：最久未活动的是a最后一次登记，早于b
+        assert len(scheduler._heap) == 6 and len(scheduler) == 2
+        assert scheduler.least_recently_active(exclude=lambda session_id: False) == "a"
+        assert scheduler.least_recently_active(exclude=lambda session_id: session_id == "a") == "b"
+
+        scheduler.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            scheduler.stop()
+        # 每个会话只过期一次，旧条目不会再次触发on_expire
+        assert sorted(expired) == ["a", "b"]
+        assert len(scheduler) == 0
+
+    asyncio.run(scenario())
+
+
+def test_heap_is_rebuilt_when_stale_entries_pile_up():
+    scheduler, _ = _scheduler(60)
+    for _ in range(200):
+        scheduler.touch("a")
+    assert len(scheduler._heap) <= 2 * len(scheduler) + 65
+
+
+def test_removed_session_deadline_is_cancelled():
+    async def scenario():
+        scheduler, expired = _scheduler(0.05)
+        scheduler.start()
+        try:
+            scheduler.touch("a")
+            scheduler.touch("b")
+            scheduler.remove("a")
+            assert "a" not in scheduler
+            assert scheduler.least_recently_active(exclude=lambda session_id: False) == "b"
+            await asyncio.sleep(0.1)
+            assert expired == ["b"]
+        finally:
+            scheduler.stop()
+
+    asyncio.run(scenario())
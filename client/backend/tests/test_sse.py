@@ -0,0 +1,108 @@
+import asyncio
+
+from sse import EventLog, coalesce_tokens
+
+
+async def _collect(event_log, after_id):
+    return [item async for item in event_log.follow(after_id)]
+
+
+def _token(text):
+    return {"type": "token", "content": text}
+
+
+def test_replays_events_after_last_event_id():
+    async def scenario():
+        event_log = EventLog(maxlen=10)
+        event_log.start_turn()
+        for text in "abcd":
+            event_log.append(_token(text))
+        event_log.end_turn()
+
+        events = await _collect(event_log, 2)
+        assert [(event_id, event["content"]) for event_id, event in events] == [(3, "c"), (4, "d")]
+
+    asyncio.run(scenario())
+
+
+def test_gap_event_when_last_event_id_is_older_than_buffer():
+    async def scenario():
+        event_log = EventLog(maxlen=3)
+        event_log.start_turn()
+        for text in "abcdef":
+            event_log.append(_token(text))
+        event_log.end_turn()
+
+        events = await _collect(event_log, 1)
+        gap_id, gap = events[0]
+        assert gap["type"] == "gap"
+        assert (gap["missed_from"], gap["missed_to"]) == (2, 3)
+        assert gap_id == 3
+        assert [(event_id, event["content"]) for event_id, event in events[1:]] == [(4, "d"), (5, "e"), (6, "f")]
+
+        # 缓冲中有所需的全部事件时没有gap
+        events = await _collect(event_log, 3)
+        assert [event["type"] for _, event in events] == ["token"] * 3
+
+    asyncio.run(scenario())
+
+
+def test_follow_waits_for_live_events_until_turn_ends():
+    async def scenario():
+        event_log = EventLog(maxlen=10)
+        event_log.start_turn()
+        event_log.append(_token("a"))
+
+        async def produce():
+            await asyncio.sleep(0.01)
+            event_log.append(_token("b"))
+            event_log.append({"type": "completion"})
+            event_log.end_turn()
+
+        producer = asyncio.create_task(produce())
+        events = await asyncio.wait_for(_collect(event_log, 0), 5)
+        await producer
+        assert [event["type"] for _, event in events] == ["token", "token", "completion"]
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_tokens_keeps_order_and_flushes_on_window():
+    async def source():
+        yield _token("a")
+        yield _token("b")
+        yield {"type": "tool_call", "name": "get_tables"}
+        yield _token("c")
+        # 源暂停超过合并窗口时，定时器先把缓冲的token发出去
+        await asyncio.sleep(0.05)
+        yield _token("d")
+        yield {"type": "completion"}
+
+    async def scenario():
+        emitted = []
+        await coalesce_tokens(source(), emitted.append, window_ms=10, max_bytes=1024)
+        assert emitted == [
+            _token("ab"),
+            {"type": "tool_call", "name": "get_tables"},
+            _token("c"),
+            _token("d"),
+            {"type": "completion"},
+        ]
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_tokens_flushes_buffer_before_source_error():
+    async def source():
+        yield _token("a")
+        raise RuntimeError("boom")
+
+    async def scenario():
+        emitted = []
+        try:
+            await coalesce_tokens(source(), emitted.append, window_ms=1000, max_bytes=1024)
+        except RuntimeError:
+            pass
+        assert emitted == [_token("a")]
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tool_catalog import ToolCatalogCache
+
+
+def _tool(name):
+    return SimpleNamespace(name=name, description=f"{name} tool", inputSchema={"type": "object"})
+
+
+class FakeSession:
+    def __init__(self, tools, fail_times=0, on_list=None):
+        self.tools = tools
+        self.fail_times = fail_times
+        self.on_list = on_list
+        self.calls = 0
+
+    async def list_tools(self):
+        self.calls += 1
+        if self.on_list:
+            self.on_list()
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("list_tools failed")
+        return SimpleNamespace(tools=list(self.tools))
+
+
+def test_failed_fetch_keeps_cache_stale():
+    async def scenario():
+        cache = ToolCatalogCache()
+        session = FakeSession([_tool("get_tables")])
+        first = await cache.get(session)
+
+        cache.invalidate()
+        session.fail_times = 1
+        with pytest.raises(ConnectionError):
+            await cache.get(session)
+        assert not cache.is_fresh()
+
+        # 失败后下一次调用必须重新拉取，而不是返回旧目录
+        session.tools = [_tool("get_tables"), _tool("get_schema")]
+        second = await cache.get(session)
+        assert session.calls == 3
+        assert second.version == first.version + 1
+        assert [tool.name for tool in second.tools] == ["get_tables", "get_schema"]
+        assert cache.is_fresh()
+
+    asyncio.run(scenario())
+
+
+def test_notification_during_fetch_keeps_cache_stale():
+    async def scenario():
+        cache = ToolCatalogCache()
+        session = FakeSession([_tool("get_tables")], on_list=cache.invalidate)
+        await cache.get(session)
+        assert not cache.is_fresh()
+
+        session.on_list = None
+        await cache.get(session)
+        assert session.calls == 2
+        assert cache.is_fresh()
+
+    asyncio.run(scenario())
+
+
+def test_unchanged_tools_keep_version():
+    async def scenario():
+        cache = ToolCatalogCache()
+        session = FakeSession([_tool("get_tables")])
+        first = await cache.get(session)
+        cache.invalidate()
+        second = await cache.get(session)
+        assert second is first
+        assert second.version == 1
+
+    asyncio.run(scenario())
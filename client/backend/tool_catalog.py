@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, List, Optional
+
+if TYPE_CHECKING:
+    from mcp import ClientSession
+
+# 工具目录缓存有效期，代理发送tools/list_changed通知时会提前失效
+TOOL_CATALOG_TTL_SECONDS = int(os.getenv("TOOL_CATALOG_TTL_SECONDS", "600"))
+
+
+class ToolCatalog:
+    """某一版本的工具目录快照，所有会话共享，不要修改"""
+
+    def __init__(self, version: int, tools: List[Any], fingerprint: str):
+        self.version = version
+        self.tools = tuple(tools)
+        self.fingerprint = fingerprint
+        self.fetched_at = time.monotonic()
+
+        # 预先格式化为OpenAI API需要的工具定义
+        self.openai_tools = [
+            {
+                "type": "function",
+                "function": {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "parameters": tool.inputSchema
+                }
+            }
+            for tool in self.tools
+        ]
+
+
+def _fingerprint(tools: List[Any]) -> str:
+    payload = json.dumps(
+        [[tool.name, tool.description, tool.inputSchema] for tool in tools],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ToolCatalogCache:
+    """进程级、带版本号的工具目录缓存"""
+
+    def __init__(self, ttl_seconds: int = TOOL_CATALOG_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._catalog: Optional[ToolCatalog] = None
+        self._stale = True
+        # 每次失效加1，用来判断拉取期间是否又收到了变更通知
+        self._invalidations = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def current(self) -> Optional[ToolCatalog]:
+        return self._catalog
+
+    def is_fresh(self) -> bool:
+        return (
+            self._catalog is not None
+            and not self._stale
+            and time.monotonic() - self._catalog.fetched_at < self.ttl_seconds
+        )
+
+    async def get(self, session: "ClientSession") -> ToolCatalog:
+        """返回当前工具目录，过期或失效时通过session重新拉取"""
+        if self.is_fresh():
+            return self._catalog
+
+        async with self._lock:
+            if self.is_fresh():
+                return self._catalog
+
+            invalidations = self._invalidations
+            # 拉取失败时保持失效标记，下次调用重新拉取
+            response = await session.list_tools()
+            fingerprint = _fingerprint(response.tools)
+            # 拉取期间收到的通知说明结果可能已经过时，保持失效标记
+            if self._invalidations == invalidations:
+                self._stale = False
+
+            if self._catalog is not None and self._catalog.fingerprint == fingerprint:
+                self._catalog.fetched_at = time.monotonic()
+            else:
+                version = self._catalog.version + 1 if self._catalog else 1
+                self._catalog = ToolCatalog(version, response.tools, fingerprint)
+                logging.info(f"工具目录已更新到版本{version}: {[tool.name for tool in self._catalog.tools]}")
+
+            return self._catalog
+
+    def invalidate(self):
+        self._stale = True
+        self._invalidations += 1
+
+    async def handle_message(self, message: Any):
+        """ClientSession的message_handler，收到tools/list_changed通知时使缓存失效"""
+        import mcp.types as types
+
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ToolListChangedNotification
+        ):
+            logging.info("收到工具列表变更通知，工具目录缓存失效")
+            self.invalidate()
+
+
+# 所有会话共享的工具目录
+tool_catalog = ToolCatalogCache()
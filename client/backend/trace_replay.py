@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# off: 正常运行；record: 把模型流和工具调用（含耗时）追加到trace文件；replay: 只从trace文件回放，不访问模型服务和MCP服务器
+TRACE_MODE = os.getenv("TRACE_MODE", "off").lower()
+TRACE_PATH = os.getenv("TRACE_PATH", "traces.jsonl")
+# 回放速度倍数：1按录制时的节奏，2为两倍速，0为不等待（尽快回放）
+TRACE_REPLAY_SPEED = float(os.getenv("TRACE_REPLAY_SPEED", "1"))
+
+
+class TraceMiss(Exception):
+    """回放模式下trace中没有对应的请求"""
+
+
+def _request_key(payload: Dict[str, Any]) -> str:
+    text = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _dump(model: Any) -> Any:
+    return model.model_dump(mode="json", exclude_none=True) if hasattr(model, "model_dump") else model
+
+
+class ReplaySession:
+    """回放模式下代替MCP ClientSession，工具目录和工具结果都来自trace"""
+
+    def __init__(self, tracer: "Tracer"):
+        self.tracer = tracer
+
+    async def list_tools(self):
+        import mcp.types as types
+
+        return types.ListToolsResult(tools=[types.Tool.model_validate(tool) for tool in self.tracer.replay_tools()])
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None):
+        return await self.tracer.replay_tool_call(name, arguments or {})
+
+    async def send_ping(self):
+        return None
+
+
+class Tracer:
+    """录制/回放模型流式响应和MCP工具调用
+
+    trace文件是JSONL，每行一条记录：tools（工具目录）、completion（请求键 + 每个chunk相对请求开始的时间）、
+    tool_call（请求键 + 结果或错误 + 耗时）。请求键是请求内容的哈希；同一请求录制多次时回放依次轮换。
+    回放时工具调用的id、结果都与录制时一致，因此后续请求的键也能对上。
+    """
+
+    def __init__(self, mode: str = TRACE_MODE, path: str = TRACE_PATH, speed: float = TRACE_REPLAY_SPEED):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"TRACE_MODE must be off, record or replay, got {mode!r}")
+        self.mode = mode
+        self.path = path
+        self.speed = max(0.0, speed)
+        self._write_lock = threading.Lock()
+        self._recorded_tools: Optional[str] = None
+
+        self._loaded = False
+        self._tools: List[Dict[str, Any]] = []
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+        self.replayed = 0
+        self.misses = 0
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._write_lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def _write(self, record: Dict[str, Any]):
+        try:
+            await asyncio.to_thread(self._append, record)
+        except Exception as e:
+            logging.error(f"写入trace失败: {e}")
+
+    async def record_tools(self, tools: List[Any]):
+        """记录工具目录（内容不变时只记录一次）"""
+        dumped = [_dump(tool) for tool in tools]
+        fingerprint = _request_key({"tools": dumped})
+        if fingerprint == self._recorded_tools:
+            return
+        self._recorded_tools = fingerprint
+        await self._write({"type": "tools", "tools": dumped})
+
+    async def record_completion(self, request: Dict[str, Any], stream: AsyncIterator[Any], started: float) -> AsyncIterator[Any]:
+        """透传模型流，同时记录每个chunk相对请求开始（started，含等待响应头的时间）的时间；流完整结束才写入"""
+        chunks = []
+        async for chunk in stream:
+            chunks.append([round(time.perf_counter() - started, 4), _dump(chunk)])
+            yield chunk
+        await self._write({
+            "type": "completion",
+            "key": _request_key(request),
+            "seconds": round(time.perf_counter() - started, 4),
+            "chunks": chunks,
+        })
+
+    async def call_tool(self, session: Any, name: str, arguments: Dict[str, Any]):
+        """调用MCP工具；录制模式下同时记录结果或错误及耗时"""
+        if not self.recording:
+            return await session.call_tool(name, arguments)
+
+        started = time.perf_counter()
+        record = {"type": "tool_call", "key": _request_key({"name": name, "arguments": arguments}), "name": name}
+        try:
+            result = await session.call_tool(name, arguments)
+        except Exception as e:
+            record.update(error=str(e), seconds=round(time.perf_counter() - started, 4))
+            await self._write(record)
+            raise
+        record.update(result=_dump(result), seconds=round(time.perf_counter() - started, 4))
+        await self._write(record)
+        return result
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record["type"] == "tools":
+                        self._tools = record["tools"]
+                    else:
+                        self._entries[record["key"]].append(record)
+        except FileNotFoundError:
+            logging.error(f"trace文件不存在: {self.path}")
+        logging.info(f"已加载trace {self.path}: {sum(len(v) for v in self._entries.values())}条记录")
+
+    def preload(self):
+        """回放模式启动预热：读取trace并导入回放用到的openai/mcp类型（阻塞，放到线程中执行）"""
+        import mcp.types  # noqa: F401
+        from openai.types.chat import ChatCompletionChunk  # noqa: F401
+
+        self._load()
+
+    def _next(self, key: str, what: str) -> Dict[str, Any]:
+        self._load()
+        entries = self._entries.get(key)
+        if not entries:
+            self.misses += 1
+            raise TraceMiss(f"trace中没有对应的{what}（key={key[:12]}），请重新录制")
+        entry = entries[self._cursor[key] % len(entries)]
+        self._cursor[key] += 1
+        self.replayed += 1
+        return entry
+
+    async def _sleep_until(self, started: float, offset: float):
+        if self.speed == 0:
+            return
+        delay = started + offset / self.speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def replay_session(self) -> ReplaySession:
+        return ReplaySession(self)
+
+    def replay_tools(self) -> List[Dict[str, Any]]:
+        self._load()
+        return self._tools
+
+    async def replay_completion(self, request: Dict[str, Any]) -> AsyncIterator[Any]:
+        """按录制时的节奏（乘以speed）回放模型流"""
+        from openai.types.chat import ChatCompletionChunk
+
+        entry = self._next(_request_key(request), "模型请求")
+        started = time.perf_counter()
+        for offset, chunk in entry["chunks"]:
+            await self._sleep_until(started, offset)
+            yield ChatCompletionChunk.model_validate(chunk)
+
+    async def replay_tool_call(self, name: str, arguments: Dict[str, Any]):
+        import mcp.types as types
+
+        entry = self._next(_request_key({"name": name, "arguments": arguments}), f"工具调用{name}")
+        await self._sleep_until(time.perf_counter(), entry["seconds"])
+        if entry.get("error") is not None:
+            raise RuntimeError(entry["error"])
+        return types.CallToolResult.model_validate(entry["result"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "path": self.path, "replayed": self.replayed, "misses": self.misses}
+
+
+tracer = Tracer()
@@ -41,7 +41,7 @@ export interface ToolsResponse {
 
 // SSE Event types
 export interface SSEEvent {
-  type: 'token' | 'tool_call' | 'tool_call_started' | 'tool_call_complete' | 'tool_call_finished' | 'tool_response' | 'completion' | 'error';
+  type: 'token' | 'tool_call' | 'tool_call_started' | 'tool_call_complete' | 'tool_call_finished' | 'tool_response' | 'completion' | 'error' | 'gap';
   content?: string;
   arguments?: Record<string, unknown>;
   name?: string;
@@ -78,7 +78,7 @@ class ApiService {
     }
   }
 
-  async sendMessage(sessionId: string, message: string): Promise<{ success: boolean; message: string }> {
+  async sendMessage(sessionId: string, message: string): Promise<{ success: boolean; message: string; last_event_id?: number }> {
     try {
       const response = await fetch(`${API_BASE_URL}/sessions/${sessionId}/message`, {
         method: "POST",
@@ -106,10 +106,13 @@ class ApiService {
     onToolCall: (toolCall: { name?: string; call_id?: string; arguments?: Record<string, unknown> }) => void,
     onToolResponse: (response: { name?: string; call_id?: string; output: Record<string, unknown> | string }) => void,
     onCompletion: () => void,
-    onError: (error: string) => void
+    onError: (error: string) => void,
+    lastEventId?: number
   ): Promise<void> {
     try {
-      const eventSource = new EventSource(`${API_BASE_URL}/sessions/${sessionId}/stream`);
+      // Start from the id returned by sendMessage so events produced before the stream opened are replayed
+      const query = lastEventId !== undefined ? `?last_event_id=${lastEventId}` : '';
+      const eventSource = new EventSource(`${API_BASE_URL}/sessions/${sessionId}/stream${query}`);
 
       eventSource.onmessage = (event) => {
         // Only log tool-call related events to reduce noise
@@ -165,6 +168,9 @@ class ApiService {
               onCompletion();
               eventSource.close();
               break;
+            case 'gap':
+              console.warn('⚠️ Missed SSE events, response is incomplete:', data.message);
+              break;
             case 'error':
               console.log('❌ Stream error event:', data.message);
               onError(data.message || 'Unknown error');
@@ -182,6 +188,11 @@ class ApiService {
       };
 
       eventSource.onerror = (error) => {
+        // The browser reconnects on its own and resumes from Last-Event-ID
+        if (eventSource.readyState === EventSource.CONNECTING) {
+          console.warn('⚠️ SSE connection lost, reconnecting...');
+          return;
+        }
         console.error('❌ SSE connection error:', error);
         onError('Connection error');
         eventSource.close();
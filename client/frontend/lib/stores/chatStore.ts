@@ -240,7 +240,8 @@ export const useChatStore = create<ChatState>((set, get) => ({
             streamingComplete: true
           });
           set({ isTyping: false });
-        }
+        },
+        sendResponse.last_event_id
       );
 
       return true;
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""测量DatabaseMCPServer在N个并发工具调用下的吞吐量和延迟
+
+对比不同的线程池大小（0表示在事件循环中直接执行阻塞调用，即改造前的行为）。
+不指定--host时使用模拟的阻塞数据库驱动，每条SQL阻塞--fake-latency-ms毫秒。
+
+用法:
+    python benchmarks/bench_database_concurrency.py --calls 64 --workers 0,4,8,16
+    python benchmarks/bench_database_concurrency.py --host 127.0.0.1 --user root --password secret \\
+        --database clinical --table patients --query "SELECT COUNT(*) FROM patients"
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from database_mcp_server import DatabaseMCPServer
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class FakeCursor:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.rowcount = 0
+        self.description = (("columnName",),)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        # 与pymysql一样阻塞当前线程
+        time.sleep(self.latency)
+        self.rowcount = 1
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def fetchall(self):
+        return [{
+            "columnName": "id", "columnType": "int", "isNullable": "NO",
+            "columnComment": "", "columnDefault": None, "extra": "",
+        }]
+
+
+class FakeConnection:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.latency)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def run_round(workers: int, args) -> dict:
+    # 关闭表结构缓存，每次调用都执行阻塞的SQL
+    server = DatabaseMCPServer(pool_max_size=args.pool_size, max_workers=workers, query_timeout=args.timeout,
+                               schema_cache_max_entries=0)
+    if args.host is None:
+        latency = args.fake_latency_ms / 1000
+        server.pool.connect = lambda *a: FakeConnection(latency)
+
+    db = (args.host or "fake", args.user, args.password, args.database)
+
+    async def call(i: int) -> float:
+        started = time.perf_counter()
+        if i % 2 == 0:
+            result = await server.get_table_columns(*db, args.table, args.port)
+        else:
+            result = await server.execute_query(*db, args.query, None, args.port)
+        if not result.success:
+            raise RuntimeError(result.message)
+        return time.perf_counter() - started
+
+    # 预热：建立连接池中的连接
+    await asyncio.gather(*(call(i) for i in range(min(args.calls, args.pool_size))))
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(call(i) for i in range(args.calls)))
+    elapsed = time.perf_counter() - started
+
+    if server.executor:
+        server.executor.shutdown(wait=True)
+    server.pool.close_all()
+    return {
+        "workers": workers,
+        "elapsed": elapsed,
+        "throughput": args.calls / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=64, help="同时发起的工具调用数（get_table_columns和execute_query各半）")
+    parser.add_argument("--workers", default="0,4,8,16", help="逗号分隔的线程池大小")
+    parser.add_argument("--pool-size", type=int, default=16, help="每个数据库的连接池大小")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--fake-latency-ms", type=float, default=20, help="模拟驱动每条SQL的阻塞时间")
+    parser.add_argument("--host", default=None, help="真实MySQL主机；不指定时使用模拟驱动")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--database", default="test")
+    parser.add_argument("--table", default="patients")
+    parser.add_argument("--query", default="SELECT 1")
+    args = parser.parse_args()
+
+    results = [await run_round(int(w), args) for w in args.workers.split(",")]
+
+    print(f"{'workers':<10}{'elapsed':>12}{'calls/s':>12}{'mean':>12}{'p50':>12}{'p95':>12}")
+    for r in results:
+        print(
+            f"{r['workers']:<10}{r['elapsed'] * 1000:>10.1f}ms{r['throughput']:>12.1f}"
+            f"{r['mean_ms']:>10.1f}ms{r['p50_ms']:>10.1f}ms{r['p95_ms']:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
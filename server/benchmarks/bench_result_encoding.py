@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""对比工具结果的json格式（缩进对象列表）和compact格式（紧凑列式 + 字典编码）
+
+用模拟的execute_query结果、get_schema结果和规则执行结果，测量序列化后的字节数、序列化耗时和token数。
+安装了tiktoken时用cl100k_base统计token，否则按单词/标点/汉字粗略估算。
+
+用法:
+    python benchmarks/bench_result_encoding.py --rows 1000 --tables 50 --repeat 20
+"""
+import argparse
+import datetime
+import decimal
+import json
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from database_mcp_server import DatabaseResult, build_table_schema
+from result_format import decode_compact, format_result
+
+DEPARTMENTS = ["内科", "外科", "儿科", "妇产科", "急诊科", "骨科"]
+DIAGNOSES = ["I10", "E11.9", "J18.9", "K35.8", "N39.0", "S72.0", "O80"]
+STATUSES = ["已出院", "在院", "转院"]
+
+
+def query_result(rows: int) -> DatabaseResult:
+    rng = random.Random(0)
+    start = datetime.datetime(2024, 1, 1, 8, 0)
+    data = [
+        {
+            "patient_id": 100000 + i,
+            "name": f"患者{i:05d}",
+            "gender": rng.choice(["男", "女"]),
+            "birth_date": datetime.date(1940 + rng.randrange(80), 1 + rng.randrange(12), 1 + rng.randrange(28)),
+            "department": rng.choice(DEPARTMENTS),
+            "diagnosis_code": rng.choice(DIAGNOSES),
+            "admission_time": start + datetime.timedelta(minutes=37 * i),
+            "total_cost": decimal.Decimal(rng.randrange(10000, 5000000)) / 100,
+            "status": rng.choice(STATUSES),
+            "remark": None if rng.random() < 0.7 else "复诊",
+        }
+        for i in range(rows)
+    ]
+    return DatabaseResult(
+        success=True,
+        data={"rows": data, "rowCount": rows, "truncated": False, "truncatedBy": None, "nextCursor": None},
+        message=f"Query executed successfully. Returned {rows} rows",
+    )
+
+
+def schema_result(table_count: int, columns_per_table: int = 20) -> DatabaseResult:
+    types = ["int", "varchar(64)", "varchar(255)", "datetime", "decimal(12,2)", "date", "tinyint(1)"]
+    tables, columns, keys, indexes = [], [], [], []
+    for t in range(table_count):
+        name = f"table_{t:03d}"
+        tables.append({"tableName": name, "tableComment": f"业务表{t}"})
+        for c in range(columns_per_table):
+            columns.append({
+                "tableName": name, "columnName": "id" if c == 0 else f"field_{c:02d}",
+                "columnType": types[c % len(types)], "isNullable": "NO" if c == 0 else "YES",
+                "columnComment": f"字段{c}说明", "columnDefault": None,
+            })
+        keys.append({"tableName": name, "constraintName": "PRIMARY", "columnName": "id",
+                     "referencedTableName": None, "referencedColumnName": None})
+        indexes.append({"tableName": name, "indexName": "PRIMARY", "nonUnique": 0, "columnName": "id"})
+    return DatabaseResult(success=True, data=build_table_schema(tables, columns, keys, indexes), message="ok")
+
+
+def rule_results(count: int) -> DatabaseResult:
+    rng = random.Random(1)
+    return DatabaseResult(success=True, data={"rule_results": [
+        {
+            "assessment_dimension": rng.choice(["完整性", "准确性", "一致性", "及时性"]),
+            "assessment_indicator": rng.choice(["非空检查", "值域检查", "格式检查", "逻辑检查"]),
+            "assessment_object": f"table_{rng.randrange(20):03d}.field_{rng.randrange(20):02d}",
+            "exception_count": rng.randrange(0, 500),
+            "execution_status": "success",
+            "passed": rng.random() < 0.6,
+        }
+        for _ in range(count)
+    ]}, message="ok")
+
+
+def count_tokens(text: str):
+    try:
+        import tiktoken
+    except ImportError:
+        # 粗略估算：英文单词和数字各算一个，标点一个，汉字每字一个
+        return len(re.findall(r"[A-Za-z_]+|\d+|[一-鿿]|[^\sA-Za-z_\d一-鿿]", text)), "≈"
+    return len(tiktoken.get_encoding("cl100k_base").encode(text)), ""
+
+
+def measure(result: DatabaseResult, result_format: str, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = format_result(result, result_format)
+        timings.append(time.perf_counter() - started)
+    tokens, approx = count_tokens(text)
+    return {"text": text, "bytes": len(text.encode("utf-8")), "ms": statistics.median(timings) * 1000,
+            "tokens": tokens, "approx": approx}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="execute_query结果行数")
+    parser.add_argument("--tables", type=int, default=50, help="get_schema结果的表数（每表20列）")
+    parser.add_argument("--rules", type=int, default=200, help="规则执行结果条数")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    cases = [
+        (f"execute_query {args.rows} rows", query_result(args.rows)),
+        (f"get_schema {args.tables} tables", schema_result(args.tables)),
+        (f"rule results {args.rules}", rule_results(args.rules)),
+    ]
+
+    print(f"{'payload':<28}{'format':<9}{'bytes':>10}{'encode':>11}{'tokens':>10}")
+    for name, result in cases:
+        baseline = measure(result, "json", args.repeat)
+        compact = measure(result, "compact", args.repeat)
+        # compact必须能还原为同样的数据
+        envelope = json.loads(compact["text"])
+        assert envelope["format"] == "compact"
+        assert decode_compact(envelope["data"]) == json.loads(baseline["text"]), f"{name}: compact encoding is not lossless"
+
+        for label, m in (("json", baseline), ("compact", compact)):
+            print(f"{name:<28}{label:<9}{m['bytes']:>10}{m['ms']:>9.2f}ms{m['approx']:>2}{m['tokens']:>8}")
+        print(
+            f"{'':<28}{'ratio':<9}{baseline['bytes'] / compact['bytes']:>9.1f}x"
+            f"{baseline['ms'] / compact['ms']:>10.1f}x{baseline['tokens'] / compact['tokens']:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
 
 import asyncio
+import base64
+import hashlib
 import json
 import sys
-from typing import Any, Dict, List, Optional, Union
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.constants import ER
+from pymysql.cursors import DictCursor, SSDictCursor
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 # MCP相关导入
 from mcp.server import Server, NotificationOptions
@@ -15,6 +23,8 @@ from mcp.server.models import InitializationOptions
 import mcp.server.stdio
 import mcp.types as types
 
+from result_format import RESULT_FORMAT_PROPERTY, format_result, row_bytes, table_bytes
+
 # 数据类定义
 @dataclass
 class ColumnInfo:
@@ -40,9 +50,485 @@ class DatabaseResult:
     error: Optional[str] = None
     message: str = ""
 
+@dataclass
+class PooledConnection:
+    connection: Any
+    created_at: float
+    last_used: float
+    key: Tuple = ()
+
+@dataclass
+class _KeyPool:
+    idle: Deque[PooledConnection] = field(default_factory=deque)
+    # 已创建（空闲 + 借出 + 正在创建）的连接数
+    size: int = 0
+
+class PoolTimeout(Exception):
+    """连接池已满，等待空闲连接超时"""
+
+class ConnectionPool:
+    """按(host, port, user, database)分组的数据库连接池，所有工具共享
+
+    - 每组最多max_size个连接，用满时等待归还，超过checkout_timeout报错
+    - 空闲超过idle_timeout的连接关闭；空闲超过ping_interval的连接借出前先ping，失效则替换为新连接
+    - 出错的连接不放回池中
+    分组键还包含密码摘要，不同密码不会共用已认证的连接。线程安全。
+    """
+
+    def __init__(
+        self,
+        connect: Callable[..., Any],
+        max_size: int = 10,
+        idle_timeout: float = 300,
+        ping_interval: float = 30,
+        checkout_timeout: float = 30,
+    ):
+        self.connect = connect
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._pools: Dict[Tuple, _KeyPool] = {}
+        self._condition = threading.Condition()
+        self.hits = 0
+        self.misses = 0
+        self.stale_replaced = 0
+        self.expired = 0
+        self.timeouts = 0
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @staticmethod
+    def key(host: str, user: str, password: str, database: str, port: int) -> Tuple:
+        digest = hashlib.sha256(password.encode("utf-8")).hexdigest()[:16]
+        return (host, int(port), user, database, digest)
+
+    @staticmethod
+    def _close(entry: PooledConnection):
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+
+    def _evict_expired(self, now: float):
+        """关闭所有分组中空闲过久的连接（调用方持有锁）"""
+        for key, pool in list(self._pools.items()):
+            while pool.idle and now - pool.idle[0].last_used > self.idle_timeout:
+                self._close(pool.idle.popleft())
+                pool.size -= 1
+                self.expired += 1
+            if pool.size == 0:
+                del self._pools[key]
+
+    def acquire(self, host: str, user: str, password: str, database: str, port: int = 3306) -> PooledConnection:
+        key = self.key(host, user, password, database, port)
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        entry = None
+
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._evict_expired(now)
+                pool = self._pools.setdefault(key, _KeyPool())
+                if pool.idle:
+                    # 后进先出：优先复用最近用过的连接，其余连接更快空闲过期
+                    entry = pool.idle.pop()
+                    self.hits += 1
+                    break
+                if pool.size < self.max_size:
+                    pool.size += 1
+                    self.misses += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f"No free connection for {user}@{host}:{port}/{database} "
+                        f"after {self.checkout_timeout:g}s (max {self.max_size})"
+                    )
+                self._condition.wait(remaining)
+
+            waited = time.monotonic() - started
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+        if entry is not None and time.monotonic() - entry.last_used > self.ping_interval:
+            try:
+                entry.connection.ping(reconnect=False)
+            except Exception:
+                self._close(entry)
+                entry = None
+                with self._condition:
+                    self.stale_replaced += 1
+
+        if entry is None:
+            try:
+                connection = self.connect(host, user, password, database, port)
+            except Exception:
+                with self._condition:
+                    self._pools[key].size -= 1
+                    self._condition.notify()
+                raise
+            now = time.monotonic()
+            entry = PooledConnection(connection, created_at=now, last_used=now, key=key)
+
+        return entry
+
+    def release(self, entry: PooledConnection, discard: bool = False):
+        with self._condition:
+            pool = self._pools.get(entry.key)
+            if discard or pool is None:
+                self._close(entry)
+                if pool is not None:
+                    pool.size -= 1
+            else:
+                entry.last_used = time.monotonic()
+                pool.idle.append(entry)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, host: str, user: str, password: str, database: str, port: int = 3306):
+        """借出一个连接，用完归还；执行出错时关闭该连接而不放回池中"""
+        entry = self.acquire(host, user, password, database, port)
+        try:
+            yield entry.connection
+        except Exception:
+            self.release(entry, discard=True)
+            raise
+        else:
+            self.release(entry)
+
+    def close_all(self):
+        with self._condition:
+            for pool in self._pools.values():
+                while pool.idle:
+                    self._close(pool.idle.popleft())
+                    pool.size -= 1
+            self._pools = {key: pool for key, pool in self._pools.items() if pool.size > 0}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else None,
+                "stale_replaced": self.stale_replaced,
+                "expired": self.expired,
+                "timeouts": self.timeouts,
+                "checkout_wait_seconds": {
+                    "count": self.checkouts,
+                    "avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                    "max": round(self.wait_seconds_max, 6),
+                },
+                "pools": [
+                    {
+                        "host": key[0],
+                        "port": key[1],
+                        "user": key[2],
+                        "database": key[3],
+                        "size": pool.size,
+                        "idle": len(pool.idle),
+                        "in_use": pool.size - len(pool.idle),
+                    }
+                    for key, pool in self._pools.items()
+                ],
+            }
+
+@dataclass
+class _SchemaEntry:
+    value: Any
+    version: Tuple
+    loaded_at: float
+    validated_at: float
+
+class SchemaCache:
+    """表结构元数据（表列表、列信息、table_schema）的进程内LRU缓存，所有会话共享
+
+    键是连接池分组键（含密码摘要，密码不对时不会命中别人的缓存）加上查询类型和表名。
+    - 最近revalidate_interval秒内校验过的条目直接返回，不访问数据库
+    - 更早的条目先执行一条轻量的版本查询（information_schema.tables的CREATE_TIME/UPDATE_TIME，
+      列信息和table_schema还包括information_schema.columns的列数和列定义校验和），版本不变则继续使用，变化则重新加载
+    - 加载超过ttl秒的条目不论版本都重新加载：tables的时间列来自统计缓存，可能滞后；索引和外键变更也不在版本里
+    - 条目数超过max_entries时淘汰最久未使用的条目；max_entries为0时不缓存
+    线程安全。
+    """
+
+    def __init__(self, max_entries: int = 1000, revalidate_interval: float = 5, ttl: float = 600):
+        self.max_entries = max(0, max_entries)
+        self.revalidate_interval = revalidate_interval
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[Tuple, _SchemaEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def lookup(
+        self,
+        key: Tuple,
+        open_connection: Callable[[], Any],
+        version: Callable[[Any], Tuple],
+        load: Callable[[Any], Any],
+    ) -> Any:
+        """返回key对应的元数据；需要访问数据库时用open_connection()借出连接，执行version()校验或load()加载"""
+        if self.max_entries == 0:
+            with open_connection() as connection:
+                return load(connection)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and now - entry.loaded_at > self.ttl:
+                del self._entries[key]
+                entry = None
+                self.expired += 1
+            if entry is not None and now - entry.validated_at <= self.revalidate_interval:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+
+        with open_connection() as connection:
+            # 先取版本再加载：加载期间发生的变更会在下次校验时发现
+            current = version(connection)
+            if entry is not None and entry.version == current:
+                with self._lock:
+                    entry.validated_at = time.monotonic()
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.revalidated += 1
+                return entry.value
+            value = load(connection)
+
+        with self._lock:
+            if entry is not None:
+                self.invalidated += 1
+            else:
+                self.misses += 1
+            now = time.monotonic()
+            self._entries[key] = _SchemaEntry(value, current, loaded_at=now, validated_at=now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, host: str, port: int, database: str) -> int:
+        """丢弃某个数据库的所有缓存条目（不区分用户），返回丢弃的条目数"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == host and key[1] == int(port) and key[3] == database]
+            for key in keys:
+                del self._entries[key]
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.revalidated + self.misses + self.invalidated
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "revalidate_interval_seconds": self.revalidate_interval,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.revalidated) / lookups, 4) if lookups else None,
+            }
+
+def build_table_schema(
+    tables: List[Dict[str, Any]], columns: List[Dict[str, Any]],
+    keys: List[Dict[str, Any]], indexes: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """把information_schema的查询结果组装为generate_rules使用的table_schema格式
+
+    每张表在table_name/table_comment/columns之外附带primary_key、foreign_keys和indexes。
+    """
+    schema = {
+        table["tableName"]: {
+            "table_name": table["tableName"],
+            "table_comment": table["tableComment"],
+            "columns": [],
+            "primary_key": [],
+            "foreign_keys": [],
+            "indexes": [],
+        }
+        for table in tables
+    }
+
+    for key in keys:
+        table = schema.get(key["tableName"])
+        if table is None:
+            continue
+        if key["constraintName"] == "PRIMARY":
+            table["primary_key"].append(key["columnName"])
+        elif key["referencedTableName"]:
+            table["foreign_keys"].append({
+                "name": key["constraintName"],
+                "column": key["columnName"],
+                "referenced_table": key["referencedTableName"],
+                "referenced_column": key["referencedColumnName"],
+            })
+
+    for column in columns:
+        table = schema.get(column["tableName"])
+        if table is None:
+            continue
+        table["columns"].append({
+            "name": column["columnName"],
+            "type": column["columnType"],
+            "description": column["columnComment"],
+            "nullable": column["isNullable"] == "YES",
+            "default": column["columnDefault"],
+            "primary_key": column["columnName"] in table["primary_key"],
+        })
+
+    for index in indexes:
+        table = schema.get(index["tableName"])
+        if table is None:
+            continue
+        if not table["indexes"] or table["indexes"][-1]["name"] != index["indexName"]:
+            table["indexes"].append({"name": index["indexName"], "unique": not int(index["nonUnique"]), "columns": []})
+        table["indexes"][-1]["columns"].append(index["columnName"])
+
+    return {"tables": list(schema.values())}
+
+def encode_page_cursor(fingerprint: str, after: List[Any]) -> str:
+    """续页令牌：查询指纹 + 本页最后一行的键值"""
+    payload = json.dumps({"q": fingerprint, "after": after}, ensure_ascii=False, default=str)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_page_cursor(token: str, fingerprint: str) -> List[Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        after = payload["after"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if payload.get("q") != fingerprint:
+        raise ValueError("Cursor does not belong to this query (query, params and keyColumns must be unchanged)")
+    return after
+
+def query_fingerprint(query: str, params: Optional[List[str]], key_columns: Optional[List[str]]) -> str:
+    text = json.dumps([query.strip(), params, key_columns], ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def paged_select(
+    query: str, params: Optional[List[str]], limit: int,
+    key_columns: Optional[List[str]] = None, after: Optional[List[Any]] = None
+) -> Tuple[str, List[Any]]:
+    """把SELECT包装为派生表，由服务器端LIMIT限制返回行数
+
+    提供key_columns时按这些列排序，并只返回键值大于after的行（keyset分页）。
+    外层查询没有ORDER BY时，MySQL会沿用派生表内的ORDER BY。
+    """
+    sql = query.strip().rstrip(";")
+    args: List[Any] = list(params or [])
+    if params is None:
+        # 原查询没有参数时pymysql不做%格式化，加入参数后字面量%需要转义
+        sql = sql.replace("%", "%%")
+    where = order = ""
+    if key_columns:
+        columns = ", ".join(f"`{column.replace('`', '``')}`" for column in key_columns)
+        order = f" ORDER BY {columns}"
+        if after is not None:
+            where = f" WHERE ({columns}) > ({', '.join(['%s'] * len(after))})"
+            args.extend(after)
+    return f"SELECT * FROM ({sql}) AS _page{where}{order} LIMIT %s", args + [limit]
+
+def check_key_columns(description, key_columns: List[str]):
+    """keyColumns必须与结果列名完全一致（含大小写），否则续页令牌里的键值取不到"""
+    names = [column[0] for column in description or ()]
+    missing = [column for column in key_columns if column not in names]
+    if missing:
+        raise ValueError(
+            f"keyColumns not found in the query result: {', '.join(missing)} "
+            f"(result columns: {', '.join(names)})"
+        )
+
+# 包装为派生表本身可能引起的错误（重名列、派生表/LIMIT不支持的写法），出现时改为直接执行原查询；
+# 其他错误（超时、连接断开、锁等待等）直接抛出，避免查询执行两次或在坏连接上继续执行
+PAGED_SELECT_FALLBACK_ERRORS = frozenset({
+    ER.DUP_FIELDNAME,
+    ER.PARSE_ERROR,
+    ER.SYNTAX_ERROR,
+    ER.NOT_SUPPORTED_YET,
+    ER.WRONG_USAGE,
+    ER.DERIVED_MUST_HAVE_ALIAS,
+    ER.CANT_USE_OPTION_HERE,
+})
+
+# information_schema.columns中列定义的校验和，任何列的增删、改名、改类型都会改变它
+COLUMNS_CHECKSUM_SQL = (
+    "SUM(CRC32(CONCAT_WS('|', c.table_name, c.column_name, c.ordinal_position, c.column_type, "
+    "c.is_nullable, c.column_default, c.column_comment, c.extra)))"
+)
+
+# execute_query结果中每一行在输出JSON中的嵌套层数：result -> data -> rows -> row
+RESULT_ROW_DEPTH = 3
+
+def stream_rows(cursor, max_rows: int, max_bytes: int,
+                result_format: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """从无缓冲游标逐行读取，达到行数或字节上限即停止，返回(rows, 截断原因)
+
+    字节数按实际返回的格式（format_result）计算；至少返回一行，保证分页总能前进。
+    """
+    rows: List[Dict[str, Any]] = []
+    size = 0
+    for row in cursor:
+        if len(rows) >= max_rows:
+            return rows, "rows"
+        if not rows:
+            size = table_bytes(list(row), result_format)
+        size_of_row = row_bytes(row, result_format, RESULT_ROW_DEPTH)
+        if rows and size + size_of_row > max_bytes:
+            return rows, "bytes"
+        rows.append(row)
+        size += size_of_row
+    return rows, None
+
+# 通过execute_query执行这些语句后立即丢弃该数据库的表结构缓存
+SCHEMA_CHANGING_STATEMENTS = {"CREATE", "ALTER", "DROP", "RENAME", "TRUNCATE"}
+
 class DatabaseMCPServer:
-    def __init__(self):
+    def __init__(self, pool_max_size: int = 10, pool_idle_timeout: float = 300,
+                 pool_ping_interval: float = 30, pool_checkout_timeout: float = 30,
+                 max_workers: int = 8, query_timeout: float = 60,
+                 schema_cache_max_entries: int = 1000, schema_cache_revalidate_interval: float = 5,
+                 schema_cache_ttl: float = 600,
+                 query_default_rows: int = 200, query_max_rows: int = 1000,
+                 query_max_response_bytes: int = 262144):
         self.server = Server("database-server")
+        # pymysql是阻塞的：数据库操作放到有界线程池执行，事件循环可以同时处理其他工具调用
+        # max_workers为0时在事件循环中直接执行
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="db") if max_workers > 0 else None
+        self.query_timeout = query_timeout
+        self.pool = ConnectionPool(
+            self.create_connection,
+            max_size=pool_max_size,
+            idle_timeout=pool_idle_timeout,
+            ping_interval=pool_ping_interval,
+            checkout_timeout=pool_checkout_timeout,
+        )
+        self.schema_cache = SchemaCache(
+            max_entries=schema_cache_max_entries,
+            revalidate_interval=schema_cache_revalidate_interval,
+            ttl=schema_cache_ttl,
+        )
+        # execute_query每次最多返回的行数（maxRows的默认值和上限）和结果字节预算
+        self.query_max_rows = max(1, query_max_rows)
+        self.query_default_rows = max(1, min(query_default_rows, self.query_max_rows))
+        self.query_max_response_bytes = query_max_response_bytes
         
         # 注册工具
         self._register_tools()
@@ -83,11 +569,49 @@ class DatabaseMCPServer:
                                 "type": "number",
                                 "description": "数据库端口号，默认3306",
                                 "default": 3306
-                            }
+                            },
+                            "format": RESULT_FORMAT_PROPERTY
                         },
                         "required": ["host", "user", "password", "database", "tableName"]
                     },
                 ),
+                types.Tool(
+                    name="get_schema",
+                    description="一次获取多张表（或全部表）的结构：列信息、主键、外键和索引，返回可直接传给generate_rules的table_schema",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "host": {
+                                "type": "string",
+                                "description": "数据库主机地址"
+                            },
+                            "user": {
+                                "type": "string",
+                                "description": "数据库用户名"
+                            },
+                            "password": {
+                                "type": "string",
+                                "description": "数据库密码"
+                            },
+                            "database": {
+                                "type": "string",
+                                "description": "数据库名称"
+                            },
+                            "tableNames": {
+                                "type": "array",
+                                "description": "表名列表，不提供时返回所有表",
+                                "items": {"type": "string"}
+                            },
+                            "port": {
+                                "type": "number",
+                                "description": "数据库端口号，默认3306",
+                                "default": 3306
+                            },
+                            "format": RESULT_FORMAT_PROPERTY
+                        },
+                        "required": ["host", "user", "password", "database"]
+                    },
+                ),
                 types.Tool(
                     name="get_tables",
                     description="获取数据库中所有表的信息，包括表名、注释、类型、引擎等",
@@ -114,14 +638,17 @@ class DatabaseMCPServer:
                                 "type": "number",
                                 "description": "数据库端口号，默认3306",
                                 "default": 3306
-                            }
+                            },
+                            "format": RESULT_FORMAT_PROPERTY
                         },
                         "required": ["host", "user", "password", "database"]
                     },
                 ),
                 types.Tool(
                     name="execute_query",
-                    description="执行自定义SQL查询语句",
+                    description="执行自定义SQL查询语句。查询结果分页返回：每页最多maxRows行且不超过字节预算；"
+                                "提供keyColumns（结果中唯一且非空的列，如主键）时按这些列排序，"
+                                "结果被截断时返回nextCursor，原样传入cursor获取下一页",
                     inputSchema={
                         "type": "object",
                         "properties": {
@@ -150,11 +677,26 @@ class DatabaseMCPServer:
                                 "description": "查询参数（可选）",
                                 "items": {"type": "string"}
                             },
+                            "maxRows": {
+                                "type": "number",
+                                "minimum": 1,
+                                "description": "本页最多返回的行数（可选，有上限）"
+                            },
+                            "keyColumns": {
+                                "type": "array",
+                                "description": "用于排序和续页的键列（可选），需唯一且非空，如主键；必须是查询结果中的列名（大小写一致）",
+                                "items": {"type": "string"}
+                            },
+                            "cursor": {
+                                "type": "string",
+                                "description": "上一页返回的nextCursor（可选），查询、params和keyColumns需与上一页相同"
+                            },
                             "port": {
                                 "type": "number",
                                 "description": "数据库端口号，默认3306",
                                 "default": 3306
-                            }
+                            },
+                            "format": RESULT_FORMAT_PROPERTY
                         },
                         "required": ["host", "user", "password", "database", "query"]
                     },
@@ -185,10 +727,21 @@ class DatabaseMCPServer:
                                 "type": "number",
                                 "description": "数据库端口号，默认3306",
                                 "default": 3306
-                            }
+                            },
+                            "format": RESULT_FORMAT_PROPERTY
                         },
                         "required": ["host", "user", "password", "database"]
                     },
+                ),
+                types.Tool(
+                    name="get_pool_stats",
+                    description="获取数据库连接池和表结构缓存状态：命中/未命中次数、借出等待时间、各连接组的连接数、缓存条目数",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "format": RESULT_FORMAT_PROPERTY
+                        },
+                    },
                 )
             ]
 
@@ -206,6 +759,15 @@ class DatabaseMCPServer:
                         arguments["tableName"],
                         arguments.get("port", 3306)
                     )
+                elif name == "get_schema":
+                    result = await self.get_schema(
+                        arguments["host"],
+                        arguments["user"],
+                        arguments["password"],
+                        arguments["database"],
+                        arguments.get("tableNames"),
+                        arguments.get("port", 3306)
+                    )
                 elif name == "get_tables":
                     result = await self.get_tables(
                         arguments["host"],
@@ -222,7 +784,11 @@ class DatabaseMCPServer:
                         arguments["database"],
                         arguments["query"],
                         arguments.get("params"),
-                        arguments.get("port", 3306)
+                        arguments.get("port", 3306),
+                        arguments.get("maxRows"),
+                        arguments.get("keyColumns"),
+                        arguments.get("cursor"),
+                        arguments.get("format")
                     )
                 elif name == "test_connection":
                     result = await self.test_connection(
@@ -232,13 +798,18 @@ class DatabaseMCPServer:
                         arguments["database"],
                         arguments.get("port", 3306)
                     )
+                elif name == "get_pool_stats":
+                    result = DatabaseResult(
+                        success=True,
+                        data={**self.pool.stats(), "schema_cache": self.schema_cache.stats()},
+                        message="Connection pool and schema cache statistics"
+                    )
                 else:
                     raise ValueError(f"Unknown tool: {name}")
                 
                 return [types.TextContent(
                     type="text",
-                    text=json.dumps(result.__dict__ if hasattr(result, '__dict__') else result, 
-                                  ensure_ascii=False, indent=2, default=str)
+                    text=format_result(result, arguments.get("format"))
                 )]
                 
             except Exception as e:
@@ -257,12 +828,168 @@ class DatabaseMCPServer:
                 database=database,
                 port=port,
                 charset='utf8mb4',
-                cursorclass=DictCursor
+                cursorclass=DictCursor,
+                connect_timeout=10,
+                # 与单次调用超时一致，超时返回后线程也会尽快释放
+                read_timeout=self.query_timeout,
+                write_timeout=self.query_timeout,
+                # 连接会被复用，不能让上一次查询的事务快照影响后续读取
+                autocommit=True
             )
             return connection
         except Exception as e:
             raise Exception(f"Failed to connect to database: {str(e)}")
 
+    async def _run_blocking(self, func: Callable[[], Any]) -> Any:
+        """在线程池中执行阻塞的数据库操作，超过query_timeout（含排队时间）抛出TimeoutError"""
+        if self.executor is None:
+            return func()
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, func), self.query_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Database call timed out after {self.query_timeout:g}s")
+
+    @staticmethod
+    def _table_versions(connection, database: str, table_names: List[str]) -> Tuple:
+        """指定表的CREATE_TIME加上列定义的摘要，不存在的表不在结果中
+
+        MySQL 8的CREATE_TIME来自统计缓存（information_schema_stats_expiry），INSTANT ALTER也不更新它；
+        information_schema.columns直接读数据字典，列的增删改会立即反映在列数、最大序号和校验和里。
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT
+                    t.table_name as tableName,
+                    t.create_time as createTime,
+                    COUNT(c.column_name) as columnCount,
+                    MAX(c.ordinal_position) as lastPosition,
+                    {COLUMNS_CHECKSUM_SQL} as columnChecksum
+                FROM information_schema.tables t
+                LEFT JOIN information_schema.columns c
+                    ON c.table_schema = t.table_schema AND c.table_name = t.table_name
+                WHERE t.table_schema = %s AND t.table_name IN ({', '.join(['%s'] * len(table_names))})
+                GROUP BY t.table_name, t.create_time
+                ORDER BY t.table_name
+            """, [database, *table_names])
+            return tuple(tuple(str(value) for value in row.values()) for row in cursor.fetchall())
+
+    @staticmethod
+    def _database_version(
+        connection, database: str, include_updates: bool = False, include_columns: bool = False
+    ) -> Tuple:
+        """整个数据库的表数量和最近的CREATE_TIME（可选UPDATE_TIME、全部列定义的摘要），增删表或重建表时变化"""
+        columns = f"""
+                    , (SELECT CONCAT(COUNT(*), ':', IFNULL({COLUMNS_CHECKSUM_SQL}, 0))
+                       FROM information_schema.columns c WHERE c.table_schema = %s) as columnsVersion
+        """ if include_columns else ""
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT
+                    COUNT(*) as tableCount,
+                    MAX(create_time) as lastCreated{', MAX(update_time) as lastUpdated' if include_updates else ''}
+                    {columns}
+                FROM information_schema.tables
+                WHERE table_schema = %s
+            """, (database, database) if include_columns else (database,))
+            return tuple(str(value) for value in cursor.fetchone().values())
+
+    @staticmethod
+    def _fetch_columns(connection, database: str, table_name: str) -> List[Dict[str, Any]]:
+        with connection.cursor() as cursor:
+            sql = """
+                SELECT 
+                    column_name as columnName,
+                    column_type as columnType,
+                    is_nullable as isNullable,
+                    IFNULL(column_comment, '') as columnComment,
+                    column_default as columnDefault,
+                    extra as extra
+                FROM information_schema.columns 
+                WHERE table_schema = %s AND table_name = %s
+                ORDER BY ordinal_position
+            """
+            cursor.execute(sql, (database, table_name))
+            return cursor.fetchall()
+
+    @staticmethod
+    def _fetch_schema(connection, database: str, table_names: Optional[List[str]]) -> Dict[str, Any]:
+        """每类information_schema信息只查询一次，与表数量无关"""
+        with connection.cursor() as cursor:
+            params: List[Any] = [database]
+            table_filter = ""
+            if table_names:
+                table_filter = f" AND table_name IN ({', '.join(['%s'] * len(table_names))})"
+                params.extend(table_names)
+
+            cursor.execute(f"""
+                SELECT
+                    table_name as tableName,
+                    IFNULL(table_comment, '') as tableComment
+                FROM information_schema.tables
+                WHERE table_schema = %s{table_filter}
+                ORDER BY table_name
+            """, params)
+            tables = cursor.fetchall()
+
+            cursor.execute(f"""
+                SELECT
+                    table_name as tableName,
+                    column_name as columnName,
+                    column_type as columnType,
+                    is_nullable as isNullable,
+                    IFNULL(column_comment, '') as columnComment,
+                    column_default as columnDefault
+                FROM information_schema.columns
+                WHERE table_schema = %s{table_filter}
+                ORDER BY table_name, ordinal_position
+            """, params)
+            columns = cursor.fetchall()
+
+            cursor.execute(f"""
+                SELECT
+                    table_name as tableName,
+                    constraint_name as constraintName,
+                    column_name as columnName,
+                    referenced_table_name as referencedTableName,
+                    referenced_column_name as referencedColumnName
+                FROM information_schema.key_column_usage
+                WHERE table_schema = %s{table_filter}
+                ORDER BY table_name, constraint_name, ordinal_position
+            """, params)
+            keys = cursor.fetchall()
+
+            cursor.execute(f"""
+                SELECT
+                    table_name as tableName,
+                    index_name as indexName,
+                    non_unique as nonUnique,
+                    column_name as columnName
+                FROM information_schema.statistics
+                WHERE table_schema = %s{table_filter}
+                ORDER BY table_name, index_name, seq_in_index
+            """, params)
+            indexes = cursor.fetchall()
+
+        return build_table_schema(tables, columns, keys, indexes)
+
+    @staticmethod
+    def _fetch_tables(connection, database: str) -> List[Dict[str, Any]]:
+        with connection.cursor() as cursor:
+            sql = """
+                SELECT 
+                    table_name as tableName,
+                    IFNULL(table_comment, '') as tableComment,
+                    table_type as tableType,
+                    IFNULL(engine, '') as engine,
+                    table_rows as tableRows
+                FROM information_schema.tables 
+                WHERE table_schema = %s
+                ORDER BY table_name
+            """
+            cursor.execute(sql, (database,))
+            return cursor.fetchall()
+
     async def get_table_columns(
         self, host: str, user: str, password: str, database: str, 
         table_name: str, port: int = 3306
@@ -270,42 +997,30 @@ class DatabaseMCPServer:
         """获取表列信息"""
         print(f"🔍 Getting columns for table: {table_name} in database: {database}")
         
-        connection = None
-        try:
-            connection = self.create_connection(host, user, password, database, port)
-            
-            with connection.cursor() as cursor:
-                sql = """
-                    SELECT 
-                        column_name as columnName,
-                        column_type as columnType,
-                        is_nullable as isNullable,
-                        IFNULL(column_comment, '') as columnComment,
-                        column_default as columnDefault,
-                        extra as extra
-                    FROM information_schema.columns 
-                    WHERE table_schema = %s AND table_name = %s
-                    ORDER BY ordinal_position
-                """
-                
-                cursor.execute(sql, (database, table_name))
-                rows = cursor.fetchall()
-                
-                columns = [ColumnInfo(**row) for row in rows]
-                
-                if columns:
-                    print(f"   - Found {len(columns)} columns in table {table_name}")
-                    return DatabaseResult(
-                        success=True,
-                        data=[col.__dict__ for col in columns],
-                        message=f"Successfully retrieved {len(columns)} columns from table {table_name}"
-                    )
-                else:
-                    return DatabaseResult(
-                        success=False,
-                        message=f"Table {table_name} does not exist or has no columns in database {database}"
-                    )
+        def run():
+            rows = self.schema_cache.lookup(
+                self.pool.key(host, user, password, database, port) + ("columns", table_name),
+                lambda: self.pool.connection(host, user, password, database, port),
+                lambda connection: self._table_versions(connection, database, [table_name]),
+                lambda connection: self._fetch_columns(connection, database, table_name),
+            )
+            columns = [ColumnInfo(**row) for row in rows]
+        
+            if columns:
+                print(f"   - Found {len(columns)} columns in table {table_name}")
+                return DatabaseResult(
+                    success=True,
+                    data=[col.__dict__ for col in columns],
+                    message=f"Successfully retrieved {len(columns)} columns from table {table_name}"
+                )
+            else:
+                return DatabaseResult(
+                    success=False,
+                    message=f"Table {table_name} does not exist or has no columns in database {database}"
+                )
                     
+        try:
+            return await self._run_blocking(run)
         except Exception as e:
             print(f"Error getting table columns: {e}")
             return DatabaseResult(
@@ -313,9 +1028,50 @@ class DatabaseMCPServer:
                 error=str(e),
                 message=f"Failed to get columns for table {table_name}: {str(e)}"
             )
-        finally:
-            if connection:
-                connection.close()
+
+    async def get_schema(
+        self, host: str, user: str, password: str, database: str,
+        table_names: Optional[List[str]] = None, port: int = 3306
+    ) -> DatabaseResult:
+        """批量获取表结构"""
+        print(f"🗂️ Getting schema for {len(table_names) if table_names else 'all'} tables in database: {database}")
+        table_names = sorted(set(table_names)) if table_names else None
+
+        def run():
+            if table_names:
+                version = lambda connection: self._table_versions(connection, database, table_names)
+            else:
+                version = lambda connection: self._database_version(connection, database, include_columns=True)
+            schema = self.schema_cache.lookup(
+                self.pool.key(host, user, password, database, port) + ("schema", tuple(table_names or ())),
+                lambda: self.pool.connection(host, user, password, database, port),
+                version,
+                lambda connection: self._fetch_schema(connection, database, table_names),
+            )
+
+            missing = sorted(set(table_names or []) - {table["table_name"] for table in schema["tables"]})
+            if missing:
+                return DatabaseResult(
+                    success=False,
+                    message=f"Tables do not exist in database {database}: {', '.join(missing)}"
+                )
+
+            print(f"   - Found {sum(len(table['columns']) for table in schema['tables'])} columns in {len(schema['tables'])} tables")
+            return DatabaseResult(
+                success=True,
+                data=schema,
+                message=f"Successfully retrieved schema of {len(schema['tables'])} tables from database {database}"
+            )
+
+        try:
+            return await self._run_blocking(run)
+        except Exception as e:
+            print(f"Error getting schema: {e}")
+            return DatabaseResult(
+                success=False,
+                error=str(e),
+                message=f"Failed to get schema from database {database}: {str(e)}"
+            )
 
     async def get_tables(
         self, host: str, user: str, password: str, database: str, port: int = 3306
@@ -323,35 +1079,25 @@ class DatabaseMCPServer:
         """获取数据库中所有表"""
         print(f"📊 Getting tables from database: {database}")
         
-        connection = None
-        try:
-            connection = self.create_connection(host, user, password, database, port)
-            
-            with connection.cursor() as cursor:
-                sql = """
-                    SELECT 
-                        table_name as tableName,
-                        IFNULL(table_comment, '') as tableComment,
-                        table_type as tableType,
-                        IFNULL(engine, '') as engine,
-                        table_rows as tableRows
-                    FROM information_schema.tables 
-                    WHERE table_schema = %s
-                    ORDER BY table_name
-                """
-                
-                cursor.execute(sql, (database,))
-                rows = cursor.fetchall()
-                
-                tables = [TableInfo(**row) for row in rows]
-                
-                print(f"   - Found {len(tables)} tables in database {database}")
-                return DatabaseResult(
-                    success=True,
-                    data=[table.__dict__ for table in tables],
-                    message=f"Successfully retrieved {len(tables)} tables from database {database}"
-                )
+        def run():
+            # tableRows随数据变化，版本里包含UPDATE_TIME
+            rows = self.schema_cache.lookup(
+                self.pool.key(host, user, password, database, port) + ("tables", None),
+                lambda: self.pool.connection(host, user, password, database, port),
+                lambda connection: self._database_version(connection, database, include_updates=True),
+                lambda connection: self._fetch_tables(connection, database),
+            )
+            tables = [TableInfo(**row) for row in rows]
+        
+            print(f"   - Found {len(tables)} tables in database {database}")
+            return DatabaseResult(
+                success=True,
+                data=[table.__dict__ for table in tables],
+                message=f"Successfully retrieved {len(tables)} tables from database {database}"
+            )
                 
+        try:
+            return await self._run_blocking(run)
         except Exception as e:
             print(f"Error getting tables: {e}")
             return DatabaseResult(
@@ -359,41 +1105,100 @@ class DatabaseMCPServer:
                 error=str(e),
                 message=f"Failed to get tables from database {database}: {str(e)}"
             )
-        finally:
-            if connection:
-                connection.close()
 
     async def execute_query(
         self, host: str, user: str, password: str, database: str, 
-        query: str, params: Optional[List[str]] = None, port: int = 3306
+        query: str, params: Optional[List[str]] = None, port: int = 3306,
+        max_rows: Optional[int] = None, key_columns: Optional[List[str]] = None,
+        cursor_token: Optional[str] = None, result_format: Optional[str] = None
     ) -> DatabaseResult:
-        """执行自定义SQL查询"""
+        """执行自定义SQL查询
+
+        结果集用无缓冲游标（SSDictCursor）逐行读取，达到行数上限或字节预算（按result_format的输出计算）即停止，
+        内存占用与结果集大小无关。keyColumns必须是结果中的列，否则在读取任何行之前报错。
+        SELECT包装为带LIMIT的派生表，服务器端只产生一页的数据；包装本身导致失败（如结果有重名列）且未要求续页时
+        直接执行原查询，截断后剩余的行由驱动读完丢弃。
+        """
         print(f"⚡ Executing query: {query[:100]}...")
+        fingerprint = query_fingerprint(query, params, key_columns)
         
-        connection = None
-        try:
-            connection = self.create_connection(host, user, password, database, port)
-            
-            with connection.cursor() as cursor:
-                cursor.execute(query, params)
-                
-                # 如果是SELECT查询，获取结果
-                if query.strip().upper().startswith('SELECT'):
-                    rows = cursor.fetchall()
-                    return DatabaseResult(
-                        success=True,
-                        data=rows,
-                        message="Query executed successfully"
-                    )
+        def run():
+            if max_rows is not None and int(max_rows) < 1:
+                raise ValueError(f"maxRows must be at least 1 (got {max_rows})")
+            limit = min(int(max_rows or self.query_default_rows), self.query_max_rows)
+            after = decode_page_cursor(cursor_token, fingerprint) if cursor_token else None
+            if after is not None and not key_columns:
+                raise ValueError("cursor requires the keyColumns used for the previous page")
+            is_select = query.strip().upper().startswith('SELECT')
+
+            with self.pool.connection(host, user, password, database, port) as connection:
+                rows, truncated_by = None, None
+                if is_select:
+                    sql, args = paged_select(query, params, limit + 1, key_columns, after)
+                    try:
+                        with connection.cursor(SSDictCursor) as cursor:
+                            cursor.execute(sql, args)
+                            if key_columns:
+                                check_key_columns(cursor.description, key_columns)
+                            rows, truncated_by = stream_rows(
+                                cursor, limit, self.query_max_response_bytes, result_format
+                            )
+                    except pymysql.MySQLError as e:
+                        code = e.args[0] if e.args else None
+                        if key_columns:
+                            if code == ER.BAD_FIELD_ERROR:
+                                # ORDER BY中的列不存在：取结果列名给出明确的错误
+                                with connection.cursor(SSDictCursor) as cursor:
+                                    cursor.execute(*paged_select(query, params, 0))
+                                    check_key_columns(cursor.description, key_columns)
+                            raise
+                        if code not in PAGED_SELECT_FALLBACK_ERRORS:
+                            raise
+                        print(f"   - Paged query failed ({e}), running the query as is", file=sys.stderr)
+
+                if rows is None:
+                    with connection.cursor(SSDictCursor) as cursor:
+                        cursor.execute(query, params)
+                        # 有结果集的语句（SELECT、SHOW等）分页返回
+                        if cursor.description:
+                            rows, truncated_by = stream_rows(
+                                cursor, limit, self.query_max_response_bytes, result_format
+                            )
+                        else:
+                            # 对于INSERT, UPDATE, DELETE等操作
+                            connection.commit()
+                            if query.lstrip().split(None, 1)[0].upper() in SCHEMA_CHANGING_STATEMENTS:
+                                self.schema_cache.invalidate(host, port, database)
+                            return DatabaseResult(
+                                success=True,
+                                data={"affected_rows": cursor.rowcount},
+                                message=f"Query executed successfully. Affected rows: {cursor.rowcount}"
+                            )
+
+            next_cursor = None
+            message = f"Query executed successfully. Returned {len(rows)} rows"
+            if truncated_by:
+                reason = f"{limit} rows" if truncated_by == "rows" else f"{self.query_max_response_bytes} bytes"
+                if key_columns:
+                    next_cursor = encode_page_cursor(fingerprint, [rows[-1].get(column) for column in key_columns])
+                    message += f"; more rows available (page limit {reason}), pass nextCursor as cursor to continue"
                 else:
-                    # 对于INSERT, UPDATE, DELETE等操作
-                    connection.commit()
-                    return DatabaseResult(
-                        success=True,
-                        data={"affected_rows": cursor.rowcount},
-                        message=f"Query executed successfully. Affected rows: {cursor.rowcount}"
-                    )
+                    message += f"; result truncated at {reason}, provide keyColumns to page through all rows"
+            print(f"   - {message}")
+            return DatabaseResult(
+                success=True,
+                data={
+                    "rows": rows,
+                    "rowCount": len(rows),
+                    "truncated": truncated_by is not None,
+                    "truncatedBy": truncated_by,
+                    "nextCursor": next_cursor,
+                },
+                message=message
+            )
                 
+        try:
+            return await self._run_blocking(run)
         except Exception as e:
             print(f"Error executing query: {e}")
             return DatabaseResult(
@@ -401,9 +1206,6 @@ class DatabaseMCPServer:
                 error=str(e),
                 message=f"Failed to execute query: {str(e)}"
             )
-        finally:
-            if connection:
-                connection.close()
 
     async def test_connection(
         self, host: str, user: str, password: str, database: str, port: int = 3306
@@ -411,18 +1213,18 @@ class DatabaseMCPServer:
         """测试数据库连接"""
         print(f"🔌 Testing connection to database: {database}@{host}")
         
-        connection = None
-        try:
-            connection = self.create_connection(host, user, password, database, port)
-            
-            with connection.cursor() as cursor:
-                cursor.execute('SELECT 1')
+        def run():
+            with self.pool.connection(host, user, password, database, port) as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
                 
-            return DatabaseResult(
-                success=True,
-                message=f"Successfully connected to database {database}@{host}"
-            )
+                return DatabaseResult(
+                    success=True,
+                    message=f"Successfully connected to database {database}@{host}"
+                )
             
+        try:
+            return await self._run_blocking(run)
         except Exception as e:
             print(f"Connection test failed: {e}")
             return DatabaseResult(
@@ -430,9 +1232,6 @@ class DatabaseMCPServer:
                 error=str(e),
                 message=f"Failed to connect to database {database}@{host}: {str(e)}"
             )
-        finally:
-            if connection:
-                connection.close()
 
     async def run(self):
         """运行MCP服务器"""
@@ -455,8 +1254,31 @@ def main():
     import logging
     logging.basicConfig(level=logging.INFO)
     
-    server = DatabaseMCPServer()
-    print("Database MCP Server running on stdio", file=sys.stderr)
+    # 从环境变量获取连接池配置
+    pool_max_size = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    pool_idle_timeout = float(os.getenv("DB_POOL_IDLE_TIMEOUT_SECONDS", "300"))
+    pool_ping_interval = float(os.getenv("DB_POOL_PING_INTERVAL_SECONDS", "30"))
+    pool_checkout_timeout = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT_SECONDS", "30"))
+    
+    # 执行数据库操作的线程数和单次调用超时
+    max_workers = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+    query_timeout = float(os.getenv("DB_QUERY_TIMEOUT_SECONDS", "60"))
+    
+    # 表结构缓存：条目数上限（0为不缓存）、免校验间隔、最长有效期
+    schema_cache_max_entries = int(os.getenv("DB_SCHEMA_CACHE_MAX_ENTRIES", "1000"))
+    schema_cache_revalidate_interval = float(os.getenv("DB_SCHEMA_CACHE_REVALIDATE_SECONDS", "5"))
+    schema_cache_ttl = float(os.getenv("DB_SCHEMA_CACHE_TTL_SECONDS", "600"))
+    
+    # execute_query分页：默认每页行数、每页行数上限、每页结果字节预算
+    query_default_rows = int(os.getenv("DB_QUERY_DEFAULT_ROWS", "200"))
+    query_max_rows = int(os.getenv("DB_QUERY_MAX_ROWS", "1000"))
+    query_max_response_bytes = int(os.getenv("DB_QUERY_MAX_RESPONSE_BYTES", "262144"))
+    
+    server = DatabaseMCPServer(pool_max_size, pool_idle_timeout, pool_ping_interval, pool_checkout_timeout,
+                               max_workers, query_timeout,
+                               schema_cache_max_entries, schema_cache_revalidate_interval, schema_cache_ttl,
+                               query_default_rows, query_max_rows, query_max_response_bytes)
+    print(f"Database MCP Server running on stdio (pool max size per database: {pool_max_size})", file=sys.stderr)
     
     try:
         asyncio.run(server.run())
@@ -465,6 +1287,10 @@ def main():
     except Exception as e:
         print(f"Server error: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        if server.executor:
+            server.executor.shutdown(wait=False, cancel_futures=True)
+        server.pool.close_all()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
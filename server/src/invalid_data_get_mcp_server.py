@@ -14,6 +14,8 @@ from mcp.server.models import InitializationOptions
 import mcp.server.stdio
 import mcp.types as types
 
+from result_format import RESULT_FORMAT_PROPERTY, format_result
+
 # 数据类定义
 @dataclass
 class InvalidDataGetResult:
@@ -117,6 +119,7 @@ class InvalidDataGetMCPServer:
                                 "description": "数据库类型",
                                 "default": "mysql"
                             },
+                            "format": RESULT_FORMAT_PROPERTY
                             # "limit": {
                             #     "type": "number",
                             #     "description": "返回记录数限制",
@@ -146,8 +149,7 @@ class InvalidDataGetMCPServer:
                 
                 return [types.TextContent(
                     type="text",
-                    text=json.dumps(result.__dict__ if hasattr(result, '__dict__') else result, 
-                                  ensure_ascii=False, indent=2, default=str)
+                    text=format_result(result, arguments.get("format"))
                 )]
                 
             except Exception as e:
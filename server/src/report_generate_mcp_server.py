@@ -14,6 +14,8 @@ from mcp.server.models import InitializationOptions
 import mcp.server.stdio
 import mcp.types as types
 
+from result_format import RESULT_FORMAT_PROPERTY, format_result
+
 # 数据类定义
 @dataclass
 class ReportGenerateResult:
@@ -176,7 +178,8 @@ class ReportGenerateMCPServer:
                                     }
                                 },
                                 "required": ["summary", "rule_results"]
-                                }
+                                },
+                            "format": RESULT_FORMAT_PROPERTY
                         #     "output_path": {
                         #         "type": "string",
                         #         "description": "报告输出路径",
@@ -231,8 +234,7 @@ class ReportGenerateMCPServer:
                 
                 return [types.TextContent(
                     type="text",
-                    text=json.dumps(result.__dict__ if hasattr(result, '__dict__') else result, 
-                                  ensure_ascii=False, indent=2, default=str)
+                    text=format_result(result, arguments.get("format"))
                 )]
                 
             except Exception as e:
@@ -0,0 +1,155 @@
+"""MCP工具结果的序列化格式，各MCP服务器共用
+
+- json（默认）：与原来一致，result.__dict__缩进2格输出
+- compact：紧凑列式编码，不缩进，输出为{"format": "compact", "data": 编码后的结果}。
+  由相同键的对象组成的列表（查询结果行、列信息等）改为{"$columns": [...], "$rows": [[...], ...]}，
+  重复较多的字符串列再做字典编码："$dict": {"列名": ["取值0", "取值1", ...]}，$rows中该列存放取值的下标。
+  结果中本身以$开头的键写成$$开头，所以只有编码产生的表才会出现单个$开头的键。
+编码是无损的，decode_compact可以把data还原为json格式的数据。
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+RESULT_FORMATS = ("json", "compact")
+
+# 各工具inputSchema中的format参数
+RESULT_FORMAT_PROPERTY = {
+    "type": "string",
+    "enum": list(RESULT_FORMATS),
+    "default": "json",
+    "description": "结果格式：json为缩进的对象列表；compact为紧凑列式编码，结果在data中，"
+                   "对象列表写成{$columns, $rows}（$dict中的列在$rows里存放取值下标），"
+                   "原有以$开头的键写成$$开头，体积和token数更小",
+}
+
+# compact格式中表的标记键
+COLUMNS_KEY = "$columns"
+ROWS_KEY = "$rows"
+DICT_KEY = "$dict"
+_TABLE_KEYS = ({COLUMNS_KEY, ROWS_KEY}, {COLUMNS_KEY, ROWS_KEY, DICT_KEY})
+
+# 列表至少有这么多行才改为列式，行数太少时列名开销不值得
+COLUMNAR_MIN_ROWS = 2
+# 字符串列的不同取值数不超过行数的这个比例时做字典编码
+DICTIONARY_MAX_RATIO = 0.5
+DICTIONARY_MIN_ROWS = 4
+
+
+def _is_table(value: List[Any]) -> bool:
+    if len(value) < COLUMNAR_MIN_ROWS or not all(isinstance(item, dict) for item in value):
+        return False
+    keys = list(value[0])
+    # 非字符串键在json中会变成字符串，放进列名后无法按原样还原，这种列表不改写
+    return (bool(keys) and all(isinstance(key, str) for key in keys)
+            and all(list(item) == keys for item in value))
+
+
+def _dictionary(values: List[Any]) -> Optional[List[str]]:
+    """字符串列（允许null）重复较多时返回按首次出现排序的取值表，否则返回None"""
+    if len(values) < DICTIONARY_MIN_ROWS:
+        return None
+    distinct: Dict[str, int] = {}
+    for value in values:
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            return None
+        distinct.setdefault(value, len(distinct))
+    if not distinct or len(distinct) > len(values) * DICTIONARY_MAX_RATIO:
+        return None
+    return list(distinct)
+
+
+def _escape_key(key: Any) -> Any:
+    return "$" + key if isinstance(key, str) and key.startswith("$") else key
+
+
+def _unescape_key(key: str) -> str:
+    return key[1:] if key.startswith("$$") else key
+
+
+def encode_compact(value: Any) -> Any:
+    """把对象列表递归改写为列式结构"""
+    if isinstance(value, dict):
+        return {_escape_key(key): encode_compact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = list(value)
+        if not _is_table(items):
+            return [encode_compact(item) for item in items]
+
+        columns = list(items[0])
+        column_values = [[encode_compact(item[column]) for item in items] for column in columns]
+        dictionaries = {}
+        for index, column in enumerate(columns):
+            dictionary = _dictionary(column_values[index])
+            if dictionary is not None:
+                positions = {text: position for position, text in enumerate(dictionary)}
+                column_values[index] = [None if v is None else positions[v] for v in column_values[index]]
+                dictionaries[column] = dictionary
+
+        table: Dict[str, Any] = {COLUMNS_KEY: columns, ROWS_KEY: [list(row) for row in zip(*column_values)]}
+        if dictionaries:
+            table[DICT_KEY] = dictionaries
+        return table
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    # 与json.dumps(default=str)一致：日期、Decimal等转成字符串，字典编码也能识别这些列
+    return str(value)
+
+
+def decode_compact(value: Any) -> Any:
+    """encode_compact的逆变换"""
+    if isinstance(value, list):
+        return [decode_compact(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if set(value) in _TABLE_KEYS:
+        dictionaries = value.get(DICT_KEY, {})
+        columns = value[COLUMNS_KEY]
+        rows = []
+        for row in value[ROWS_KEY]:
+            item = {}
+            for column, cell in zip(columns, row):
+                if column in dictionaries and cell is not None:
+                    cell = dictionaries[column][cell]
+                item[column] = decode_compact(cell)
+            rows.append(item)
+        return rows
+    return {_unescape_key(key): decode_compact(item) for key, item in value.items()}
+
+
+def table_bytes(columns: List[str], result_format: Optional[str] = None) -> int:
+    """行列表本身（不含各行）在format_result输出中占用的字节数：json为[]，compact还有列名"""
+    if (result_format or "json") == "compact":
+        header = {COLUMNS_KEY: columns, ROWS_KEY: []}
+        return len(json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    return 2
+
+
+def row_bytes(row: Dict[str, Any], result_format: Optional[str] = None, depth: int = 0) -> int:
+    """一行结果在format_result输出中占用的UTF-8字节数（含与下一行之间的分隔符）
+
+    json格式按depth层嵌套的缩进计算，与实际输出一致；compact格式按列式编码后的一行数组计算，
+    字典编码的列实际只占一个下标，所以是上限。
+    """
+    result_format = result_format or "json"
+    if result_format == "json":
+        text = json.dumps(row, ensure_ascii=False, indent=2, default=str)
+        # 嵌套在depth层中时每一行前面多depth*2个空格，行末是",\n"
+        return len(text.encode("utf-8")) + (text.count("\n") + 1) * depth * 2 + 2
+    if result_format == "compact":
+        values = [encode_compact(value) for value in row.values()]
+        return len(json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")) + 1
+    raise ValueError(f"Unknown result format: {result_format} (expected one of {', '.join(RESULT_FORMATS)})")
+
+
+def format_result(result: Any, result_format: Optional[str] = None) -> str:
+    """按工具调用指定的格式序列化结果（dataclass结果取__dict__）"""
+    payload = result.__dict__ if hasattr(result, '__dict__') else result
+    result_format = result_format or "json"
+    if result_format == "json":
+        return json.dumps(payload, ensure_ascii=False, indent=2, default=str)
+    if result_format == "compact":
+        return json.dumps({"format": "compact", "data": encode_compact(payload)},
+                          ensure_ascii=False, separators=(",", ":"))
+    raise ValueError(f"Unknown result format: {result_format} (expected one of {', '.join(RESULT_FORMATS)})")
@@ -14,6 +14,8 @@ from mcp.server.models import InitializationOptions
 import mcp.server.stdio
 import mcp.types as types
 
+from result_format import RESULT_FORMAT_PROPERTY, format_result
+
 # 数据类定义
 @dataclass
 class RuleExecuteResult:
@@ -84,6 +86,7 @@ class RuleExecuteMCPServer:
                                 "enum": ["mysql", "postgresql", "sqlite", "oracle", "sqlserver"],
                                 "default": "mysql"
                             },
+                            "format": RESULT_FORMAT_PROPERTY
                             # "parallel_execution": {
                             #     "type": "boolean",
                             #     "description": "是否并行执行规则",
@@ -118,8 +121,7 @@ class RuleExecuteMCPServer:
                 
                 return [types.TextContent(
                     type="text",
-                    text=json.dumps(result.__dict__ if hasattr(result, '__dict__') else result, 
-                                  ensure_ascii=False, indent=2, default=str)
+                    text=format_result(result, arguments.get("format"))
                 )]
                 
             except Exception as e:
@@ -14,6 +14,8 @@ from mcp.server.models import InitializationOptions
 import mcp.server.stdio
 import mcp.types as types
 
+from result_format import RESULT_FORMAT_PROPERTY, format_result
+
 # 数据类定义
 @dataclass
 class RuleGenerateResult:
@@ -122,7 +124,8 @@ class RuleGenerateMCPServer:
                                 "type": "boolean",
                                 "description": "是否使用沙盒模式",
                                 "default": True
-                            }
+                            },
+                            "format": RESULT_FORMAT_PROPERTY
                         },
                         "required": ["table_schema", "assessment_indicators", "database_config"]
                     },
@@ -146,8 +149,7 @@ class RuleGenerateMCPServer:
                 
                 return [types.TextContent(
                     type="text",
-                    text=json.dumps(result.__dict__ if hasattr(result, '__dict__') else result, 
-                                  ensure_ascii=False, indent=2, default=str)
+                    text=format_result(result, arguments.get("format"))
                 )]
                 
             except Exception as e:
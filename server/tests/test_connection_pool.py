@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+import database_mcp_server
+from database_mcp_server import DatabaseMCPServer, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, password):
+        self.password = password
+        self.alive = True
+        self.closed = False
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise database_mcp_server.pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnect:
+    """代替pymysql.connect，记录创建的连接和同时打开的最大连接数"""
+
+    def __init__(self):
+        self.connections = []
+        self._lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self._lock:
+            connection = FakeConnection(kwargs["password"])
+            self.connections.append(connection)
+            return connection
+
+    def open(self):
+        return [connection for connection in self.connections if not connection.closed]
+
+
+@pytest.fixture
+def fake_connect(monkeypatch):
+    connect = FakeConnect()
+    monkeypatch.setattr(database_mcp_server.pymysql, "connect", connect)
+    return connect
+
+
+def _pool(**kwargs):
+    return DatabaseMCPServer(max_workers=0, **kwargs).pool
+
+
+def test_dead_connection_is_replaced_after_failed_ping(fake_connect):
+    pool = _pool(pool_ping_interval=0)
+    entry = pool.acquire("db1", "u", "p", "db")
+    pool.release(entry)
+    first = entry.connection
+    first.alive = False
+
+    entry = pool.acquire("db1", "u", "p", "db")
+    assert entry.connection is not first
+    assert first.closed
+    assert pool.stats()["stale_replaced"] == 1
+    pool.release(entry)
+
+    # 替换后的连接正常复用，分组大小不变
+    assert pool.acquire("db1", "u", "p", "db").connection is entry.connection
+    assert pool.stats()["pools"][0]["size"] == 1
+
+
+def test_pool_never_exceeds_max_size(fake_connect):
+    pool = _pool(pool_max_size=2, pool_checkout_timeout=0.05)
+    held = [pool.acquire("db1", "u", "p", "db") for _ in range(2)]
+    with pytest.raises(PoolTimeout):
+        pool.acquire("db1", "u", "p", "db")
+    for entry in held:
+        pool.release(entry)
+
+    pool = _pool(pool_max_size=3, pool_checkout_timeout=5)
+    fake_connect.connections.clear()
+    max_open = 0
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal max_open
+        for _ in range(50):
+            with pool.connection("db1", "u", "p", "db"):
+                with lock:
+                    max_open = max(max_open, len(fake_connect.open()))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max_open <= 3
+    assert len(fake_connect.connections) <= 3
+    assert pool.stats()["pools"][0]["size"] <= 3
+
+
+def test_different_passwords_get_different_pools(fake_connect):
+    pool = _pool()
+    with pool.connection("db1", "u", "secret", "db") as connection:
+        assert connection.password == "secret"
+
+    # 空闲的已认证连接不会借给密码不同的调用方
+    with pool.connection("db1", "u", "wrong", "db") as connection:
+        assert connection.password == "wrong"
+    assert len(fake_connect.connections) == 2
+    assert pool.stats()["hits"] == 0
+    assert pool.key("db1", "u", "secret", "db", 3306) != pool.key("db1", "u", "wrong", "db", 3306)
+
+    with pool.connection("db1", "u", "secret", "db") as connection:
+        assert connection is fake_connect.connections[0]
+    assert pool.stats()["hits"] == 1
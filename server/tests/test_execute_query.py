@@ -0,0 +1,214 @@
+import asyncio
+import sqlite3
+
+import pymysql
+import pytest
+
+from database_mcp_server import DatabaseMCPServer, decode_page_cursor, encode_page_cursor, stream_rows
+from result_format import format_result
+
+
+class SQLiteCursor:
+    """用sqlite模拟pymysql的DictCursor/SSDictCursor（%s占位符、反引号标识符、row value比较）"""
+
+    def __init__(self, connection):
+        self._cursor = connection.cursor()
+        self.description = None
+        self.rowcount = -1
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def execute(self, sql, args=None):
+        self.executed.append(sql)
+        if args is not None:
+            sql = sql.replace("%s", "?").replace("%%", "%")
+        try:
+            self._cursor.execute(sql, list(args or []))
+        except sqlite3.OperationalError as e:
+            if "no such column" in str(e):
+                raise pymysql.err.OperationalError(1054, f"Unknown column in '{sql}'")
+            raise
+        self.description = self._cursor.description
+        self.rowcount = self._cursor.rowcount
+
+    def __iter__(self):
+        names = [column[0] for column in self.description]
+        for values in self._cursor:
+            yield dict(zip(names, values))
+
+
+class SQLiteConnection:
+    def __init__(self, connection):
+        self._connection = connection
+        self.statements = []
+
+    def cursor(self, cursor_class=None):
+        cursor = SQLiteCursor(self._connection)
+        self.statements.append(cursor.executed)
+        return cursor
+
+    def commit(self):
+        self._connection.commit()
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteServer(DatabaseMCPServer):
+    def __init__(self, rows, **kwargs):
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.db.execute("CREATE TABLE patients (id INTEGER, dept TEXT, name TEXT)")
+        self.db.executemany("INSERT INTO patients VALUES (?, ?, ?)", rows)
+        self.connection = SQLiteConnection(self.db)
+        super().__init__(max_workers=0, schema_cache_max_entries=0, **kwargs)
+
+    def create_connection(self, host, user, password, database, port=3306):
+        return self.connection
+
+
+ROWS = [(i, "内科" if i % 2 else "外科", f"患者{i:03d}") for i in range(1, 26)]
+
+
+def _query(server, query="SELECT id, dept, name FROM patients", **kwargs):
+    result = asyncio.run(server.execute_query("localhost", "u", "p", "db", query, **kwargs))
+    assert result.success, result.error
+    return result.data
+
+
+def test_cursor_pages_through_all_rows_exactly_once():
+    server = SQLiteServer(ROWS)
+    seen, token, pages = [], None, 0
+    while True:
+        data = _query(server, max_rows=7, key_columns=["dept", "id"], cursor_token=token)
+        seen.extend((row["dept"], row["id"]) for row in data["rows"])
+        pages += 1
+        token = data["nextCursor"]
+        if token is None:
+            assert not data["truncated"]
+            break
+        assert data["truncatedBy"] == "rows" and data["rowCount"] == 7
+
+    assert pages == 4
+    assert seen == sorted((dept, id_) for id_, dept, _ in ROWS)
+
+
+def test_cursor_round_trip_and_query_binding():
+    token = encode_page_cursor("abc", ["内科", 12])
+    assert decode_page_cursor(token, "abc") == ["内科", 12]
+    with pytest.raises(ValueError, match="does not belong"):
+        decode_page_cursor(token, "other")
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_page_cursor("not a cursor", "abc")
+
+
+def test_cursor_from_another_query_is_rejected():
+    server = SQLiteServer(ROWS)
+    token = _query(server, max_rows=5, key_columns=["id"])["nextCursor"]
+    result = asyncio.run(server.execute_query(
+        "localhost", "u", "p", "db", "SELECT id FROM patients WHERE id > 3",
+        max_rows=5, key_columns=["id"], cursor_token=token,
+    ))
+    assert not result.success and "does not belong" in result.error
+
+
+def test_unknown_key_column_fails_before_paging():
+    server = SQLiteServer(ROWS)
+    result = asyncio.run(server.execute_query(
+        "localhost", "u", "p", "db", "SELECT id, dept FROM patients", max_rows=5, key_columns=["patient_id"],
+    ))
+    assert not result.success
+    assert "keyColumns not found in the query result: patient_id" in result.error
+    assert "result columns: id, dept" in result.error
+
+
+def test_key_column_must_match_result_column_name():
+    # MySQL的ORDER BY不区分列名大小写，但结果行的键区分；不校验会得到值为null的续页令牌
+    server = SQLiteServer(ROWS)
+    result = asyncio.run(server.execute_query(
+        "localhost", "u", "p", "db", "SELECT id, dept FROM patients", max_rows=5, key_columns=["ID"],
+    ))
+    assert not result.success
+    assert "keyColumns not found in the query result: ID" in result.error
+
+
+@pytest.mark.parametrize("max_rows", [0, -3])
+def test_max_rows_below_one_is_rejected(max_rows):
+    server = SQLiteServer(ROWS)
+    result = asyncio.run(server.execute_query("localhost", "u", "p", "db", "SELECT id FROM patients", max_rows=max_rows))
+    assert not result.success
+    assert "maxRows must be at least 1" in result.error
+    assert server.connection.statements == []
+
+
+class FailingPagedCursor(SQLiteCursor):
+    """包装后的分页SELECT抛出指定的MySQL错误"""
+
+    error = None
+
+    def execute(self, sql, args=None):
+        if sql.startswith("SELECT * FROM ("):
+            self.executed.append(sql)
+            raise self.error
+        super().execute(sql, args)
+
+
+def _server_failing_paged_select(error):
+    server = SQLiteServer(ROWS)
+    FailingPagedCursor.error = error
+
+    def cursor(cursor_class=None):
+        cursor = FailingPagedCursor(server.db)
+        server.connection.statements.append(cursor.executed)
+        return cursor
+
+    server.connection.cursor = cursor
+    return server
+
+
+def test_paged_select_falls_back_only_for_wrapping_errors():
+    server = _server_failing_paged_select(pymysql.err.InternalError(1060, "Duplicate column name 'id'"))
+    data = _query(server, max_rows=5)
+    assert data["rowCount"] == 5
+    assert server.connection.statements[-1] == ["SELECT id, dept, name FROM patients"]
+
+    # 锁等待超时等与包装无关的错误直接返回，原查询不会再执行一次
+    server = _server_failing_paged_select(pymysql.err.OperationalError(1205, "Lock wait timeout exceeded"))
+    result = asyncio.run(server.execute_query("localhost", "u", "p", "db", "SELECT id FROM patients", max_rows=5))
+    assert not result.success and "Lock wait timeout" in result.error
+    assert len(server.connection.statements) == 1
+
+
+class ListCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+@pytest.mark.parametrize("result_format", ["json", "compact"])
+def test_byte_budget_matches_formatted_output(result_format):
+    from database_mcp_server import DatabaseResult
+
+    # 取值各不相同，compact不做字典编码，估算应与实际一致
+    rows = [{"id": i, "name": f"患者{i:03d}", "note": f"{i}" + "x" * 40, "admitted": None} for i in range(200)]
+    max_bytes = 4000
+    page, truncated_by = stream_rows(ListCursor(rows), 1000, max_bytes, result_format)
+    assert truncated_by == "bytes"
+
+    def rows_size(page_rows):
+        result = DatabaseResult(success=True, data={"rows": page_rows}, message="")
+        return len(format_result(result, result_format).encode("utf-8"))
+
+    actual = rows_size(page) - rows_size([])
+    # 实际输出不超过预算，再多一行就会超出
+    assert actual <= max_bytes
+    assert rows_size(rows[:len(page) + 1]) - rows_size([]) > max_bytes - 10
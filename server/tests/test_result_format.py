@@ -0,0 +1,86 @@
+import datetime
+import decimal
+import json
+from dataclasses import dataclass
+from typing import Any
+
+import pytest
+
+from result_format import decode_compact, encode_compact, format_result
+
+
+@dataclass
+class Result:
+    success: bool
+    data: Any
+    message: str
+
+
+def _round_trip(payload):
+    """compact输出解码后必须与json输出完全一致"""
+    result = Result(success=True, data=payload, message="ok")
+    envelope = json.loads(format_result(result, "compact"))
+    assert set(envelope) == {"format", "data"}
+    assert envelope["format"] == "compact"
+    assert decode_compact(envelope["data"]) == json.loads(format_result(result, "json"))
+    return envelope["data"]
+
+
+def test_rows_are_columnar_and_dictionary_encoded():
+    rows = [{"id": i, "dept": ["内科", "外科"][i % 2], "cost": decimal.Decimal("1.50"),
+             "admitted": datetime.date(2024, 1, 1 + i), "remark": None} for i in range(6)]
+    data = _round_trip({"rows": rows, "rowCount": 6})
+    table = data["data"]["rows"]
+    assert table["$columns"] == ["id", "dept", "cost", "admitted", "remark"]
+    assert table["$dict"] == {"dept": ["内科", "外科"], "cost": ["1.50"]}
+    assert table["$rows"][1] == [1, 1, 0, "2024-01-02", None]
+
+
+def test_payload_cannot_overwrite_format():
+    data = _round_trip({"format": "json", "rows": [{"a": 1}, {"a": 2}]})
+    assert data["data"]["format"] == "json"
+
+
+def test_objects_that_look_like_tables_are_not_decoded_as_tables():
+    # 真实数据中的{columns, rows}对象（如报告中的表格）不能被当成编码后的表
+    report_table = {"columns": ["name", "count"], "rows": [["a", 1], ["b", 2]]}
+    _round_trip({"table": report_table, "tables": [report_table, report_table]})
+    _round_trip({"table": {"columns": [], "rows": [], "dict": {}}})
+
+
+def test_keys_starting_with_dollar_are_escaped():
+    payload = {
+        "$columns": ["x"],
+        "$rows": [[1]],
+        "$$already": 1,
+        "items": [{"$columns": i, "$rows": [i]} for i in range(3)],
+    }
+    data = _round_trip(payload)
+    assert data["data"]["$$columns"] == ["x"]
+    assert data["data"]["$$$already"] == 1
+    assert data["data"]["items"]["$columns"] == ["$columns", "$rows"]
+
+
+@pytest.mark.parametrize("payload", [
+    [],
+    [{}],
+    [{"a": 1}],
+    [{"a": 1}, {"b": 2}],
+    [{"a": 1, "b": 2}, {"b": 2, "a": 1}],
+    [{"a": None}, {"a": None}, {"a": None}, {"a": None}],
+    [{"a": [{"x": 1}, {"x": 2}]}, {"a": [{"x": 3}, {"x": 4}]}],
+    {"nested": {"$dict": {"k": ["v"]}, "$columns": ["k"], "$rows": [[0]]}},
+    [{1: "int key"}, {1: "int key"}],
+])
+def test_round_trip_edge_cases(payload):
+    _round_trip(payload)
+
+
+def test_decode_compact_inverts_encode_compact():
+    value = {"rows": [{"a": "x", "$b": "y"} for _ in range(5)], "$meta": {"$$k": 1}}
+    assert decode_compact(json.loads(json.dumps(encode_compact(value)))) == value
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="Unknown result format"):
+        format_result(Result(success=True, data=None, message=""), "xml")
@@ -0,0 +1,146 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import database_mcp_server
+from database_mcp_server import DatabaseMCPServer, SchemaCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(database_mcp_server, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+class Loader:
+    """记录版本查询和加载次数；version是当前的版本键"""
+
+    def __init__(self):
+        self.version = ("v1",)
+        self.version_queries = 0
+        self.loads = 0
+
+    @contextmanager
+    def open_connection(self):
+        yield None
+
+    def get_version(self, connection):
+        self.version_queries += 1
+        return self.version
+
+    def load(self, connection):
+        self.loads += 1
+        return f"value {self.loads}"
+
+    def lookup(self, cache, key="k"):
+        return cache.lookup(key, self.open_connection, self.get_version, self.load)
+
+
+def test_revalidates_against_version_key(clock):
+    cache = SchemaCache(revalidate_interval=5, ttl=600)
+    loader = Loader()
+    assert loader.lookup(cache) == "value 1"
+
+    # 校验间隔内直接命中，不查询版本
+    clock.now += 1
+    assert loader.lookup(cache) == "value 1"
+    assert loader.version_queries == 1
+
+    # 超过校验间隔：版本不变则继续使用
+    clock.now += 10
+    assert loader.lookup(cache) == "value 1"
+    assert (loader.version_queries, loader.loads) == (2, 1)
+
+    # 版本变化则重新加载
+    clock.now += 10
+    loader.version = ("v2",)
+    assert loader.lookup(cache) == "value 2"
+    stats = cache.stats()
+    assert (stats["hits"], stats["revalidated"], stats["misses"], stats["invalidated"]) == (1, 1, 1, 1)
+
+
+def test_ttl_reloads_even_if_version_is_unchanged(clock):
+    cache = SchemaCache(revalidate_interval=5, ttl=60)
+    loader = Loader()
+    loader.lookup(cache)
+    clock.now += 61
+    assert loader.lookup(cache) == "value 2"
+    assert cache.stats()["expired"] == 1
+
+
+def test_evicts_least_recently_used_entry(clock):
+    cache = SchemaCache(max_entries=2)
+    loader = Loader()
+    loader.lookup(cache, "a")
+    loader.lookup(cache, "b")
+    loader.lookup(cache, "a")
+    loader.lookup(cache, "c")
+
+    assert cache.stats()["evictions"] == 1
+    assert loader.lookup(cache, "a") == "value 1"
+    # b最久未使用，已被淘汰，需要重新加载
+    assert loader.lookup(cache, "b") == "value 4"
+
+
+class InformationSchema:
+    """按SQL回答版本查询和列查询；alter()模拟MySQL 8的INSTANT ADD COLUMN（CREATE_TIME不变）"""
+
+    def __init__(self):
+        self.columns = [("id", "int"), ("name", "varchar(32)")]
+
+    def alter(self, name, column_type):
+        self.columns.append((name, column_type))
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield self
+
+    def execute(self, sql, args=None):
+        if "information_schema.tables t" in sql:
+            # 与COLUMNS_CHECKSUM_SQL一样，任何列定义变化都会改变校验和
+            checksum = sum(hash(column) & 0xFFFFFFFF for column in self.columns)
+            self.rows = [{
+                "tableName": "patients",
+                "createTime": "2026-01-01 00:00:00",
+                "columnCount": len(self.columns),
+                "lastPosition": len(self.columns),
+                "columnChecksum": checksum,
+            }]
+        else:
+            self.rows = [{"columnName": name, "columnType": column_type} for name, column_type in self.columns]
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_alter_adding_a_column_invalidates_cached_columns(clock):
+    cache = SchemaCache(revalidate_interval=5, ttl=600)
+    db = InformationSchema()
+
+    @contextmanager
+    def open_connection():
+        yield db
+
+    def lookup():
+        return cache.lookup(
+            ("patients",),
+            open_connection,
+            lambda connection: DatabaseMCPServer._table_versions(connection, "db", ["patients"]),
+            lambda connection: DatabaseMCPServer._fetch_columns(connection, "db", "patients"),
+        )
+
+    assert [column["columnName"] for column in lookup()] == ["id", "name"]
+    db.alter("phone", "varchar(20)")
+    clock.now += 10
+    assert [column["columnName"] for column in lookup()] == ["id", "name", "phone"]
+    assert cache.stats()["invalidated"] == 1
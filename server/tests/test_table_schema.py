@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+
+from database_mcp_server import DatabaseMCPServer
+
+TABLES = [
+    {"tableName": "departments", "tableComment": "科室"},
+    {"tableName": "patients", "tableComment": "患者"},
+]
+
+COLUMNS = [
+    {"tableName": "departments", "columnName": "id", "columnType": "int", "isNullable": "NO",
+     "columnComment": "", "columnDefault": None},
+    {"tableName": "patients", "columnName": "id", "columnType": "int", "isNullable": "NO",
+     "columnComment": "患者编号", "columnDefault": None},
+    {"tableName": "patients", "columnName": "dept_id", "columnType": "int", "isNullable": "YES",
+     "columnComment": "科室", "columnDefault": None},
+    {"tableName": "patients", "columnName": "status", "columnType": "varchar(16)", "isNullable": "NO",
+     "columnComment": "", "columnDefault": "active"},
+    # 不在请求范围内的表被忽略
+    {"tableName": "other", "columnName": "id", "columnType": "int", "isNullable": "NO",
+     "columnComment": "", "columnDefault": None},
+]
+
+KEYS = [
+    {"tableName": "departments", "constraintName": "PRIMARY", "columnName": "id",
+     "referencedTableName": None, "referencedColumnName": None},
+    {"tableName": "patients", "constraintName": "PRIMARY", "columnName": "id",
+     "referencedTableName": None, "referencedColumnName": None},
+    {"tableName": "patients", "constraintName": "fk_dept", "columnName": "dept_id",
+     "referencedTableName": "departments", "referencedColumnName": "id"},
+]
+
+INDEXES = [
+    {"tableName": "patients", "indexName": "PRIMARY", "nonUnique": 0, "columnName": "id"},
+    {"tableName": "patients", "indexName": "idx_dept_status", "nonUnique": 1, "columnName": "dept_id"},
+    {"tableName": "patients", "indexName": "idx_dept_status", "nonUnique": 1, "columnName": "status"},
+]
+
+
+class CannedConnection:
+    """按执行顺序依次返回tables、columns、key_column_usage、statistics四个查询的行"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.queries = []
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield self
+
+    def execute(self, sql, args=None):
+        self.queries.append((sql, args))
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+def test_get_schema_builds_table_schema_shape():
+    connection = CannedConnection([TABLES, COLUMNS, KEYS, INDEXES])
+    schema = DatabaseMCPServer._fetch_schema(connection, "db", ["departments", "patients"])
+
+    assert len(connection.queries) == 4
+    assert all(args == ["db", "departments", "patients"] for _, args in connection.queries)
+    assert schema == {"tables": [
+        {
+            "table_name": "departments",
+            "table_comment": "科室",
+            "columns": [
+                {"name": "id", "type": "int", "description": "", "nullable": False,
+                 "default": None, "primary_key": True},
+            ],
+            "primary_key": ["id"],
+            "foreign_keys": [],
+            "indexes": [],
+        },
+        {
+            "table_name": "patients",
+            "table_comment": "患者",
+            "columns": [
+                {"name": "id", "type": "int", "description": "患者编号", "nullable": False,
+                 "default": None, "primary_key": True},
+                {"name": "dept_id", "type": "int", "description": "科室", "nullable": True,
+                 "default": None, "primary_key": False},
+                {"name": "status", "type": "varchar(16)", "description": "", "nullable": False,
+                 "default": "active", "primary_key": False},
+            ],
+            "primary_key": ["id"],
+            "foreign_keys": [
+                {"name": "fk_dept", "column": "dept_id", "referenced_table": "departments", "referenced_column": "id"},
+            ],
+            "indexes": [
+                {"name": "PRIMARY", "unique": True, "columns": ["id"]},
+                {"name": "idx_dept_status", "unique": False, "columns": ["dept_id", "status"]},
+            ],
+        },
+    ]}
+
+
+def test_table_schema_extends_the_per_table_shape():
+    """逐表调用get_tables + get_table_columns后由客户端拼出的结构是get_schema结果的子集"""
+    schema = DatabaseMCPServer._fetch_schema(CannedConnection([TABLES, COLUMNS, KEYS, INDEXES]), "db", None)
+
+    for table, built in zip(TABLES, schema["tables"]):
+        per_table = {
+            "table_name": table["tableName"],
+            "table_comment": table["tableComment"],
+            "columns": [
+                {
+                    "name": column["columnName"],
+                    "type": column["columnType"],
+                    "description": column["columnComment"],
+                    "nullable": column["isNullable"] == "YES",
+                }
+                for column in COLUMNS if column["tableName"] == table["tableName"]
+            ],
+        }
+        assert {key: built[key] for key in ("table_name", "table_comment")} == {
+            key: per_table[key] for key in ("table_name", "table_comment")
+        }
+        assert [
+            {key: column[key] for key in ("name", "type", "description", "nullable")} for column in built["columns"]
+        ] == per_table["columns"]